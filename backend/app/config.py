@@ -1,5 +1,15 @@
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Literal
+
+
+class OpenAICompatibleVendor(BaseModel):
+    """An extra provider that speaks the OpenAI chat completions API."""
+    name: str  # must match model_pricing.provider / provider_keys.provider
+    base_url: str
+    auth_header: str = "Authorization"
+    auth_scheme: str = "Bearer"  # "" sends the raw key, e.g. for "api-key: <key>" headers
 
 
 class Settings(BaseSettings):
@@ -9,6 +19,13 @@ class Settings(BaseSettings):
     supabase_jwt_secret: str = ""
     provider_encryption_key: str
 
+    # Direct Postgres connection string (Supabase: Project Settings → Database,
+    # session mode / port 5432). Optional; when set, hot-path queries go through
+    # an asyncpg pool instead of PostgREST, and cache invalidation uses LISTEN.
+    database_url: str = ""
+    database_pool_min_size: int = 2
+    database_pool_max_size: int = 10
+
     # Polar payment integration
     polar_access_token: str = ""
     polar_webhook_secret: str = ""
@@ -22,6 +39,70 @@ class Settings(BaseSettings):
     # Frontend URL for CORS
     frontend_url: str = "http://localhost:5173"
 
+    # How often buffered api_keys.last_used_at timestamps are written back
+    last_used_flush_interval_seconds: float = 10.0
+
+    # How often the model_pricing / provider_keys snapshot is reloaded
+    catalog_refresh_interval_seconds: float = 60.0
+
+    # Roll usage debits into one credit_transactions row per user, model and
+    # window of this many seconds (per-request detail stays in usage_logs).
+    # 0 writes one row per request.
+    usage_debit_window_seconds: int = 0
+
+    # usage_logs rows are queued in memory and inserted in batches of up to
+    # usage_log_batch_size, at least every usage_log_flush_interval_seconds.
+    # When usage_log_queue_size rows are waiting, the overflow policy applies:
+    # "block" (wait up to 1 s, then drop), "drop_newest" or "drop_oldest".
+    usage_log_queue_size: int = 10_000
+    usage_log_batch_size: int = 500
+    usage_log_flush_interval_seconds: float = 1.0
+    usage_log_overflow_policy: Literal["block", "drop_newest", "drop_oldest"] = "block"
+
+    # Local SQLite outbox for usage charges and usage_logs rows, replayed to
+    # the database in the background. Empty writes straight to the database
+    # (charges) or to the in-memory usage_logs queue.
+    outbox_path: str = "outbox/vuzo-outbox.sqlite3"
+
+    # usage_logs is partitioned by month. Partitions for months more than
+    # usage_log_retention_months before the current one are archived to
+    # Parquet in usage_archive_dir (uploaded to the usage_archive_bucket
+    # Supabase Storage bucket when set) and dropped; 0 keeps everything.
+    # Archival needs database_url. Upcoming partitions are created at startup
+    # and every usage_partition_maintenance_interval_seconds.
+    usage_log_retention_months: int = 0
+    usage_archive_dir: str = "archive/usage_logs"
+    usage_archive_bucket: str = ""
+    usage_partition_maintenance_interval_seconds: float = 3600.0
+
+    # Per-key request limits use api_keys.rate_limit_rpm; a key may spend
+    # this many seconds' worth of its quota back to back before being paced.
+    rate_limit_burst_seconds: float = 60.0
+
+    # How often the in-memory credit ledger re-reads cached balances
+    credit_ledger_sync_interval_seconds: float = 30.0
+
+    # Per-user cache of /v1/billing/balance, /v1/usage/summary and
+    # /v1/usage/daily results. Open-range results live this long (0 turns
+    # that off); ranges that ended over an hour ago are kept until evicted.
+    read_cache_ttl_seconds: float = 30.0
+    read_cache_max_entries: int = 50_000
+
+    # Poll interval for cache invalidation events when LISTEN isn't available
+    invalidation_poll_interval_seconds: float = 2.0
+
+    # Event-loop watchdog: ticks later than this are counted as stalls and
+    # attributed to the blocking call site (GET /v1/admin/event-loop)
+    loop_watchdog_enabled: bool = True
+    loop_watchdog_threshold_ms: float = 100.0
+
+    # Extra OpenAI-compatible vendors, as JSON, e.g.
+    # [{"name": "deepseek", "base_url": "https://api.deepseek.com/v1"}]
+    openai_compatible_providers: list[OpenAICompatibleVendor] = []
+
+    # Bearer token for /v1/admin/* operational endpoints; empty disables them
+    admin_api_token: str = ""
+
     app_env: str = "development"
     app_debug: bool = True
     app_port: int = 8000
@@ -1,6 +1,10 @@
-from fastapi import Depends, HTTPException, Request, Security
+import hmac
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import Depends, HTTPException, Query, Request, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from app.config import get_settings
 from app.middleware.auth import validate_api_key
 from app.middleware.jwt_auth import validate_session
 from app.models.schemas import AuthContext
@@ -24,3 +28,28 @@ async def get_current_user_id(
     else:
         user_id = await validate_session(credentials)
         return user_id
+
+
+def get_time_zone(
+    tz: str = Query("UTC", description="IANA time zone for bucket boundaries, e.g. Europe/Berlin"),
+) -> str:
+    """The `tz` query parameter, as a 400 unless it names a known time zone."""
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown time zone '{tz}'")
+    return tz
+
+
+async def require_admin(
+    credentials: HTTPAuthorizationCredentials = Security(security),
+) -> None:
+    """
+    Guard for /v1/admin/* endpoints. Compares the bearer token against
+    ADMIN_API_TOKEN; the endpoints 404 when no token is configured.
+    """
+    expected = get_settings().admin_api_token
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(credentials.credentials, expected):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
@@ -1,18 +1,102 @@
+import asyncio
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from app.routers import proxy, api_keys, usage, billing, models_list, auth, polar
-from app.models.database import init_supabase, close_http_client
-from app.middleware.rate_limiter import RateLimiterMiddleware
+from app.routers import proxy, api_keys, usage, billing, models_list, auth, polar, admin, dashboard
+from app.models.database import init_supabase, init_pg_pool, close_pg_pool, close_http_client
+from app.middleware.rate_limiter import RateLimiterMiddleware, rate_limiter
+from app.services.credit_ledger import credit_ledger
+from app.services.key_activity import last_used_recorder
+from app.services.pricing_service import refresh_catalog_async
+from app.services.invalidation import invalidation_listener
+from app.services.outbox import outbox
+from app.services.read_cache import read_cache
+from app.services.usage_archiver import usage_archiver
+from app.services.usage_writer import usage_log_writer
+from app.services.providers.registry import provider_registry
+from app.utils.background import run_periodically, run_once, cancel_tasks
+from app.utils.loop_watchdog import loop_watchdog
 from app.config import get_settings
 
+logger = logging.getLogger(__name__)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_supabase()
+    settings = get_settings()
+    if settings.loop_watchdog_enabled:
+        loop_watchdog.configure(settings.loop_watchdog_threshold_ms / 1000)
+        loop_watchdog.start()
+    if settings.database_url:
+        try:
+            await init_pg_pool(
+                settings.database_url,
+                settings.database_pool_min_size,
+                settings.database_pool_max_size,
+            )
+        except Exception:
+            logger.exception("Could not open the Postgres pool; using Supabase REST for queries")
+    provider_registry.configure(settings.openai_compatible_providers)
+    rate_limiter.configure(settings.rate_limit_burst_seconds)
+    read_cache.configure(settings.read_cache_max_entries, settings.read_cache_ttl_seconds)
+    await run_once(refresh_catalog_async, "catalog refresh")
+    invalidation_listener.configure(settings.database_url, settings.invalidation_poll_interval_seconds)
+    usage_log_writer.configure(
+        settings.usage_log_queue_size,
+        settings.usage_log_batch_size,
+        settings.usage_log_flush_interval_seconds,
+        settings.usage_log_overflow_policy,
+    )
+    usage_archiver.configure(
+        settings.usage_log_retention_months,
+        settings.usage_archive_dir,
+        settings.usage_archive_bucket,
+    )
+    await run_once(usage_archiver.maintain, "usage_logs partition maintenance")
+    if settings.outbox_path:
+        try:
+            outbox.open(settings.outbox_path)
+        except Exception:
+            logger.exception("Could not open the outbox; charging and logging usage directly")
+    tasks = [
+        asyncio.create_task(invalidation_listener.run()),
+        asyncio.create_task(usage_log_writer.run()),
+        asyncio.create_task(run_periodically(
+            refresh_catalog_async,
+            settings.catalog_refresh_interval_seconds,
+            "catalog refresh",
+        )),
+        asyncio.create_task(run_periodically(
+            credit_ledger.sync,
+            settings.credit_ledger_sync_interval_seconds,
+            "credit ledger sync",
+        )),
+        asyncio.create_task(run_periodically(
+            last_used_recorder.flush_async,
+            settings.last_used_flush_interval_seconds,
+            "last_used_at flush",
+        )),
+        asyncio.create_task(run_periodically(
+            usage_archiver.maintain,
+            settings.usage_partition_maintenance_interval_seconds,
+            "usage_logs partition maintenance",
+        )),
+    ]
+    if outbox.enabled:
+        tasks.append(asyncio.create_task(outbox.run()))
     yield
+    await cancel_tasks(tasks)
+    await run_once(last_used_recorder.flush_async, "last_used_at flush")
+    await run_once(usage_log_writer.drain, "usage_logs drain")
+    await run_once(outbox.drain, "outbox drain")
+    outbox.close()
+    await close_pg_pool()
     await close_http_client()
+    await loop_watchdog.stop()
 
 
 app = FastAPI(
@@ -34,6 +118,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 app.add_middleware(RateLimiterMiddleware)
 
@@ -42,8 +127,10 @@ app.include_router(auth.router, prefix="/v1/auth", tags=["Auth"])
 app.include_router(api_keys.router, prefix="/v1/api-keys", tags=["API Keys"])
 app.include_router(usage.router, prefix="/v1/usage", tags=["Usage"])
 app.include_router(billing.router, prefix="/v1/billing", tags=["Billing"])
+app.include_router(dashboard.router, prefix="/v1/dashboard", tags=["Dashboard"])
 app.include_router(polar.router, prefix="/v1", tags=["Payments"])
 app.include_router(models_list.router, prefix="/v1", tags=["Models"])
+app.include_router(admin.router, prefix="/v1/admin", tags=["Admin"])
 
 
 @app.get("/health")
@@ -1,67 +1,100 @@
 from fastapi import Request, HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from app.utils.crypto import get_key_prefix, hash_api_key
-from app.models.database import get_supabase
+from app.utils.crypto import hash_api_key
+from app.models.repository import get_repository
 from app.models.schemas import AuthContext
+from app.services.key_activity import last_used_recorder
+from app.utils.cache import TTLCache
 
 security = HTTPBearer()
 
+_AUTH_CACHE_TTL_SECONDS = 60
+_AUTH_CACHE_MAXSIZE = 50_000
+_NEGATIVE_CACHE_TTL_SECONDS = 10
+_NEGATIVE_CACHE_MAXSIZE = 100_000
 
-async def validate_api_key(
-    credentials: HTTPAuthorizationCredentials = Security(security),
-) -> AuthContext:
-    """
-    Dependency that validates a Vuzo API key from the Authorization header.
-    Returns an AuthContext with user_id, api_key_id, and rate_limit_rpm.
+# key_hash -> AuthContext for keys that validated successfully
+_auth_cache = TTLCache(maxsize=_AUTH_CACHE_MAXSIZE, ttl=_AUTH_CACHE_TTL_SECONDS)
+# key_hash -> (status_code, detail, user_id | None) for rejected keys, so
+# floods of bad or revoked keys don't each cost a database query
+_negative_cache = TTLCache(maxsize=_NEGATIVE_CACHE_MAXSIZE, ttl=_NEGATIVE_CACHE_TTL_SECONDS)
+
+
+def invalidate_api_key(key_hash: str) -> None:
+    """Evict a key from both caches, e.g. right after it is revoked."""
+    _auth_cache.pop(key_hash)
+    _negative_cache.pop(key_hash)
+
+
+def invalidate_user(user_id: str) -> int:
+    """Evict every cached key belonging to a user (deactivation, reactivation)."""
+    evicted = _auth_cache.pop_where(lambda _, ctx: ctx.user_id == user_id)
+    evicted += _negative_cache.pop_where(lambda _, entry: entry[2] == user_id)
+    return evicted
+
+
+def get_auth_cache_stats() -> dict:
+    return {"keys": _auth_cache.stats(), "rejected_keys": _negative_cache.stats()}
+
+
+def _reject(key_hash: str, status_code: int, detail: str, user_id: str | None = None):
+    _negative_cache.set(key_hash, (status_code, detail, user_id))
+    raise HTTPException(status_code=status_code, detail=detail)
+
+
+async def lookup_api_key(token: str) -> AuthContext:
     """
-    token = credentials.credentials
+    Resolve a raw `vz-` key to its AuthContext, or raise the 401/403 it earns.
 
+    Resolved contexts are cached by key hash for _AUTH_CACHE_TTL_SECONDS and
+    rejections for _NEGATIVE_CACHE_TTL_SECONDS; revocation and user
+    deactivation evict entries immediately via invalidate_api_key/invalidate_user.
+    """
     if not token.startswith("vz-"):
         raise HTTPException(status_code=401, detail="Invalid API key format")
 
-    prefix = get_key_prefix(token)
     key_hash = hash_api_key(token)
 
-    sb = get_supabase()
-    result = (
-        sb.table("api_keys")
-        .select("id, user_id, key_hash, is_active, rate_limit_rpm")
-        .eq("key_prefix", prefix)
-        .execute()
-    )
+    cached = _auth_cache.get(key_hash)
+    if cached is not None:
+        return cached
 
-    if not result.data:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    rejected = _negative_cache.get(key_hash)
+    if rejected is not None:
+        raise HTTPException(status_code=rejected[0], detail=rejected[1])
 
-    matched_key = None
-    for row in result.data:
-        if row["key_hash"] == key_hash:
-            matched_key = row
-            break
+    # Single round trip: unique-index lookup on key_hash joined with the
+    # owning user's is_active flag.
+    matched_key = await get_repository().find_api_key(key_hash)
 
     if matched_key is None:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+        _reject(key_hash, 401, "Invalid API key")
 
     if not matched_key["is_active"]:
-        raise HTTPException(status_code=403, detail="API key has been revoked")
-
-    user_result = (
-        sb.table("users")
-        .select("is_active")
-        .eq("id", matched_key["user_id"])
-        .single()
-        .execute()
-    )
-    if not user_result.data or not user_result.data["is_active"]:
-        raise HTTPException(status_code=403, detail="User account is inactive")
+        _reject(key_hash, 403, "API key has been revoked", matched_key["user_id"])
 
-    sb.table("api_keys").update({"last_used_at": "now()"}).eq(
-        "id", matched_key["id"]
-    ).execute()
+    if not matched_key["user_is_active"]:
+        _reject(key_hash, 403, "User account is inactive", matched_key["user_id"])
 
-    return AuthContext(
+    auth_ctx = AuthContext(
         user_id=matched_key["user_id"],
         api_key_id=matched_key["id"],
         rate_limit_rpm=matched_key["rate_limit_rpm"],
+        rate_limit_tpm=matched_key["rate_limit_tpm"],
+        max_concurrent_requests=matched_key["max_concurrent_requests"],
     )
+    _auth_cache.set(key_hash, auth_ctx)
+    return auth_ctx
+
+
+async def validate_api_key(
+    credentials: HTTPAuthorizationCredentials = Security(security),
+) -> AuthContext:
+    """
+    Dependency that validates a Vuzo API key from the Authorization header.
+    Returns an AuthContext with user_id, api_key_id and the key's limits.
+    """
+    auth_ctx = await lookup_api_key(credentials.credentials)
+    last_used_recorder.record(auth_ctx.api_key_id)
+    return auth_ctx
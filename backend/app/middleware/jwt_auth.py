@@ -1,68 +1,113 @@
+import asyncio
+
+import jwt
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from app.config import get_settings
-from app.models.database import get_supabase
+from app.models.repository import get_repository
+from app.utils.cache import TTLCache
 
 security = HTTPBearer()
 
+_JWT_AUDIENCE = "authenticated"
+_ASYMMETRIC_ALGORITHMS = {"RS256", "ES256"}
+
+_USER_CACHE_TTL_SECONDS = 300
+_USER_CACHE_MAXSIZE = 50_000
+
+# supabase_auth_id -> (vuzo user_id, is_active)
+_user_cache = TTLCache(maxsize=_USER_CACHE_MAXSIZE, ttl=_USER_CACHE_TTL_SECONDS)
+_jwks_client: jwt.PyJWKClient | None = None
+
+
+def _get_jwks_client() -> jwt.PyJWKClient:
+    """Shared JWKS client; signing keys are cached in-process between fetches."""
+    global _jwks_client
+    if _jwks_client is None:
+        settings = get_settings()
+        _jwks_client = jwt.PyJWKClient(
+            f"{settings.supabase_url}/auth/v1/.well-known/jwks.json",
+            cache_keys=True,
+        )
+    return _jwks_client
+
+
+async def _verify_token(token: str) -> dict:
+    """
+    Verify a Supabase access token locally and return its claims.
+
+    HS256 tokens are checked against SUPABASE_JWT_SECRET; RS256/ES256 tokens
+    against the project's JWKS (fetched off the event loop, then cached).
+    """
+    try:
+        alg = jwt.get_unverified_header(token).get("alg")
+        if alg == "HS256":
+            key = get_settings().supabase_jwt_secret
+            if not key:
+                raise HTTPException(status_code=401, detail="Invalid or expired token")
+        elif alg in _ASYMMETRIC_ALGORITHMS:
+            signing_key = await asyncio.to_thread(_get_jwks_client().get_signing_key_from_jwt, token)
+            key = signing_key.key
+        else:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[alg],
+            audience=_JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]},
+        )
+    except (jwt.PyJWTError, jwt.PyJWKClientError):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+
+def invalidate_session_user(user_id: str) -> int:
+    """Evict a Vuzo user's cached auth mapping (deactivation, reactivation)."""
+    return _user_cache.pop_where(lambda _, entry: entry[0] == user_id)
+
+
+def get_session_cache_stats() -> dict:
+    return _user_cache.stats()
+
 
 async def validate_session(
     credentials: HTTPAuthorizationCredentials = Security(security),
 ) -> str:
     """
     Validate a Supabase JWT from the Authorization header.
-    Uses Supabase's own auth.get_user() for reliable server-side verification.
-    Returns the Vuzo user_id (not the Supabase auth UUID).
+    Signature, audience and expiry are verified locally — no Supabase Auth
+    round trip. Returns the Vuzo user_id (not the Supabase auth UUID).
 
-    Creates a Vuzo user + credits row on first login if none exists.
+    The supabase_auth_id -> user_id mapping is cached for
+    _USER_CACHE_TTL_SECONDS. Creates a Vuzo user + credits row on first
+    login if none exists.
     """
-    token = credentials.credentials
-    settings = get_settings()
+    claims = await _verify_token(credentials.credentials)
+    supabase_uid = claims["sub"]
 
-    from supabase import create_client
-
-    sb_auth = create_client(settings.supabase_url, settings.supabase_key)
-
-    try:
-        user_response = sb_auth.auth.get_user(token)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-    if not user_response or not user_response.user:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    cached = _user_cache.get(supabase_uid)
+    if cached is not None:
+        user_id, is_active = cached
+        if not is_active:
+            raise HTTPException(status_code=403, detail="User account is inactive")
+        return user_id
 
-    supabase_uid = user_response.user.id
-    email = user_response.user.email or ""
+    email = claims.get("email") or ""
 
-    sb = get_supabase()
-    result = (
-        sb.table("users")
-        .select("id, is_active")
-        .eq("supabase_auth_id", supabase_uid)
-        .execute()
-    )
+    repo = get_repository()
+    user = await repo.find_user_by_auth_id(supabase_uid)
 
-    if result.data:
-        user = result.data[0]
+    if user is not None:
+        _user_cache.set(supabase_uid, (user["id"], user["is_active"]))
         if not user["is_active"]:
             raise HTTPException(status_code=403, detail="User account is inactive")
         return user["id"]
 
-    new_user = (
-        sb.table("users")
-        .insert({
-            "supabase_auth_id": supabase_uid,
-            "email": email,
-            "name": email.split("@")[0] if email else "",
-        })
-        .execute()
-    )
-    if not new_user.data:
+    user_id = await repo.create_user(supabase_uid, email, email.split("@")[0] if email else "")
+    if not user_id:
         raise HTTPException(status_code=500, detail="Failed to create user")
 
-    user_id = new_user.data[0]["id"]
-
-    sb.table("credits").insert({"user_id": user_id, "balance": 0}).execute()
-
+    _user_cache.set(supabase_uid, (user_id, True))
     return user_id
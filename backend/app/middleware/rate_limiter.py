@@ -1,88 +1,180 @@
+import math
 import time
-from datetime import datetime, timezone, timedelta
+from dataclasses import dataclass
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from starlette.datastructures import Headers
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.middleware.auth import lookup_api_key
+
+# Keys whose bucket has refilled completely carry no state; they are swept
+# from the table at most this often.
+_SWEEP_INTERVAL_SECONDS = 60.0
+_EPSILON = 1e-9
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    # seconds until the bucket is full again
+    reset_after: float
+    # seconds until the next request would be allowed (0 when allowed)
+    retry_after: float
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class GCRALimiter:
+    """
+    In-memory GCRA (generic cell rate algorithm) limiter, one bucket per key.
 
-from app.models.database import get_supabase
+    A key limited to `rpm` requests per minute earns one request every
+    60/rpm seconds and may run `burst_seconds` worth of them back to back.
+    The whole state of a bucket is its theoretical arrival time (TAT): a
+    request at `now` is admitted if TAT - now stays within the burst
+    tolerance, and then pushes TAT out by one emission interval. Admission
+    is a dict lookup and a few float operations.
 
-_DEFAULT_RPM = 60
+    State is per worker process, so with N workers a key can get up to N
+    times its rpm.
+    """
 
+    def __init__(self, burst_seconds: float = 60.0):
+        self.burst_seconds = burst_seconds
+        self._tat: dict[str, float] = {}
+        self._last_sweep = time.monotonic()
+        self.stats_counters = {"allowed": 0, "limited": 0}
+
+    def configure(self, burst_seconds: float) -> None:
+        self.burst_seconds = burst_seconds
+
+    def check(self, key: str, rpm: int, now: float | None = None) -> RateLimitDecision:
+        """Admit or refuse one request for `key`, consuming a slot if admitted."""
+        now = time.monotonic() if now is None else now
+        if now - self._last_sweep > _SWEEP_INTERVAL_SECONDS:
+            self._sweep(now)
+
+        interval = 60.0 / rpm
+        burst = max(1, int(rpm * self.burst_seconds / 60))
+        # A full bucket: TAT may run this far ahead of now before refusing.
+        tolerance = interval * burst
+        # Work relative to now; subtracting large monotonic timestamps leaves
+        # rounding error that must not refuse a full bucket.
+        ahead = max(self._tat.get(key, now) - now, 0.0)
+        new_ahead = ahead + interval
+
+        if new_ahead - tolerance > _EPSILON:
+            self.stats_counters["limited"] += 1
+            return RateLimitDecision(
+                allowed=False,
+                limit=rpm,
+                remaining=0,
+                reset_after=ahead,
+                retry_after=new_ahead - tolerance,
+            )
 
-class RateLimiterMiddleware(BaseHTTPMiddleware):
-    """
-    Supabase-backed sliding-window rate limiter keyed by API key prefix.
+        self._tat[key] = now + new_ahead
+        self.stats_counters["allowed"] += 1
+        return RateLimitDecision(
+            allowed=True,
+            limit=rpm,
+            remaining=int((tolerance - new_ahead) / interval + _EPSILON),
+            reset_after=new_ahead,
+            retry_after=0.0,
+        )
+
+    def _sweep(self, now: float) -> None:
+        self._tat = {key: tat for key, tat in self._tat.items() if tat > now}
+        self._last_sweep = now
+
+    def stats(self) -> dict:
+        return {"keys": len(self._tat), "burst_seconds": self.burst_seconds, **self.stats_counters}
+
+
+rate_limiter = GCRALimiter()
 
-    Each request writes a row to the `rate_limit_requests` table.
-    The count of rows in the last 60 seconds determines whether a request
-    is allowed.  Stale rows (> 2 minutes old) are pruned on every hit to
-    keep the table small.
 
-    Required Supabase table (run once):
+def _rate_limited(decision: RateLimitDecision) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        headers=decision.headers(),
+        content={
+            "error": {
+                "message": (
+                    f"Rate limit exceeded. Max {decision.limit} requests per minute. "
+                    f"Retry after {math.ceil(decision.retry_after)} s."
+                ),
+                "type": "rate_limit_error",
+            }
+        },
+    )
 
-        CREATE TABLE IF NOT EXISTS rate_limit_requests (
-            id          UUID        DEFAULT gen_random_uuid() PRIMARY KEY,
-            key_prefix  TEXT        NOT NULL,
-            requested_at TIMESTAMPTZ NOT NULL DEFAULT now()
-        );
-        CREATE INDEX IF NOT EXISTS idx_rl_prefix_time
-            ON rate_limit_requests (key_prefix, requested_at);
 
-    Fail-open: if Supabase is unreachable the request is allowed through so
-    that a transient DB outage does not take down the API.
+class RateLimiterMiddleware:
+    """
+    Per-key request rate limit for `vz-` API keys, as a plain ASGI callable.
+
+    The key is resolved through the same cache as the auth dependency, so
+    the bucket belongs to the key's id and its configured rate_limit_rpm,
+    and a cached key costs no database round trip. Keys that don't resolve
+    (invalid, revoked) and lookups that fail pass through; the route's own
+    auth rejects them. A rate_limit_rpm of 0 means unlimited. Admitted
+    responses carry X-RateLimit-* headers and refusals a 429 with
+    Retry-After.
+
+    Unlike BaseHTTPMiddleware, nothing sits between the app and the server
+    for the body: requests without a limited key get the server's `send`
+    itself, and limited ones a wrapper that only touches the
+    http.response.start message. Streaming chunks are never copied, queued
+    or handed to another task.
     """
 
-    async def dispatch(self, request: Request, call_next):
-        auth_header = request.headers.get("authorization", "")
-        if not auth_header.startswith("Bearer vz-"):
-            return await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-        key_prefix = auth_header[7:15]  # 8 chars after "Bearer "
-        now = datetime.now(timezone.utc)
-        window_start = now - timedelta(seconds=60)
-        cleanup_cutoff = now - timedelta(seconds=120)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        try:
-            sb = get_supabase()
-            window_start_iso = window_start.isoformat()
-
-            count_result = (
-                sb.table("rate_limit_requests")
-                .select("id", count="exact")
-                .eq("key_prefix", key_prefix)
-                .gte("requested_at", window_start_iso)
-                .execute()
-            )
-            current_count = count_result.count or 0
-
-            if current_count >= _DEFAULT_RPM:
-                return JSONResponse(
-                    status_code=429,
-                    content={
-                        "error": {
-                            "message": f"Rate limit exceeded. Max {_DEFAULT_RPM} requests per minute.",
-                            "type": "rate_limit_error",
-                        }
-                    },
-                )
-
-            sb.table("rate_limit_requests").insert({
-                "key_prefix": key_prefix,
-                "requested_at": now.isoformat(),
-            }).execute()
-
-            # Best-effort cleanup — ignore failures
-            try:
-                sb.table("rate_limit_requests") \
-                    .delete() \
-                    .lt("requested_at", cleanup_cutoff.isoformat()) \
-                    .execute()
-            except Exception:
-                pass
+        auth_header = Headers(scope=scope).get("authorization", "")
+        if not auth_header.startswith("Bearer vz-"):
+            await self.app(scope, receive, send)
+            return
 
+        try:
+            auth = await lookup_api_key(auth_header[7:])
         except Exception:
-            # Fail open: don't block requests if Supabase is unavailable
-            pass
-
-        return await call_next(request)
+            # Rejected keys get their 401/403 from the route; if the database
+            # is unavailable, fail open rather than block requests.
+            await self.app(scope, receive, send)
+            return
+        if auth.rate_limit_rpm <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        decision = rate_limiter.check(auth.api_key_id, auth.rate_limit_rpm)
+        if not decision.allowed:
+            await _rate_limited(decision)(scope, receive, send)
+            return
+
+        extra_headers = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                         for name, value in decision.headers().items()]
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), *extra_headers]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -1,9 +1,12 @@
+import asyncpg
 import httpx
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from app.config import get_settings
 
 _supabase: Client | None = None
+_supabase_auth: Client | None = None
 _http_client: httpx.AsyncClient | None = None
+_pg_pool: asyncpg.Pool | None = None
 
 
 def init_supabase() -> Client:
@@ -20,6 +23,46 @@ def get_supabase() -> Client:
     return _supabase
 
 
+def get_supabase_auth() -> Client:
+    """
+    Shared anon-key client for Supabase Auth calls (sign-up, sign-in, refresh).
+    Sessions are never persisted or auto-refreshed — each call's response is
+    returned to the caller and the client itself stays stateless.
+    """
+    global _supabase_auth
+    if _supabase_auth is None:
+        settings = get_settings()
+        _supabase_auth = create_client(
+            settings.supabase_url,
+            settings.supabase_key,
+            options=ClientOptions(auto_refresh_token=False, persist_session=False),
+        )
+    return _supabase_auth
+
+
+async def init_pg_pool(dsn: str, min_size: int = 2, max_size: int = 10) -> asyncpg.Pool:
+    """
+    Open the asyncpg pool used by app.models.repository. Needs a direct or
+    session-mode connection string: asyncpg prepares statements per
+    connection, which transaction-mode poolers (Supabase port 6543) break.
+    """
+    global _pg_pool
+    _pg_pool = await asyncpg.create_pool(dsn, min_size=min_size, max_size=max_size)
+    return _pg_pool
+
+
+def get_pg_pool() -> asyncpg.Pool | None:
+    """The Postgres pool, or None when DATABASE_URL is unset (Supabase REST fallback)."""
+    return _pg_pool
+
+
+async def close_pg_pool():
+    global _pg_pool
+    if _pg_pool is not None:
+        await _pg_pool.close()
+        _pg_pool = None
+
+
 def get_http_client() -> httpx.AsyncClient:
     global _http_client
     if _http_client is None or _http_client.is_closed:
@@ -0,0 +1,122 @@
+"""
+Versioned schema migrations.
+
+Every file in backend/migrations/ is one version, named `NNN_description.sql`
+and applied in order. Applied versions are recorded in schema_migrations, so
+running the migrator again only applies the new files:
+
+    cd backend && python -m app.models.migrations            # DATABASE_URL from .env
+    cd backend && python -m app.models.migrations --baseline 013
+
+--baseline records every version up to the given one as applied without
+running it, for a database whose schema was built by pasting the files into
+the Supabase SQL editor. A file that opens its own transaction (BEGIN; …
+COMMIT;) runs as written; any other file runs in a transaction together with
+its schema_migrations row, so a failure leaves neither behind.
+"""
+import argparse
+import asyncio
+import logging
+import re
+from pathlib import Path
+
+import asyncpg
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "migrations"
+
+logger = logging.getLogger(__name__)
+
+# Held while migrating, so two deploys starting together don't race.
+_ADVISORY_LOCK_KEY = 0x767A_6D69_6772_6174  # "vzmigrat"
+
+_CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+_RECORD_SQL = "INSERT INTO schema_migrations (version, name) VALUES ($1, $2) ON CONFLICT (version) DO NOTHING"
+_OWN_TRANSACTION = re.compile(r"^\s*BEGIN\s*;", re.IGNORECASE | re.MULTILINE)
+_PGCRYPTO = 'CREATE EXTENSION IF NOT EXISTS "pgcrypto";'
+
+
+def migration_files(directory: Path = MIGRATIONS_DIR) -> list[tuple[str, Path]]:
+    """(version, path) for every migration, in the order they apply."""
+    files = []
+    for path in sorted(directory.glob("*.sql")):
+        version, _, _ = path.stem.partition("_")
+        if not version.isdigit():
+            raise ValueError(f"Migration file name must start with its version number: {path.name}")
+        files.append((version, path))
+    versions = [version for version, _ in files]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return files
+
+
+async def _apply(conn: asyncpg.Connection, version: str, path: Path) -> None:
+    sql = path.read_text()
+    if _OWN_TRANSACTION.search(sql):
+        await conn.execute(sql)
+        await conn.execute(_RECORD_SQL, version, path.name)
+        return
+    async with conn.transaction():
+        try:
+            async with conn.transaction():
+                await conn.execute(sql)
+        except asyncpg.FeatureNotSupportedError:
+            if _PGCRYPTO not in sql:
+                raise
+            # gen_random_uuid() is built in since Postgres 13; servers
+            # without contrib can't CREATE EXTENSION pgcrypto, and don't need to.
+            await conn.execute(sql.replace(_PGCRYPTO, ""))
+        await conn.execute(_RECORD_SQL, version, path.name)
+
+
+async def apply_migrations(
+    dsn: str, baseline: str | None = None, directory: Path = MIGRATIONS_DIR
+) -> list[str]:
+    """Apply the migrations not yet recorded in schema_migrations. Returns their file names."""
+    files = migration_files(directory)
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute("SELECT pg_advisory_lock($1)", _ADVISORY_LOCK_KEY)
+        await conn.execute(_CREATE_TABLE_SQL)
+        applied = {r["version"] for r in await conn.fetch("SELECT version FROM schema_migrations")}
+        done = []
+        for version, path in files:
+            if version in applied:
+                continue
+            if baseline is not None and int(version) <= int(baseline):
+                await conn.execute(_RECORD_SQL, version, path.name)
+                logger.info("Recorded %s as applied (baseline)", path.name)
+                continue
+            logger.info("Applying %s", path.name)
+            await _apply(conn, version, path)
+            done.append(path.name)
+        return done
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    from app.config import get_settings
+
+    parser = argparse.ArgumentParser(description="Apply pending SQL migrations to DATABASE_URL.")
+    parser.add_argument(
+        "--baseline", metavar="VERSION",
+        help="record versions up to VERSION as already applied instead of running them",
+    )
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    args = parser.parse_args()
+    dsn = args.database_url or get_settings().database_url
+    if not dsn:
+        parser.error("DATABASE_URL is not set")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    applied = asyncio.run(apply_migrations(dsn, args.baseline))
+    logger.info("%d migration(s) applied", len(applied))
+
+
+if __name__ == "__main__":
+    main()
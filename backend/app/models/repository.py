@@ -0,0 +1,680 @@
+"""
+Async data access for the request path.
+
+Two interchangeable backends expose the same coroutine methods:
+
+- PostgresRepository talks to Postgres directly through the asyncpg pool
+  (DATABASE_URL). Every query is a module-level constant, so asyncpg's
+  per-connection statement cache prepares it once and later calls only
+  bind parameters.
+- SupabaseRepository issues the equivalent PostgREST calls through the
+  synchronous supabase client in a worker thread, so a slow round trip
+  never blocks the event loop.
+
+Services call get_repository() and don't care which one they get. Rows come
+back as plain dicts shaped like PostgREST JSON (UUIDs and timestamps as
+strings, numerics as floats).
+"""
+import asyncio
+from collections.abc import AsyncIterator
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+
+from app.models.database import get_pg_pool, get_supabase
+
+_USAGE_LOG_COLUMNS = (
+    "user_id", "api_key_id", "provider", "model", "input_tokens", "output_tokens",
+    "total_tokens", "provider_cost", "vuzo_cost", "response_time_ms", "status_code",
+    "created_at", "event_id",
+)
+_USAGE_LOG_TYPES = (
+    "uuid", "uuid", "text", "text", "int", "int",
+    "int", "numeric", "numeric", "int", "int",
+    "timestamptz", "uuid",
+)
+
+
+def _jsonable(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _row(record) -> dict:
+    return {key: _jsonable(value) for key, value in record.items()}
+
+
+# ── Postgres (asyncpg) ──
+
+_FIND_API_KEY_SQL = """
+    SELECT k.id, k.user_id, k.is_active, k.rate_limit_rpm, k.rate_limit_tpm, k.max_concurrent_requests,
+           u.is_active AS user_is_active
+    FROM api_keys k JOIN users u ON u.id = k.user_id
+    WHERE k.key_hash = $1
+    LIMIT 1
+"""
+_FIND_USER_SQL = "SELECT id, is_active FROM users WHERE supabase_auth_id = $1"
+_CREATE_USER_SQL = """
+    INSERT INTO users (supabase_auth_id, email, name) VALUES ($1, $2, $3) RETURNING id
+"""
+_CREATE_CREDITS_SQL = """
+    INSERT INTO credits (user_id, balance) VALUES ($1, 0) ON CONFLICT (user_id) DO NOTHING
+"""
+_GET_BALANCE_SQL = "SELECT balance FROM credits WHERE user_id = $1"
+_GET_BALANCES_SQL = "SELECT user_id, balance FROM credits WHERE user_id = ANY($1::uuid[])"
+_APPLY_CREDIT_CHANGE_SQL = "SELECT balance, transaction_id FROM apply_credit_change($1, $2, $3, $4, $5, $6)"
+_APPLY_USAGE_DEBITS_SQL = "SELECT balance, transaction_id FROM apply_usage_debits($1, $2, $3, $4::uuid[], $5::numeric[])"
+_LIST_TRANSACTIONS_SQL = """
+    SELECT * FROM credit_transactions
+    WHERE user_id = $1
+    ORDER BY created_at DESC, id DESC
+    LIMIT $2 OFFSET $3
+"""
+# Keyset page: seeks straight to the cursor on (user_id, created_at, id)
+# (migration 012), so a deep page costs the same as the first.
+_LIST_TRANSACTIONS_AFTER_SQL = """
+    SELECT * FROM credit_transactions
+    WHERE user_id = $1 AND (created_at, id) < ($2::text::timestamptz, $3::uuid)
+    ORDER BY created_at DESC, id DESC
+    LIMIT $4
+"""
+# One array parameter per column, so a batch of any size is a single
+# statement with a single cached plan. Rows already written under the same
+# event_id (a retried batch) are skipped; usage_logs is partitioned by
+# created_at (migration 013), so the unique key includes it.
+_INSERT_USAGE_LOGS_SQL = f"""
+    INSERT INTO usage_logs ({", ".join(_USAGE_LOG_COLUMNS)})
+    SELECT * FROM unnest({", ".join(f"${i}::{t}[]" for i, t in enumerate(_USAGE_LOG_TYPES, 1))})
+    ON CONFLICT (event_id, created_at) DO NOTHING
+"""
+# Buckets derived from the usage_hourly rollups (migration 011).
+_USAGE_SERIES_SQL = """
+    SELECT * FROM usage_series($1, $2, $3, $4::text::timestamptz, $5::text::timestamptz, $6, $7, $8::text[])
+"""
+_INSERT_API_KEY_SQL = """
+    INSERT INTO api_keys (user_id, key_prefix, key_hash, name)
+    VALUES ($1, $2, $3, $4)
+    RETURNING *
+"""
+_LIST_API_KEYS_SQL = """
+    SELECT id, name, key_prefix, is_active, rate_limit_rpm, rate_limit_tpm, max_concurrent_requests,
+           created_at, last_used_at
+    FROM api_keys
+    WHERE user_id = $1
+    ORDER BY created_at DESC
+"""
+_DEACTIVATE_API_KEY_SQL = """
+    UPDATE api_keys SET is_active = false
+    WHERE id = $1 AND user_id = $2
+    RETURNING id, key_hash
+"""
+
+
+# group_by value -> usage_logs expression. Keep in step with the CASE in the
+# usage_summary() function (migration 010).
+_USAGE_GROUP_EXPRESSIONS = {"model": "model", "provider": "provider", "api_key": "api_key_id::text"}
+
+
+def _summary_from_rows(rows: list[dict], group_by: str | None) -> dict:
+    """
+    Shape usage_summary rows (one is_total row plus one per group) into the
+    totals with an optional `groups` list.
+    """
+    summary, groups = {}, []
+    for row in rows:
+        totals = {key: value for key, value in row.items() if key not in ("is_total", "group_key")}
+        if row["is_total"]:
+            summary = totals
+        else:
+            groups.append({"key": row["group_key"], **totals})
+    summary["groups"] = groups if group_by else None
+    return summary
+
+
+_LOG_DATE_FILTERS = ("created_at >= ${}::text::timestamptz", "created_at <= ${}::text::timestamptz")
+# usage_hourly rows overlapping the range, as usage_series() counts them.
+_ROLLUP_DATE_FILTERS = (
+    "hour > ${}::text::timestamptz - interval '1 hour'", "hour <= ${}::text::timestamptz"
+)
+# End of the newest archived usage_logs month (migration 013); rollups
+# stand in for the raw rows before it.
+_ARCHIVED_UNTIL_SQL = "(SELECT coalesce(max(range_end), '-infinity') FROM usage_log_archives)"
+_ENSURE_USAGE_LOG_PARTITIONS_SQL = "SELECT ensure_usage_logs_partitions()"
+
+
+def _usage_filters(
+    user_id: str,
+    model: str | None = None,
+    provider: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    date_filters: tuple[str, str] = _LOG_DATE_FILTERS,
+) -> tuple[str, list]:
+    """
+    WHERE clause for usage_logs queries. Only the filters actually given are
+    included, so each combination gets its own (cached) specific plan rather
+    than one generic plan full of `$n IS NULL OR ...` branches. Dates are
+    cast from text like PostgREST does, and prune usage_logs partitions.
+    """
+    clauses, args = ["user_id = $1"], [user_id]
+    for condition, value in (
+        ("model = ${}", model),
+        ("provider = ${}", provider),
+        (date_filters[0], start_date),
+        (date_filters[1], end_date),
+    ):
+        if value:
+            args.append(value)
+            clauses.append(condition.format(len(args)))
+    return " AND ".join(clauses), args
+
+
+class PostgresRepository:
+    """Hot-path queries over the shared asyncpg pool."""
+
+    @property
+    def _pool(self):
+        return get_pg_pool()
+
+    async def find_api_key(self, key_hash: str) -> dict | None:
+        record = await self._pool.fetchrow(_FIND_API_KEY_SQL, key_hash)
+        return _row(record) if record else None
+
+    async def find_user_by_auth_id(self, supabase_auth_id: str) -> dict | None:
+        record = await self._pool.fetchrow(_FIND_USER_SQL, supabase_auth_id)
+        return _row(record) if record else None
+
+    async def create_user(self, supabase_auth_id: str, email: str, name: str) -> str | None:
+        async with self._pool.acquire() as conn, conn.transaction():
+            user_id = await conn.fetchval(_CREATE_USER_SQL, supabase_auth_id, email, name)
+            await conn.execute(_CREATE_CREDITS_SQL, user_id)
+        return str(user_id)
+
+    async def get_balance(self, user_id: str) -> float | None:
+        balance = await self._pool.fetchval(_GET_BALANCE_SQL, user_id)
+        return float(balance) if balance is not None else None
+
+    async def get_balances(self, user_ids: list[str]) -> dict[str, float]:
+        records = await self._pool.fetch(_GET_BALANCES_SQL, user_ids)
+        return {str(r["user_id"]): float(r["balance"]) for r in records}
+
+    async def create_credits(self, user_id: str) -> None:
+        await self._pool.execute(_CREATE_CREDITS_SQL, user_id)
+
+    async def apply_credit_change(
+        self,
+        user_id: str,
+        amount: float,
+        type: str,
+        description: str,
+        aggregation_key: str | None = None,
+        event_id: str | None = None,
+    ) -> tuple[float, str]:
+        record = await self._pool.fetchrow(
+            _APPLY_CREDIT_CHANGE_SQL, user_id, Decimal(str(amount)), type, description, aggregation_key, event_id
+        )
+        return float(record["balance"]), str(record["transaction_id"])
+
+    async def apply_usage_debits(
+        self, user_id: str, description: str, aggregation_key: str, event_ids: list[str], amounts: list[float]
+    ) -> tuple[float, str]:
+        record = await self._pool.fetchrow(
+            _APPLY_USAGE_DEBITS_SQL, user_id, description, aggregation_key,
+            event_ids, [Decimal(str(a)) for a in amounts],
+        )
+        return float(record["balance"]), str(record["transaction_id"])
+
+    async def list_transactions(
+        self, user_id: str, limit: int, offset: int, after: tuple[str, str] | None = None
+    ) -> list[dict]:
+        if after:
+            records = await self._pool.fetch(_LIST_TRANSACTIONS_AFTER_SQL, user_id, *after, limit)
+        else:
+            records = await self._pool.fetch(_LIST_TRANSACTIONS_SQL, user_id, limit, offset)
+        return [_row(r) for r in records]
+
+    async def insert_usage_logs(self, rows: list[dict]) -> None:
+        columns = [[row[c] for row in rows] for c in _USAGE_LOG_COLUMNS]
+        for i, column in enumerate(_USAGE_LOG_COLUMNS):
+            if column in ("provider_cost", "vuzo_cost"):
+                columns[i] = [Decimal(str(v)) for v in columns[i]]
+        await self._pool.execute(_INSERT_USAGE_LOGS_SQL, *columns)
+
+    async def list_usage_logs(
+        self,
+        user_id: str,
+        model: str | None,
+        provider: str | None,
+        start_date: str | None,
+        end_date: str | None,
+        limit: int,
+        offset: int,
+        after: tuple[str, str] | None = None,
+    ) -> list[dict]:
+        where, args = _usage_filters(user_id, model, provider, start_date, end_date)
+        if after:
+            args.extend(after)
+            where += f" AND (created_at, id) < (${len(args) - 1}::text::timestamptz, ${len(args)}::uuid)"
+            offset = 0
+        sql = (
+            f"SELECT * FROM usage_logs WHERE {where} ORDER BY created_at DESC, id DESC "
+            f"LIMIT ${len(args) + 1} OFFSET ${len(args) + 2}"
+        )
+        return [_row(r) for r in await self._pool.fetch(sql, *args, limit, offset)]
+
+    async def iter_usage_logs(
+        self,
+        user_id: str,
+        model: str | None,
+        provider: str | None,
+        start_date: str | None,
+        end_date: str | None,
+        columns: tuple[str, ...],
+        batch_size: int,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Matching rows oldest first, one keyset page per batch. Each page is
+        its own query, so a slow download holds no pooled connection while
+        the client reads.
+        """
+        where, args = _usage_filters(user_id, model, provider, start_date, end_date)
+        # The page cursor needs created_at and id even if the caller doesn't.
+        hidden = tuple(c for c in ("created_at", "id") if c not in columns)
+        select = ", ".join(columns + hidden)
+        after = None
+        while True:
+            page_where, page_args = where, list(args)
+            if after:
+                page_args.extend(after)
+                page_where += (
+                    f" AND (created_at, id) > (${len(page_args) - 1}::text::timestamptz, ${len(page_args)}::uuid)"
+                )
+            sql = (
+                f"SELECT {select} FROM usage_logs WHERE {page_where} "
+                f"ORDER BY created_at, id LIMIT ${len(page_args) + 1}"
+            )
+            rows = [_row(r) for r in await self._pool.fetch(sql, *page_args, batch_size)]
+            if not rows:
+                return
+            after = rows[-1]["created_at"], rows[-1]["id"]
+            for row in rows:
+                for column in hidden:
+                    del row[column]
+            yield rows
+            if len(rows) < batch_size:
+                return
+
+    async def usage_summary(
+        self, user_id: str, start_date: str | None, end_date: str | None, group_by: str | None = None
+    ) -> dict:
+        where, args = _usage_filters(user_id, start_date=start_date, end_date=end_date)
+        rollup_where, _ = _usage_filters(
+            user_id, start_date=start_date, end_date=end_date, date_filters=_ROLLUP_DATE_FILTERS
+        )
+        if group_by:
+            expr = _USAGE_GROUP_EXPRESSIONS[group_by]
+            key_columns, grouping = f"grouping({expr}) = 1 AS is_total, {expr} AS group_key", f"({expr})"
+        else:
+            key_columns, grouping = "true AS is_total, NULL::text AS group_key", ""
+        # Live months from usage_logs, archived ones from the hourly rollups.
+        records = await self._pool.fetch(
+            f"""
+            SELECT {key_columns},
+                   coalesce(sum(requests), 0)::bigint AS total_requests,
+                   coalesce(sum(input_tokens), 0)::bigint AS total_input_tokens,
+                   coalesce(sum(output_tokens), 0)::bigint AS total_output_tokens,
+                   coalesce(sum(total_tokens), 0)::bigint AS total_tokens,
+                   coalesce(sum(provider_cost), 0) AS total_provider_cost,
+                   coalesce(sum(vuzo_cost), 0) AS total_vuzo_cost
+            FROM (
+                SELECT model, provider, api_key_id, 1::bigint AS requests, input_tokens, output_tokens,
+                       total_tokens, provider_cost, vuzo_cost
+                FROM usage_logs WHERE {where}
+                UNION ALL
+                SELECT model, provider, api_key_id, request_count, input_tokens, output_tokens,
+                       total_tokens, provider_cost, vuzo_cost
+                FROM usage_hourly WHERE {rollup_where} AND hour < {_ARCHIVED_UNTIL_SQL}
+            ) l
+            GROUP BY GROUPING SETS ((){", " + grouping if grouping else ""})
+            ORDER BY is_total DESC, total_vuzo_cost DESC
+            """,
+            *args,
+        )
+        return _summary_from_rows([_row(r) for r in records], group_by)
+
+    async def usage_series(
+        self,
+        user_id: str,
+        bucket: str,
+        time_zone: str,
+        start_date: str | None,
+        end_date: str | None,
+        model: str | None,
+        provider: str | None,
+        group_by: list[str],
+    ) -> list[dict]:
+        records = await self._pool.fetch(
+            _USAGE_SERIES_SQL, user_id, bucket, time_zone, start_date, end_date, model, provider, group_by
+        )
+        return [_row(r) for r in records]
+
+    async def ensure_usage_log_partitions(self) -> int:
+        return await self._pool.fetchval(_ENSURE_USAGE_LOG_PARTITIONS_SQL)
+
+    async def insert_api_key(self, user_id: str, key_prefix: str, key_hash: str, name: str) -> dict:
+        return _row(await self._pool.fetchrow(_INSERT_API_KEY_SQL, user_id, key_prefix, key_hash, name))
+
+    async def list_api_keys(self, user_id: str) -> list[dict]:
+        return [_row(r) for r in await self._pool.fetch(_LIST_API_KEYS_SQL, user_id)]
+
+    async def deactivate_api_key(self, user_id: str, key_id: str) -> list[dict]:
+        return [_row(r) for r in await self._pool.fetch(_DEACTIVATE_API_KEY_SQL, key_id, user_id)]
+
+
+# ── Supabase REST fallback ──
+
+def _apply_date_filters(query, start_date: str | None, end_date: str | None):
+    if start_date:
+        query = query.gte("created_at", start_date)
+    if end_date:
+        query = query.lte("created_at", end_date)
+    return query
+
+
+def _apply_keyset(query, after: tuple[str, str] | None, offset: int, limit: int):
+    """Newest-first page: rows strictly before the (created_at, id) cursor, or by offset without one."""
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if after:
+        created_at, row_id = after
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})'
+        )
+        return query.limit(limit)
+    return query.range(offset, offset + limit - 1)
+
+
+class SupabaseRepository:
+    """PostgREST equivalents of PostgresRepository, each run in a worker thread."""
+
+    async def find_api_key(self, key_hash: str) -> dict | None:
+        def query():
+            # Unique-index lookup on key_hash with the owning user's
+            # is_active flag embedded via the api_keys.user_id foreign key.
+            return (
+                get_supabase().table("api_keys")
+                .select(
+                    "id, user_id, is_active, rate_limit_rpm, rate_limit_tpm, max_concurrent_requests,"
+                    " users!inner(is_active)"
+                )
+                .eq("key_hash", key_hash)
+                .limit(1)
+                .execute()
+            ).data
+
+        rows = await asyncio.to_thread(query)
+        if not rows:
+            return None
+        row = dict(rows[0])
+        row["user_is_active"] = (row.pop("users", None) or {}).get("is_active", False)
+        return row
+
+    async def find_user_by_auth_id(self, supabase_auth_id: str) -> dict | None:
+        def query():
+            return (
+                get_supabase().table("users")
+                .select("id, is_active")
+                .eq("supabase_auth_id", supabase_auth_id)
+                .execute()
+            ).data
+
+        rows = await asyncio.to_thread(query)
+        return rows[0] if rows else None
+
+    async def create_user(self, supabase_auth_id: str, email: str, name: str) -> str | None:
+        def query():
+            sb = get_supabase()
+            new_user = sb.table("users").insert({
+                "supabase_auth_id": supabase_auth_id,
+                "email": email,
+                "name": name,
+            }).execute()
+            if not new_user.data:
+                return None
+            user_id = new_user.data[0]["id"]
+            sb.table("credits").insert({"user_id": user_id, "balance": 0}).execute()
+            return user_id
+
+        return await asyncio.to_thread(query)
+
+    async def get_balance(self, user_id: str) -> float | None:
+        def query():
+            return get_supabase().table("credits").select("balance").eq("user_id", user_id).execute().data
+
+        rows = await asyncio.to_thread(query)
+        return float(rows[0]["balance"]) if rows else None
+
+    async def get_balances(self, user_ids: list[str]) -> dict[str, float]:
+        def query():
+            return get_supabase().table("credits").select("user_id, balance").in_("user_id", user_ids).execute().data
+
+        rows = await asyncio.to_thread(query) or []
+        return {r["user_id"]: float(r["balance"]) for r in rows}
+
+    async def create_credits(self, user_id: str) -> None:
+        await asyncio.to_thread(
+            lambda: get_supabase().table("credits").insert({"user_id": user_id, "balance": 0}).execute()
+        )
+
+    async def apply_credit_change(
+        self,
+        user_id: str,
+        amount: float,
+        type: str,
+        description: str,
+        aggregation_key: str | None = None,
+        event_id: str | None = None,
+    ) -> tuple[float, str]:
+        def query():
+            return get_supabase().rpc("apply_credit_change", {
+                "p_user_id": user_id,
+                "p_amount": amount,
+                "p_type": type,
+                "p_description": description,
+                "p_aggregation_key": aggregation_key,
+                "p_event_id": event_id,
+            }).execute().data
+
+        row = (await asyncio.to_thread(query))[0]
+        return float(row["balance"]), row["transaction_id"]
+
+    async def apply_usage_debits(
+        self, user_id: str, description: str, aggregation_key: str, event_ids: list[str], amounts: list[float]
+    ) -> tuple[float, str]:
+        def query():
+            return get_supabase().rpc("apply_usage_debits", {
+                "p_user_id": user_id,
+                "p_description": description,
+                "p_aggregation_key": aggregation_key,
+                "p_event_ids": event_ids,
+                "p_amounts": amounts,
+            }).execute().data
+
+        row = (await asyncio.to_thread(query))[0]
+        return float(row["balance"]), row["transaction_id"]
+
+    async def list_transactions(
+        self, user_id: str, limit: int, offset: int, after: tuple[str, str] | None = None
+    ) -> list[dict]:
+        def query():
+            q = get_supabase().table("credit_transactions").select("*").eq("user_id", user_id)
+            return _apply_keyset(q, after, offset, limit).execute().data
+
+        return await asyncio.to_thread(query) or []
+
+    async def insert_usage_logs(self, rows: list[dict]) -> None:
+        payload = [{key: _jsonable(value) for key, value in row.items()} for row in rows]
+        await asyncio.to_thread(
+            lambda: get_supabase().table("usage_logs")
+            .upsert(payload, on_conflict="event_id,created_at", ignore_duplicates=True, returning="minimal")
+            .execute()
+        )
+
+    async def list_usage_logs(
+        self,
+        user_id: str,
+        model: str | None,
+        provider: str | None,
+        start_date: str | None,
+        end_date: str | None,
+        limit: int,
+        offset: int,
+        after: tuple[str, str] | None = None,
+    ) -> list[dict]:
+        def query():
+            q = get_supabase().table("usage_logs").select("*").eq("user_id", user_id)
+            if model:
+                q = q.eq("model", model)
+            if provider:
+                q = q.eq("provider", provider)
+            q = _apply_date_filters(q, start_date, end_date)
+            return _apply_keyset(q, after, offset, limit).execute().data
+
+        return await asyncio.to_thread(query) or []
+
+    async def iter_usage_logs(
+        self,
+        user_id: str,
+        model: str | None,
+        provider: str | None,
+        start_date: str | None,
+        end_date: str | None,
+        columns: tuple[str, ...],
+        batch_size: int,
+    ) -> AsyncIterator[list[dict]]:
+        """Matching rows oldest first, one keyset page per batch."""
+        after = None
+
+        def query():
+            q = get_supabase().table("usage_logs").select(",".join(columns)).eq("user_id", user_id)
+            if model:
+                q = q.eq("model", model)
+            if provider:
+                q = q.eq("provider", provider)
+            q = _apply_date_filters(q, start_date, end_date).order("created_at").order("id")
+            if after:
+                created_at, row_id = after
+                q = q.or_(f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{row_id})')
+            return q.limit(batch_size).execute().data
+
+        while True:
+            rows = await asyncio.to_thread(query) or []
+            if rows:
+                yield rows
+            if len(rows) < batch_size:
+                return
+            after = rows[-1]["created_at"], rows[-1]["id"]
+
+    async def usage_summary(
+        self, user_id: str, start_date: str | None, end_date: str | None, group_by: str | None = None
+    ) -> dict:
+        def query():
+            # Summed in the database (migration 010): one row back however
+            # many requests the user has made, and no PostgREST row cap.
+            return get_supabase().rpc("usage_summary", {
+                "p_user_id": user_id,
+                "p_start_date": start_date,
+                "p_end_date": end_date,
+                "p_group_by": group_by,
+            }).execute().data
+
+        rows = await asyncio.to_thread(query) or []
+        for row in rows:
+            row["total_provider_cost"] = float(row["total_provider_cost"])
+            row["total_vuzo_cost"] = float(row["total_vuzo_cost"])
+        return _summary_from_rows(rows, group_by)
+
+    async def usage_series(
+        self,
+        user_id: str,
+        bucket: str,
+        time_zone: str,
+        start_date: str | None,
+        end_date: str | None,
+        model: str | None,
+        provider: str | None,
+        group_by: list[str],
+    ) -> list[dict]:
+        def query():
+            return get_supabase().rpc("usage_series", {
+                "p_user_id": user_id,
+                "p_bucket": bucket,
+                "p_time_zone": time_zone,
+                "p_start_date": start_date,
+                "p_end_date": end_date,
+                "p_model": model,
+                "p_provider": provider,
+                "p_group_by": group_by,
+            }).execute().data
+
+        rows = await asyncio.to_thread(query) or []
+        for row in rows:
+            row["total_provider_cost"] = float(row["total_provider_cost"])
+            row["total_vuzo_cost"] = float(row["total_vuzo_cost"])
+        return rows
+
+    async def ensure_usage_log_partitions(self) -> int:
+        return await asyncio.to_thread(
+            lambda: get_supabase().rpc("ensure_usage_logs_partitions", {}).execute().data
+        )
+
+    async def insert_api_key(self, user_id: str, key_prefix: str, key_hash: str, name: str) -> dict:
+        def query():
+            return get_supabase().table("api_keys").insert({
+                "user_id": user_id,
+                "key_prefix": key_prefix,
+                "key_hash": key_hash,
+                "name": name,
+            }).execute().data
+
+        return (await asyncio.to_thread(query))[0]
+
+    async def list_api_keys(self, user_id: str) -> list[dict]:
+        def query():
+            return (
+                get_supabase().table("api_keys")
+                .select(
+                    "id, name, key_prefix, is_active, rate_limit_rpm, rate_limit_tpm,"
+                    " max_concurrent_requests, created_at, last_used_at"
+                )
+                .eq("user_id", user_id)
+                .order("created_at", desc=True)
+                .execute()
+            ).data
+
+        return await asyncio.to_thread(query) or []
+
+    async def deactivate_api_key(self, user_id: str, key_id: str) -> list[dict]:
+        def query():
+            return (
+                get_supabase().table("api_keys")
+                .update({"is_active": False})
+                .eq("id", key_id)
+                .eq("user_id", user_id)
+                .execute()
+            ).data
+
+        return await asyncio.to_thread(query) or []
+
+
+postgres_repository = PostgresRepository()
+supabase_repository = SupabaseRepository()
+
+
+def get_repository() -> PostgresRepository | SupabaseRepository:
+    """The Postgres repository when the pool is open, otherwise the REST fallback."""
+    return postgres_repository if get_pg_pool() is not None else supabase_repository
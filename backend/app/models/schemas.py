@@ -80,6 +80,8 @@ class APIKeyListItem(BaseModel):
     key_prefix: str
     is_active: bool
     rate_limit_rpm: int
+    rate_limit_tpm: int
+    max_concurrent_requests: int
     created_at: datetime
     last_used_at: Optional[datetime] = None
 
@@ -108,6 +110,7 @@ class TransactionItem(BaseModel):
     type: TransactionType
     description: str
     created_at: datetime
+    request_count: int = 1  # >1 for usage debits aggregated over a window
 
 
 # ── Usage ───────────────────────────────────────────────────
@@ -125,7 +128,13 @@ class UsageLogItem(BaseModel):
     created_at: datetime
 
 
-class UsageSummary(BaseModel):
+class UsageGroupBy(str, Enum):
+    model = "model"
+    provider = "provider"
+    api_key = "api_key"
+
+
+class UsageTotals(BaseModel):
     total_requests: int
     total_input_tokens: int
     total_output_tokens: int
@@ -134,6 +143,34 @@ class UsageSummary(BaseModel):
     total_vuzo_cost: float
 
 
+class UsageSummaryGroup(UsageTotals):
+    key: Optional[str]  # model, provider or api_key_id, per group_by
+
+
+class UsageSummary(UsageTotals):
+    groups: Optional[list[UsageSummaryGroup]] = None  # only with group_by, by cost descending
+
+
+class UsageBucket(str, Enum):
+    hour = "hour"
+    day = "day"
+    week = "week"  # starting Monday
+    month = "month"
+
+
+class UsageSeriesPoint(UsageTotals):
+    bucket: str  # local start: YYYY-MM-DD, or YYYY-MM-DDTHH:00 for hours
+    model: Optional[str] = None  # set when grouped by it
+    provider: Optional[str] = None
+    api_key_id: Optional[str] = None
+
+
+class UsageExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+    parquet = "parquet"
+
+
 class DailyUsageItem(BaseModel):
     date: str
     model: str
@@ -144,6 +181,17 @@ class DailyUsageItem(BaseModel):
     total_cost: float
 
 
+# ── Dashboard ───────────────────────────────────────────────
+
+class DashboardOverview(BaseModel):
+    """Only the sections asked for with `fields` are present."""
+    balance: Optional[float] = None
+    summary: Optional[UsageSummary] = None
+    daily: Optional[list[DailyUsageItem]] = None
+    api_keys: Optional[list[APIKeyListItem]] = None
+    transactions: Optional[list[TransactionItem]] = None
+
+
 # ── Models listing ──────────────────────────────────────────
 
 class ModelPricingItem(BaseModel):
@@ -162,3 +210,6 @@ class AuthContext(BaseModel):
     user_id: str
     api_key_id: str
     rate_limit_rpm: int
+    # 0 = unlimited
+    rate_limit_tpm: int = 0
+    max_concurrent_requests: int = 0
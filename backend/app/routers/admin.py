@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.dependencies import require_admin
+from app.middleware.auth import get_auth_cache_stats
+from app.middleware.jwt_auth import get_session_cache_stats
+from app.middleware.rate_limiter import rate_limiter
+from app.services.credit_ledger import credit_ledger
+from app.services.invalidation import invalidation_listener
+from app.services.key_activity import last_used_recorder
+from app.services.key_limits import key_limiter
+from app.services.outbox import outbox
+from app.services.pricing_service import get_catalog_stats
+from app.services.read_cache import read_cache
+from app.services.usage_archiver import usage_archiver
+from app.services.usage_writer import usage_log_writer
+from app.utils.loop_watchdog import loop_watchdog
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/metrics")
+async def metrics():
+    """In-process cache and pipeline counters for this worker."""
+    return {
+        "auth_cache": get_auth_cache_stats(),
+        "session_cache": get_session_cache_stats(),
+        "last_used_writes": last_used_recorder.stats(),
+        "catalog": get_catalog_stats(),
+        "invalidation": invalidation_listener.get_stats(),
+        "credit_ledger": credit_ledger.stats(),
+        "read_cache": read_cache.stats(),
+        "usage_logs": usage_log_writer.stats(),
+        "usage_archiver": usage_archiver.stats(),
+        "outbox": outbox.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "key_limits": key_limiter.stats(),
+    }
+
+
+@router.post("/outbox/requeue")
+async def requeue_outbox():
+    """Give this worker's parked outbox events another round of replay attempts."""
+    if not outbox.enabled:
+        raise HTTPException(status_code=409, detail="The outbox is disabled on this worker")
+    return {"requeued": outbox.requeue_dead()}
+
+
+@router.get("/event-loop")
+async def event_loop(reset: bool = Query(False, description="Clear the counters after reading")):
+    """Event-loop lag histogram and the call sites behind the worst stalls."""
+    stats = loop_watchdog.stats()
+    if reset:
+        loop_watchdog.reset()
+    return stats
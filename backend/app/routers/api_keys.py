@@ -17,14 +17,14 @@ async def create_key(
     user_id: str = Depends(get_current_user_id),
 ):
     """Create a new Vuzo API key. The full key is returned only once."""
-    result = create_api_key(user_id, body.name)
+    result = await create_api_key(user_id, body.name)
     return APIKeyCreateResponse(**result)
 
 
 @router.get("", response_model=list[APIKeyListItem])
 async def list_keys(user_id: str = Depends(get_current_user_id)):
     """List all API keys for the authenticated user."""
-    return list_api_keys(user_id)
+    return await list_api_keys(user_id)
 
 
 @router.delete("/{key_id}")
@@ -33,7 +33,7 @@ async def delete_key(
     user_id: str = Depends(get_current_user_id),
 ):
     """Revoke an API key."""
-    success = revoke_api_key(user_id, key_id)
+    success = await revoke_api_key(user_id, key_id)
     if not success:
         raise HTTPException(status_code=404, detail="API key not found")
     return {"message": "API key revoked", "key_id": key_id}
@@ -1,8 +1,10 @@
+import asyncio
+
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-from app.models.database import get_supabase
-from app.config import get_settings
+from app.models.database import get_supabase_auth
+from app.models.repository import get_repository
 
 router = APIRouter()
 
@@ -24,13 +26,10 @@ class RefreshRequest(BaseModel):
 @router.post("/register")
 async def register(body: RegisterRequest):
     """Register a new user via Supabase Auth and create the Vuzo user record."""
-    settings = get_settings()
-    from supabase import create_client
-
-    sb_auth = create_client(settings.supabase_url, settings.supabase_key)
+    sb_auth = get_supabase_auth()
 
     try:
-        auth_response = sb_auth.auth.sign_up({
+        auth_response = await asyncio.to_thread(sb_auth.auth.sign_up, {
             "email": body.email,
             "password": body.password,
         })
@@ -42,29 +41,9 @@ async def register(body: RegisterRequest):
 
     supabase_uid = auth_response.user.id
 
-    sb = get_supabase()
-    existing = (
-        sb.table("users")
-        .select("id")
-        .eq("supabase_auth_id", supabase_uid)
-        .execute()
-    )
-
-    if not existing.data:
-        new_user = (
-            sb.table("users")
-            .insert({
-                "supabase_auth_id": supabase_uid,
-                "email": body.email,
-                "name": body.email.split("@")[0],
-            })
-            .execute()
-        )
-        if new_user.data:
-            sb.table("credits").insert({
-                "user_id": new_user.data[0]["id"],
-                "balance": 0,
-            }).execute()
+    repo = get_repository()
+    if await repo.find_user_by_auth_id(supabase_uid) is None:
+        await repo.create_user(supabase_uid, body.email, body.email.split("@")[0])
 
     session_data = None
     if auth_response.session:
@@ -84,13 +63,10 @@ async def register(body: RegisterRequest):
 @router.post("/login")
 async def login(body: LoginRequest):
     """Sign in with email/password via Supabase Auth."""
-    settings = get_settings()
-    from supabase import create_client
-
-    sb_auth = create_client(settings.supabase_url, settings.supabase_key)
+    sb_auth = get_supabase_auth()
 
     try:
-        auth_response = sb_auth.auth.sign_in_with_password({
+        auth_response = await asyncio.to_thread(sb_auth.auth.sign_in_with_password, {
             "email": body.email,
             "password": body.password,
         })
@@ -114,13 +90,10 @@ async def login(body: LoginRequest):
 @router.post("/refresh")
 async def refresh_token(body: RefreshRequest):
     """Refresh an expired Supabase session token."""
-    settings = get_settings()
-    from supabase import create_client
-
-    sb_auth = create_client(settings.supabase_url, settings.supabase_key)
+    sb_auth = get_supabase_auth()
 
     try:
-        auth_response = sb_auth.auth.refresh_session(body.refresh_token)
+        auth_response = await asyncio.to_thread(sb_auth.auth.refresh_session, body.refresh_token)
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 
 from app.models.schemas import (
     BalanceResponse,
@@ -16,7 +16,7 @@ router = APIRouter()
 @router.get("/balance", response_model=BalanceResponse)
 async def check_balance(user_id: str = Depends(get_current_user_id)):
     """Check the user's credit balance."""
-    balance = get_balance(user_id)
+    balance = await get_balance(user_id)
     return BalanceResponse(user_id=user_id, balance=balance)
 
 
@@ -35,7 +35,7 @@ async def topup_credits(
             status_code=403,
             detail="Direct top-up is disabled in production. Use the Polar checkout flow instead.",
         )
-    new_balance, tx_id = add_credits(user_id, body.amount)
+    new_balance, tx_id = await add_credits(user_id, body.amount)
     return TopUpResponse(
         user_id=user_id,
         amount=body.amount,
@@ -46,9 +46,17 @@ async def topup_credits(
 
 @router.get("/transactions", response_model=list[TransactionItem])
 async def list_transactions(
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Deprecated: use cursor"),
+    cursor: str | None = Query(None, description="X-Next-Cursor from the previous page"),
     user_id: str = Depends(get_current_user_id),
 ):
-    """Get paginated transaction history."""
-    return get_transactions(user_id, limit=limit, offset=offset)
+    """
+    Get paginated transaction history, newest first. When there are more,
+    the X-Next-Cursor header holds the cursor for the next page.
+    """
+    transactions, next_cursor = await get_transactions(user_id, limit=limit, offset=offset, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return transactions
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+
+from app.models.schemas import DashboardOverview
+from app.dependencies import get_current_user_id, get_time_zone
+from app.services.dashboard_service import get_overview, parse_fields
+
+router = APIRouter()
+
+
+@router.get("/overview", response_model=DashboardOverview, response_model_exclude_unset=True)
+async def overview(
+    fields: Optional[str] = Query(
+        None, description="Comma-separated sections: balance, summary, daily, api_keys, transactions (default all)"
+    ),
+    start_date: Optional[str] = Query(None, description="ISO date start for summary and daily"),
+    end_date: Optional[str] = Query(None, description="ISO date end for summary and daily"),
+    tz: str = Depends(get_time_zone),
+    transactions_limit: int = Query(10, ge=1, le=200, description="Most recent transactions to include"),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Everything the dashboard renders in one call: authenticates once and
+    loads the requested sections concurrently.
+    """
+    return await get_overview(
+        user_id,
+        parse_fields(fields),
+        start_date=start_date,
+        end_date=end_date,
+        time_zone=tz,
+        transactions_limit=transactions_limit,
+    )
@@ -1,12 +1,14 @@
+from typing import Mapping
+
 from fastapi import APIRouter, HTTPException
 
 from app.models.schemas import ModelPricingItem
-from app.services.pricing_service import get_all_models
+from app.services.pricing_service import get_all_models, get_catalog
 
 router = APIRouter()
 
 
-def _row_to_item(r: dict) -> ModelPricingItem:
+def _row_to_item(r: Mapping) -> ModelPricingItem:
     inp = float(r["input_price_per_million"])
     out = float(r["output_price_per_million"])
     markup = float(r["vuzo_markup_percent"])
@@ -31,11 +33,10 @@ async def list_models():
 @router.get("/models/{model_name}", response_model=ModelPricingItem)
 async def get_model(model_name: str):
     """Get pricing details for a single model by name."""
-    rows = get_all_models()
-    for r in rows:
-        if r["model_name"] == model_name:
-            return _row_to_item(r)
-    raise HTTPException(
-        status_code=404,
-        detail=f"Model '{model_name}' not found. Use GET /v1/models to see all available models.",
-    )
+    row = get_catalog().models.get(model_name)
+    if row is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Model '{model_name}' not found. Use GET /v1/models to see all available models.",
+        )
+    return _row_to_item(row)
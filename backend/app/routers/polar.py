@@ -140,7 +140,7 @@ async def polar_webhook(request: Request):
         amount_usd = amount_cents / 100.0
 
         if user_id and amount_usd > 0:
-            add_credits(
+            await add_credits(
                 user_id=user_id,
                 amount=amount_usd,
                 description=f"Polar payment: ${amount_usd:.2f}",
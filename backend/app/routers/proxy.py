@@ -2,32 +2,39 @@ import time
 import json
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
 
 from app.models.schemas import ChatCompletionRequest, AuthContext
 from app.middleware.auth import validate_api_key
-from app.services.pricing_service import get_model_pricing, get_provider_api_key
-from app.services.billing_service import check_sufficient_balance, deduct_credits
+from app.services.pricing_service import get_route, get_provider_api_key
+from app.services.billing_service import usage_debit
+from app.services.credit_ledger import Reservation, credit_ledger, estimate_max_cost
+from app.services.key_limits import Lease, estimate_request_tokens, key_limiter
 from app.services.usage_service import log_usage
-from app.services.providers.openai import OpenAIProvider
-from app.services.providers.xai import XAIProvider
-from app.services.providers.google import GoogleProvider
-from app.services.providers.anthropic import AnthropicProvider
 from app.utils.pricing import calculate_cost
 
 router = APIRouter()
 
-_openai = OpenAIProvider()
-_xai = XAIProvider()
-_google = GoogleProvider()
-_anthropic = AnthropicProvider()
-_providers = [_openai, _xai, _google, _anthropic]
 
+class _HeldStreamingResponse(StreamingResponse):
+    """
+    A stream that frees the request's credit hold and concurrency slot once
+    it has been sent, or failed to send, even if the body never started:
+    a client that disconnects first leaves the generator unstarted, so its
+    own finally never runs.
+    """
 
-def _get_provider(model: str):
-    for p in _providers:
-        if p.model_supported(model):
-            return p
-    return None
+    def __init__(self, content, reservation: Reservation, lease: Lease, **kwargs):
+        super().__init__(content, **kwargs)
+        self.reservation = reservation
+        self.lease = lease
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            credit_ledger.release(self.reservation)
+            key_limiter.release(self.lease)
 
 
 @router.post("/chat/completions")
@@ -35,21 +42,27 @@ async def chat_completions(
     request: ChatCompletionRequest,
     auth: AuthContext = Depends(validate_api_key),
 ):
-    pricing = get_model_pricing(request.model)
+    route = get_route(request.model)
+    pricing = route.pricing
+    provider = route.provider
     provider_name: str = pricing["provider"]
 
-    check_sufficient_balance(auth.user_id)
-
-    provider = _get_provider(request.model)
-    if provider is None:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=400, detail=f"No provider found for model '{request.model}'")
-
     master_key = get_provider_api_key(provider_name)
 
+    # Per-key token budget and concurrency slot; raises 429 if exhausted.
+    lease = key_limiter.acquire(auth, estimate_request_tokens(request))
+    try:
+        # Hold the worst-case cost before dispatch; raises 402 if it doesn't fit.
+        reservation = await credit_ledger.reserve(auth.user_id, estimate_max_cost(request, pricing))
+    except BaseException:
+        key_limiter.release(lease)
+        raise
+
     if request.stream:
-        return StreamingResponse(
-            _stream_response(request, provider, master_key, pricing, auth),
+        return _HeldStreamingResponse(
+            _stream_response(request, provider, master_key, pricing, auth, reservation, lease),
+            reservation,
+            lease,
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -59,7 +72,15 @@ async def chat_completions(
         )
 
     start = time.time()
-    result = await provider.chat_completion(request, master_key)
+    try:
+        result = await provider.chat_completion(request, master_key)
+    except BaseException:
+        credit_ledger.release(reservation)
+        raise
+    else:
+        key_limiter.settle(lease, result.input_tokens + result.output_tokens)
+    finally:
+        key_limiter.release(lease)
     elapsed_ms = int((time.time() - start) * 1000)
 
     provider_cost, vuzo_cost = calculate_cost(
@@ -70,13 +91,13 @@ async def chat_completions(
         vuzo_markup_percent=float(pricing["vuzo_markup_percent"]),
     )
 
-    deduct_credits(
-        auth.user_id,
+    await credit_ledger.settle(
+        reservation,
         vuzo_cost,
-        f"{request.model}: {result.input_tokens}in + {result.output_tokens}out tokens",
+        *usage_debit(request.model, f"{request.model}: {result.input_tokens}in + {result.output_tokens}out tokens"),
     )
 
-    log_usage(
+    await log_usage(
         user_id=auth.user_id,
         api_key_id=auth.api_key_id,
         provider=provider_name,
@@ -99,40 +120,51 @@ async def chat_completions(
     return response_data
 
 
-async def _stream_response(request, provider, master_key, pricing, auth: AuthContext):
+async def _stream_response(
+    request, provider, master_key, pricing, auth: AuthContext, reservation: Reservation, lease: Lease
+):
     start = time.time()
     final_usage = None
 
-    async for chunk_str, usage in provider.chat_completion_stream(request, master_key):
-        if usage is not None:
-            final_usage = usage
-        yield chunk_str
-
-    elapsed_ms = int((time.time() - start) * 1000)
-
-    if final_usage:
-        provider_cost, vuzo_cost = calculate_cost(
-            input_tokens=final_usage.input_tokens,
-            output_tokens=final_usage.output_tokens,
-            input_price_per_million=float(pricing["input_price_per_million"]),
-            output_price_per_million=float(pricing["output_price_per_million"]),
-            vuzo_markup_percent=float(pricing["vuzo_markup_percent"]),
-        )
-
-        deduct_credits(
-            auth.user_id,
-            vuzo_cost,
-            f"{request.model}: {final_usage.input_tokens}in + {final_usage.output_tokens}out tokens (stream)",
-        )
-
-        log_usage(
-            user_id=auth.user_id,
-            api_key_id=auth.api_key_id,
-            provider=pricing["provider"],
-            model=request.model,
-            input_tokens=final_usage.input_tokens,
-            output_tokens=final_usage.output_tokens,
-            provider_cost=provider_cost,
-            vuzo_cost=vuzo_cost,
-            response_time_ms=elapsed_ms,
-        )
+    try:
+        async for chunk_str, usage in provider.chat_completion_stream(request, master_key):
+            if usage is not None:
+                final_usage = usage
+            yield chunk_str
+
+        elapsed_ms = int((time.time() - start) * 1000)
+
+        if final_usage:
+            key_limiter.settle(lease, final_usage.input_tokens + final_usage.output_tokens)
+            provider_cost, vuzo_cost = calculate_cost(
+                input_tokens=final_usage.input_tokens,
+                output_tokens=final_usage.output_tokens,
+                input_price_per_million=float(pricing["input_price_per_million"]),
+                output_price_per_million=float(pricing["output_price_per_million"]),
+                vuzo_markup_percent=float(pricing["vuzo_markup_percent"]),
+            )
+
+            await credit_ledger.settle(
+                reservation,
+                vuzo_cost,
+                *usage_debit(
+                    request.model,
+                    f"{request.model}: {final_usage.input_tokens}in + {final_usage.output_tokens}out tokens (stream)",
+                ),
+            )
+
+            await log_usage(
+                user_id=auth.user_id,
+                api_key_id=auth.api_key_id,
+                provider=pricing["provider"],
+                model=request.model,
+                input_tokens=final_usage.input_tokens,
+                output_tokens=final_usage.output_tokens,
+                provider_cost=provider_cost,
+                vuzo_cost=vuzo_cost,
+                response_time_ms=elapsed_ms,
+            )
+    finally:
+        # Frees the hold if the stream failed, was abandoned or reported no usage.
+        credit_ledger.release(reservation)
+        key_limiter.release(lease)
@@ -1,25 +1,34 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from typing import Optional
 
-from app.models.schemas import UsageLogItem, UsageSummary, DailyUsageItem
-from app.dependencies import get_current_user_id
-from app.services.usage_service import get_usage_logs, get_usage_summary, get_daily_usage
+from app.models.schemas import (
+    UsageLogItem, UsageSummary, UsageGroupBy, UsageBucket, UsageSeriesPoint, UsageExportFormat, DailyUsageItem,
+)
+from app.dependencies import get_current_user_id, get_time_zone
+from app.services.usage_export import EXPORT_FORMATS, export_usage_logs
+from app.services.usage_service import get_usage_logs, get_usage_summary, get_daily_usage, get_usage_series
 
 router = APIRouter()
 
 
 @router.get("", response_model=list[UsageLogItem])
 async def list_usage(
+    response: Response,
     model: Optional[str] = Query(None, description="Filter by model name"),
     provider: Optional[str] = Query(None, description="Filter by provider"),
     start_date: Optional[str] = Query(None, description="ISO date start (e.g. 2026-02-11T00:00:00Z)"),
     end_date: Optional[str] = Query(None, description="ISO date end (e.g. 2026-02-18T23:59:59Z)"),
     limit: int = Query(50, ge=1, le=200),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Deprecated: use cursor"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
     user_id: str = Depends(get_current_user_id),
 ):
-    """Get paginated usage logs with optional filters."""
-    return get_usage_logs(
+    """
+    Get paginated usage logs with optional filters, newest first. When there
+    are more, the X-Next-Cursor header holds the cursor for the next page.
+    """
+    logs, next_cursor = await get_usage_logs(
         user_id=user_id,
         model=model,
         provider=provider,
@@ -27,6 +36,29 @@ async def list_usage(
         end_date=end_date,
         limit=limit,
         offset=offset,
+        cursor=cursor,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return logs
+
+
+@router.get("/export")
+async def export_usage(
+    format: UsageExportFormat = Query(UsageExportFormat.ndjson, description="ndjson, csv or parquet"),
+    model: Optional[str] = Query(None, description="Filter by model name"),
+    provider: Optional[str] = Query(None, description="Filter by provider"),
+    start_date: Optional[str] = Query(None, description="ISO date start"),
+    end_date: Optional[str] = Query(None, description="ISO date end"),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Stream every usage log in the range, oldest first, as a file download."""
+    media_type, extension = EXPORT_FORMATS[format.value]
+    body = export_usage_logs(
+        user_id, format.value, model=model, provider=provider, start_date=start_date, end_date=end_date
+    )
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="vuzo-usage.{extension}"'}
     )
 
 
@@ -34,10 +66,18 @@ async def list_usage(
 async def usage_summary(
     start_date: Optional[str] = Query(None, description="ISO date start"),
     end_date: Optional[str] = Query(None, description="ISO date end"),
+    group_by: Optional[UsageGroupBy] = Query(None, description="Also break totals down by model, provider or api_key"),
+    tz: str = Depends(get_time_zone),
     user_id: str = Depends(get_current_user_id),
 ):
-    """Get aggregated usage summary, optionally scoped to a date range."""
-    return get_usage_summary(user_id, start_date=start_date, end_date=end_date)
+    """Get aggregated usage summary, optionally scoped to a date range and grouped."""
+    return await get_usage_summary(
+        user_id,
+        start_date=start_date,
+        end_date=end_date,
+        group_by=group_by.value if group_by else None,
+        time_zone=tz,
+    )
 
 
 @router.get("/daily", response_model=list[DailyUsageItem])
@@ -46,13 +86,39 @@ async def daily_usage(
     provider: Optional[str] = Query(None, description="Filter by provider"),
     start_date: Optional[str] = Query(None, description="ISO date start"),
     end_date: Optional[str] = Query(None, description="ISO date end"),
+    tz: str = Depends(get_time_zone),
     user_id: str = Depends(get_current_user_id),
 ):
-    """Get usage aggregated by day and model."""
-    return get_daily_usage(
+    """Get usage aggregated by local day and model."""
+    return await get_daily_usage(
         user_id=user_id,
         model=model,
         provider=provider,
         start_date=start_date,
         end_date=end_date,
+        time_zone=tz,
+    )
+
+
+@router.get("/timeseries", response_model=list[UsageSeriesPoint])
+async def usage_timeseries(
+    bucket: UsageBucket = Query(UsageBucket.day, description="hour, day, week or month"),
+    group_by: list[UsageGroupBy] = Query([], description="Split each bucket by model, provider and/or api_key"),
+    model: Optional[str] = Query(None, description="Filter by model name"),
+    provider: Optional[str] = Query(None, description="Filter by provider"),
+    start_date: Optional[str] = Query(None, description="ISO date start"),
+    end_date: Optional[str] = Query(None, description="ISO date end"),
+    tz: str = Depends(get_time_zone),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Get usage per time bucket for charts, newest first."""
+    return await get_usage_series(
+        user_id=user_id,
+        bucket=bucket.value,
+        time_zone=tz,
+        start_date=start_date,
+        end_date=end_date,
+        model=model,
+        provider=provider,
+        group_by=[g.value for g in group_by],
     )
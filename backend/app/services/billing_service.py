@@ -1,22 +1,34 @@
+import time
+from datetime import datetime, timezone
+
 from fastapi import HTTPException
-from app.models.database import get_supabase
+from app.config import get_settings
+from app.models.repository import get_repository
+from app.services.credit_ledger import credit_ledger
+from app.services.read_cache import read_cache
+from app.utils.pagination import cursor_position, split_page
+
+
+async def _load_balance(user_id: str) -> float:
+    repo = get_repository()
+    balance = await repo.get_balance(user_id)
+    if balance is None:
+        await repo.create_credits(user_id)
+        return 0.0
+    return balance
 
 
-def get_balance(user_id: str) -> float:
-    sb = get_supabase()
-    result = sb.table("credits").select("balance").eq("user_id", user_id).execute()
-    if not result.data:
-        sb.table("credits").insert({"user_id": user_id, "balance": 0}).execute()
-        return 0.0
-    return float(result.data[0]["balance"])
+async def get_balance(user_id: str) -> float:
+    """The committed balance, through the per-user read cache."""
+    return await read_cache.get(user_id, "balance", None, lambda: _load_balance(user_id))
 
 
-def check_sufficient_balance(user_id: str, min_amount: float = 0.001) -> float:
+async def check_sufficient_balance(user_id: str, min_amount: float = 0.001) -> float:
     """
     Check that the user has at least min_amount in credits.
     Returns the current balance. Raises 402 if insufficient.
     """
-    balance = get_balance(user_id)
+    balance = await get_balance(user_id)
     if balance < min_amount:
         raise HTTPException(
             status_code=402,
@@ -25,63 +37,61 @@ def check_sufficient_balance(user_id: str, min_amount: float = 0.001) -> float:
     return balance
 
 
-def deduct_credits(user_id: str, amount: float, description: str) -> float:
-    """
-    Deduct credits from the user's balance and record a transaction.
-    Returns the new balance.
+def usage_debit(model: str, description: str) -> tuple[str, str | None]:
     """
-    sb = get_supabase()
+    Return the (description, aggregation_key) to charge a usage debit under.
 
-    current = get_balance(user_id)
-    new_balance = current - amount
+    With USAGE_DEBIT_WINDOW_SECONDS at 0, every request gets its own
+    credit_transactions row with the per-request description. Otherwise
+    debits for the same model in the same window are added to one row,
+    which is labelled with the window start.
+    """
+    window = get_settings().usage_debit_window_seconds
+    if window <= 0:
+        return description, None
+    window_start = int(time.time() // window * window)
+    label = datetime.fromtimestamp(window_start, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return f"{model}: usage from {label} UTC ({window}s window)", f"{model}@{window_start}/{window}"
 
-    sb.table("credits").update(
-        {"balance": new_balance, "updated_at": "now()"}
-    ).eq("user_id", user_id).execute()
 
-    sb.table("credit_transactions").insert({
-        "user_id": user_id,
-        "amount": -amount,
-        "type": "usage",
-        "description": description,
-    }).execute()
+async def deduct_credits(
+    user_id: str, amount: float, description: str, aggregation_key: str | None = None
+) -> float:
+    """
+    Deduct credits from the user's balance and record a transaction.
+    Returns the new balance.
 
+    The decrement and the ledger write happen in one transaction inside the
+    apply_credit_change() RPC, so concurrent deductions never lose an update.
+    With an aggregation_key the amount is added to that key's existing row
+    (see usage_debit).
+    """
+    new_balance, _ = await get_repository().apply_credit_change(
+        user_id, -amount, "usage", description, aggregation_key
+    )
+    read_cache.invalidate_balance(user_id)
+    credit_ledger.observe_balance(user_id, new_balance)
     return new_balance
 
 
-def add_credits(user_id: str, amount: float, description: str = "Credit top-up") -> tuple[float, str]:
+async def add_credits(user_id: str, amount: float, description: str = "Credit top-up") -> tuple[float, str]:
     """
-    Add credits to the user's balance.
+    Add credits to the user's balance atomically (see deduct_credits).
     Returns (new_balance, transaction_id).
     """
-    sb = get_supabase()
-
-    current = get_balance(user_id)
-    new_balance = current + amount
-
-    sb.table("credits").update(
-        {"balance": new_balance, "updated_at": "now()"}
-    ).eq("user_id", user_id).execute()
-
-    tx_result = sb.table("credit_transactions").insert({
-        "user_id": user_id,
-        "amount": amount,
-        "type": "topup",
-        "description": description,
-    }).execute()
-
-    tx_id = tx_result.data[0]["id"] if tx_result.data else ""
+    new_balance, tx_id = await get_repository().apply_credit_change(user_id, amount, "topup", description)
+    read_cache.invalidate_balance(user_id)
+    credit_ledger.observe_balance(user_id, new_balance)
     return new_balance, tx_id
 
 
-def get_transactions(user_id: str, limit: int = 50, offset: int = 0) -> list[dict]:
-    sb = get_supabase()
-    result = (
-        sb.table("credit_transactions")
-        .select("*")
-        .eq("user_id", user_id)
-        .order("created_at", desc=True)
-        .range(offset, offset + limit - 1)
-        .execute()
-    )
-    return result.data or []
+async def get_transactions(
+    user_id: str, limit: int = 50, offset: int = 0, cursor: str | None = None
+) -> tuple[list[dict], str | None]:
+    """
+    One page of transactions, newest first, and the cursor for the next page
+    (None on the last). With a cursor the page is a keyset seek and offset
+    must be 0.
+    """
+    rows = await get_repository().list_transactions(user_id, limit + 1, offset, cursor_position(cursor, offset))
+    return split_page(rows, limit)
@@ -0,0 +1,271 @@
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Mapping
+
+from fastapi import HTTPException
+
+from app.models.repository import get_repository
+from app.models.schemas import ChatCompletionRequest
+from app.services.outbox import OutboxEvent, outbox
+from app.services.read_cache import read_cache
+from app.utils.pricing import calculate_cost, estimate_prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+# Completion budget assumed when a request doesn't set max_tokens.
+_DEFAULT_MAX_COMPLETION_TOKENS = 4096
+# Floor for any reservation (the old admission threshold).
+_MIN_RESERVATION = 0.001
+# Reservations whose request never settled or released (e.g. a stream the
+# client abandoned before the first byte) are dropped after this long.
+_RESERVATION_TTL_SECONDS = 600
+# Accounts with nothing reserved or in flight are forgotten after this long.
+_IDLE_ACCOUNT_SECONDS = 600
+
+
+def estimate_max_cost(request: ChatCompletionRequest, pricing: Mapping) -> float:
+    """
+    Worst-case Vuzo cost of a request: the estimated prompt plus the full
+    max_tokens budget at the model's prices, markup included.
+    """
+    _, vuzo_cost = calculate_cost(
+        input_tokens=estimate_prompt_tokens(request.messages),
+        output_tokens=request.max_tokens or _DEFAULT_MAX_COMPLETION_TOKENS,
+        input_price_per_million=float(pricing["input_price_per_million"]),
+        output_price_per_million=float(pricing["output_price_per_million"]),
+        vuzo_markup_percent=float(pricing["vuzo_markup_percent"]),
+    )
+    return max(vuzo_cost, _MIN_RESERVATION)
+
+
+@dataclass(frozen=True)
+class Reservation:
+    id: int
+    user_id: str
+    amount: float
+
+
+@dataclass
+class _Account:
+    balance: float
+    # reservation id -> (amount, created_at monotonic)
+    reservations: dict[int, tuple[float, float]] = field(default_factory=dict)
+    # charges sent to the database whose result hasn't come back yet
+    in_flight: float = 0.0
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def reserved(self) -> float:
+        return sum(amount for amount, _ in self.reservations.values())
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.reservations) or self.in_flight > 0
+
+
+class CreditLedger:
+    """
+    Per-worker view of user balances with pre-authorisation.
+
+    reserve() holds a request's worst-case cost against the cached balance
+    before the provider is called. It is a dict operation once the account
+    is loaded, so admission never waits on a database read. settle() swaps
+    the hold for the real cost and charges it atomically through
+    apply_credit_change(). release() drops the hold when the request fails.
+
+    The cached balance is reconciled with `credits` whenever a charge
+    returns, on every credits change announced by the invalidation bus
+    (top-ups, other workers' charges), and by a periodic sync(). Each
+    reconciliation subtracts this worker's charges still in flight, so
+    the view errs low. Overdraft is bounded by how far actual cost exceeds
+    the estimate, plus whatever other workers admit in the same instant.
+
+    With the outbox open, settle() commits the charge to it and returns
+    without a database round trip; the charge stays in flight until the
+    replay task has applied it (apply_replayed_charges).
+    """
+
+    def __init__(self):
+        self._accounts: dict[str, _Account] = {}
+        self._loading: dict[str, asyncio.Future] = {}
+        # outbox event_id -> (user_id, cost) for charges this worker queued
+        self._queued_charges: dict[str, tuple[str, float]] = {}
+        self._ids = itertools.count(1)
+        self.stats_counters = {
+            "admitted": 0, "rejected": 0, "settled": 0, "released": 0, "expired": 0,
+            "underestimated": 0, "loads": 0, "syncs": 0, "sync_failures": 0, "coalesced_charges": 0,
+        }
+
+    async def _account(self, user_id: str) -> _Account:
+        account = self._accounts.get(user_id)
+        if account is not None:
+            return account
+        # Coalesce concurrent first requests for the same user into one read.
+        pending = self._loading.get(user_id)
+        if pending is None:
+            pending = self._loading[user_id] = asyncio.ensure_future(self._load(user_id))
+        try:
+            return await asyncio.shield(pending)
+        finally:
+            if pending.done():
+                self._loading.pop(user_id, None)
+
+    async def _load(self, user_id: str) -> _Account:
+        repo = get_repository()
+        balance = await repo.get_balance(user_id)
+        if balance is None:
+            await repo.create_credits(user_id)
+            balance = 0.0
+        self.stats_counters["loads"] += 1
+        return self._accounts.setdefault(user_id, _Account(balance=balance))
+
+    async def reserve(self, user_id: str, amount: float) -> Reservation:
+        """Hold `amount` against the user's balance. Raises 402 if it doesn't fit."""
+        account = await self._account(user_id)
+        account.last_used = time.monotonic()
+        reserved = account.reserved
+        if account.balance - reserved < amount:
+            self.stats_counters["rejected"] += 1
+            detail = f"Insufficient credits. Balance: ${account.balance:.6f}"
+            if reserved:
+                detail += f" (${reserved:.6f} held by in-flight requests)"
+            raise HTTPException(
+                status_code=402,
+                detail=f"{detail}. This request may cost up to ${amount:.6f}. Please top up.",
+            )
+        reservation = Reservation(next(self._ids), user_id, amount)
+        account.reservations[reservation.id] = (amount, time.monotonic())
+        self.stats_counters["admitted"] += 1
+        return reservation
+
+    def release(self, reservation: Reservation) -> None:
+        """Drop a hold without charging. A no-op once settled or released."""
+        account = self._accounts.get(reservation.user_id)
+        if account is not None and account.reservations.pop(reservation.id, None) is not None:
+            self.stats_counters["released"] += 1
+
+    async def settle(
+        self, reservation: Reservation, cost: float, description: str, aggregation_key: str | None = None
+    ) -> float:
+        """Replace the hold with the actual cost and charge it. Returns the new balance."""
+        account = self._accounts.get(reservation.user_id)
+        if account is None:
+            account = await self._account(reservation.user_id)
+        account.reservations.pop(reservation.id, None)
+        if cost > reservation.amount:
+            self.stats_counters["underestimated"] += 1
+        account.balance -= cost
+        account.in_flight += cost
+        if outbox.enabled:
+            event_id = outbox.append("charge", {
+                "user_id": reservation.user_id, "amount": -cost,
+                "description": description, "aggregation_key": aggregation_key,
+            })
+            self._queued_charges[event_id] = (reservation.user_id, cost)
+            self.stats_counters["settled"] += 1
+            return account.balance
+        try:
+            new_balance, _ = await get_repository().apply_credit_change(
+                reservation.user_id, -cost, "usage", description, aggregation_key
+            )
+        except BaseException:
+            account.in_flight -= cost
+            account.balance += cost
+            raise
+        account.in_flight -= cost
+        account.balance = new_balance - account.in_flight
+        read_cache.invalidate_balance(reservation.user_id)
+        self.stats_counters["settled"] += 1
+        return new_balance
+
+    async def apply_replayed_charges(self, events: list[OutboxEvent]) -> None:
+        """
+        Outbox handler: apply queued charges, once each by event_id. Charges
+        in the batch that share an aggregation key (same user, model and
+        debit window) are summed into one apply_usage_debits() call, so a
+        busy user's window row is written once per replay pass rather than
+        once per request.
+        """
+        repo = get_repository()
+        # Un-aggregated charges are keyed by their own event id, so each stays alone.
+        windows: dict[tuple[str, str], list[OutboxEvent]] = {}
+        for event in events:
+            key = event.payload["aggregation_key"] or event.event_id
+            windows.setdefault((event.payload["user_id"], key), []).append(event)
+
+        for (user_id, _), window in windows.items():
+            if len(window) == 1:
+                charge = window[0].payload
+                new_balance, _ = await repo.apply_credit_change(
+                    user_id, charge["amount"], "usage", charge["description"],
+                    charge["aggregation_key"], window[0].event_id,
+                )
+                self._replayed(user_id, window, new_balance)
+                continue
+            aggregation_key = window[0].payload["aggregation_key"]
+            new_balance, _ = await repo.apply_usage_debits(
+                user_id, window[-1].payload["description"], aggregation_key,
+                [e.event_id for e in window], [e.payload["amount"] for e in window],
+            )
+            self.stats_counters["coalesced_charges"] += len(window) - 1
+            self._replayed(user_id, window, new_balance)
+
+    def _replayed(self, user_id: str, events: list[OutboxEvent], new_balance: float) -> None:
+        read_cache.invalidate_balance(user_id)
+        account = self._accounts.get(user_id)
+        for event in events:
+            queued = self._queued_charges.pop(event.event_id, None)
+            if account is not None and queued is not None:
+                account.in_flight -= queued[1]
+        if account is not None:
+            account.balance = new_balance - account.in_flight
+
+    def observe_balance(self, user_id: str, balance: float) -> None:
+        """Reconcile with a committed `credits` balance (top-ups, invalidation events)."""
+        account = self._accounts.get(user_id)
+        if account is not None:
+            account.balance = balance - account.in_flight
+
+    def forget(self, user_id: str) -> None:
+        account = self._accounts.get(user_id)
+        if account is not None and not account.busy:
+            del self._accounts[user_id]
+
+    async def sync(self) -> None:
+        """Reload cached balances, expire stale holds and drop idle accounts."""
+        now = time.monotonic()
+        for user_id, account in list(self._accounts.items()):
+            for reservation_id, (_, created_at) in list(account.reservations.items()):
+                if now - created_at > _RESERVATION_TTL_SECONDS:
+                    del account.reservations[reservation_id]
+                    self.stats_counters["expired"] += 1
+            if not account.busy and now - account.last_used > _IDLE_ACCOUNT_SECONDS:
+                del self._accounts[user_id]
+
+        if not self._accounts:
+            return
+        try:
+            balances = await get_repository().get_balances(list(self._accounts))
+        except Exception:
+            self.stats_counters["sync_failures"] += 1
+            raise
+        for user_id, balance in balances.items():
+            self.observe_balance(user_id, balance)
+        self.stats_counters["syncs"] += 1
+
+    def stats(self) -> dict:
+        accounts = list(self._accounts.values())
+        return {
+            "accounts": len(accounts),
+            "open_reservations": sum(len(a.reservations) for a in accounts),
+            "reserved_total": round(sum(a.reserved for a in accounts), 6),
+            "queued_charges": len(self._queued_charges),
+            **self.stats_counters,
+        }
+
+
+credit_ledger = CreditLedger()
+outbox.register("charge", credit_ledger.apply_replayed_charges)
@@ -0,0 +1,55 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from app.services.billing_service import get_balance, get_transactions
+from app.services.key_service import list_api_keys
+from app.services.usage_service import get_daily_usage, get_usage_summary
+
+OVERVIEW_FIELDS = ("balance", "summary", "daily", "api_keys", "transactions")
+
+
+def parse_fields(fields: str | None) -> list[str]:
+    """Requested overview sections from a comma-separated list (all when empty), as a 400 if unknown."""
+    requested = list(dict.fromkeys(f.strip() for f in (fields or "").split(",") if f.strip()))
+    if not requested:
+        return list(OVERVIEW_FIELDS)
+    unknown = [f for f in requested if f not in OVERVIEW_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(OVERVIEW_FIELDS)}",
+        )
+    return requested
+
+
+async def get_overview(
+    user_id: str,
+    fields: list[str],
+    start_date: str | None = None,
+    end_date: str | None = None,
+    time_zone: str = "UTC",
+    transactions_limit: int = 10,
+) -> dict:
+    """
+    The dashboard's sections for one user, fetched concurrently. Each is
+    what its own endpoint would return; sections not in `fields` are left
+    out. The date range applies to the summary and daily usage.
+    """
+    async def transactions():
+        rows, _ = await get_transactions(user_id, limit=transactions_limit)
+        return rows
+
+    loaders = {
+        "balance": lambda: get_balance(user_id),
+        "summary": lambda: get_usage_summary(
+            user_id, start_date=start_date, end_date=end_date, time_zone=time_zone
+        ),
+        "daily": lambda: get_daily_usage(
+            user_id, start_date=start_date, end_date=end_date, time_zone=time_zone
+        ),
+        "api_keys": lambda: list_api_keys(user_id),
+        "transactions": transactions,
+    }
+    results = await asyncio.gather(*(loaders[field]() for field in fields))
+    return dict(zip(fields, results))
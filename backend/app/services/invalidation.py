@@ -0,0 +1,274 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+import asyncpg
+
+from app.middleware.auth import invalidate_api_key, invalidate_user
+from app.middleware.jwt_auth import invalidate_session_user
+from app.models.database import get_supabase
+from app.services.credit_ledger import credit_ledger
+from app.services.pricing_service import refresh_catalog_async
+from app.services.read_cache import read_cache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "vuzo_cache_invalidation"
+_EVENTS_TABLE = "cache_invalidation_events"
+_READERS_TABLE = "cache_invalidation_readers"
+# A poll that returns a full batch is followed by another one right away.
+_POLL_BATCH_SIZE = 500
+# Sequence ids are assigned at insert but become visible at commit, so a
+# lower id can appear after a higher one. Polls re-read this many ids below
+# the high-water mark; the seen-set keeps that from re-applying events.
+_POLL_OVERLAP_IDS = 200
+_SEEN_IDS_MAX = 10_000
+_REPORT_EVERY_POLLS = 10
+_PRUNE_EVERY_POLLS = 100
+# Events are pruned once they are this old and every polling worker that
+# reported its position within the same window has read past them.
+_PRUNE_AGE = timedelta(minutes=10)
+
+
+# ── Handlers: table name -> callables taking the event payload ──
+
+def _evict_api_key(payload: dict) -> None:
+    for field in ("key_hash", "old_key_hash"):
+        if payload.get(field):
+            invalidate_api_key(payload[field])
+
+
+def _evict_user(payload: dict) -> None:
+    if payload.get("user_id"):
+        invalidate_user(payload["user_id"])
+        invalidate_session_user(payload["user_id"])
+
+
+def _reconcile_credits(payload: dict) -> None:
+    if not payload.get("user_id"):
+        return
+    if payload.get("op") == "DELETE":
+        credit_ledger.forget(payload["user_id"])
+    elif payload.get("balance") is not None:
+        credit_ledger.observe_balance(payload["user_id"], float(payload["balance"]))
+
+
+def _evict_balance(payload: dict) -> None:
+    if payload.get("user_id"):
+        read_cache.invalidate_balance(payload["user_id"])
+
+
+_catalog_refresh: asyncio.Task | None = None
+
+
+def _schedule_catalog_refresh(payload: dict) -> None:
+    """Debounced: a burst of pricing/key edits triggers a single reload."""
+    global _catalog_refresh
+    if _catalog_refresh is not None and not _catalog_refresh.done():
+        return
+    _catalog_refresh = asyncio.get_running_loop().create_task(_refresh_catalog_after_burst())
+
+
+async def _refresh_catalog_after_burst() -> None:
+    await asyncio.sleep(0.05)
+    try:
+        await refresh_catalog_async()
+    except Exception:
+        logger.exception("Catalog refresh after invalidation failed")
+
+
+HANDLERS: dict[str, list[Callable[[dict], None]]] = {
+    "api_keys": [_evict_api_key],
+    "users": [_evict_user],
+    "credits": [_reconcile_credits, _evict_balance],
+    "model_pricing": [_schedule_catalog_refresh],
+    "provider_keys": [_schedule_catalog_refresh],
+}
+
+
+class InvalidationListener:
+    """
+    Lifespan-managed task that applies invalidation events from the database
+    to this worker's in-process caches.
+
+    With DATABASE_URL set it holds one LISTEN connection and reacts within
+    milliseconds. Without it, or while that connection is down, it polls
+    cache_invalidation_events by id through Supabase every `poll_interval`
+    seconds, or back to back while it is behind. Events carry their row
+    id, so one delivered by both paths is applied once (evictions are
+    idempotent anyway).
+    """
+
+    def __init__(self, dsn: str = "", poll_interval: float = 2.0, listen_retry_interval: float = 30.0):
+        self.dsn = dsn
+        self.poll_interval = poll_interval
+        self.listen_retry_interval = listen_retry_interval
+        self.last_event_id = 0
+        self.reader_id = uuid.uuid4().hex
+        self._seen_ids: set[int] = set()
+        self._seen_order: deque[int] = deque()
+        self.mode = "stopped"
+        self.stats = {"received": 0, "applied": 0, "duplicates": 0, "handler_errors": 0, "polls": 0,
+                      "catch_up_polls": 0, "listen_failures": 0}
+
+    def configure(self, dsn: str, poll_interval: float) -> None:
+        self.dsn = dsn
+        self.poll_interval = poll_interval
+
+    def dispatch(self, payload: dict) -> None:
+        """Apply one event to every handler registered for its table."""
+        self.stats["received"] += 1
+        event_id = payload.get("event_id")
+        if event_id is not None:
+            if event_id in self._seen_ids:
+                self.stats["duplicates"] += 1
+                return
+            self._seen_ids.add(event_id)
+            self._seen_order.append(event_id)
+            if len(self._seen_order) > _SEEN_IDS_MAX:
+                self._seen_ids.discard(self._seen_order.popleft())
+            self.last_event_id = max(self.last_event_id, event_id)
+
+        for handler in HANDLERS.get(payload.get("table", ""), []):
+            try:
+                handler(payload)
+            except Exception:
+                self.stats["handler_errors"] += 1
+                logger.exception("Invalidation handler %s failed", handler.__name__)
+        self.stats["applied"] += 1
+
+    def _on_notify(self, connection, pid, channel, raw: str) -> None:
+        try:
+            self.dispatch(json.loads(raw))
+        except json.JSONDecodeError:
+            logger.warning("Ignoring malformed invalidation payload: %r", raw)
+
+    # ── Polling fallback ──
+
+    def _fetch_since(self, after_id: int) -> list[dict]:
+        result = (
+            get_supabase().table(_EVENTS_TABLE)
+            .select("id, payload")
+            .gt("id", after_id)
+            .order("id")
+            .limit(_POLL_BATCH_SIZE)
+            .execute()
+        )
+        return result.data or []
+
+    def _latest_event_id(self) -> int:
+        result = (
+            get_supabase().table(_EVENTS_TABLE)
+            .select("id")
+            .order("id", desc=True)
+            .limit(1)
+            .execute()
+        )
+        return result.data[0]["id"] if result.data else 0
+
+    def _report_position(self) -> None:
+        get_supabase().table(_READERS_TABLE).upsert({
+            "reader_id": self.reader_id,
+            "last_event_id": self.last_event_id,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }).execute()
+
+    def _prune(self) -> None:
+        """Delete old events that every recently active poller has read, and readers gone quiet."""
+        cutoff = (datetime.now(timezone.utc) - _PRUNE_AGE).isoformat()
+        sb = get_supabase()
+        slowest = (
+            sb.table(_READERS_TABLE)
+            .select("last_event_id")
+            .gte("updated_at", cutoff)
+            .order("last_event_id")
+            .limit(1)
+            .execute()
+        )
+        read_up_to = min(
+            [self.last_event_id] + [row["last_event_id"] for row in slowest.data or []]
+        ) - _POLL_OVERLAP_IDS
+        sb.table(_EVENTS_TABLE).delete().lt("created_at", cutoff).lt("id", read_up_to).execute()
+        sb.table(_READERS_TABLE).delete().lt("updated_at", cutoff).execute()
+
+    async def poll_once(self) -> int:
+        """Apply every event not seen yet. Returns the number of rows read."""
+        after_id = max(self.last_event_id - _POLL_OVERLAP_IDS, 0)
+        rows = await asyncio.to_thread(self._fetch_since, after_id)
+        for row in rows:
+            self.dispatch({**row["payload"], "event_id": row["id"]})
+        self.stats["polls"] += 1
+        if self.stats["polls"] % _REPORT_EVERY_POLLS == 1:
+            try:
+                await asyncio.to_thread(self._report_position)
+            except Exception:
+                logger.warning("Recording the %s position failed", _EVENTS_TABLE)
+        if self.stats["polls"] % _PRUNE_EVERY_POLLS == 0:
+            try:
+                await asyncio.to_thread(self._prune)
+            except Exception:
+                logger.warning("Pruning %s failed", _EVENTS_TABLE)
+        return len(rows)
+
+    async def _poll_for(self, duration: float) -> None:
+        self.mode = "polling"
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            try:
+                if await self.poll_once() >= _POLL_BATCH_SIZE:
+                    self.stats["catch_up_polls"] += 1
+                    continue  # behind: read the next batch now
+            except Exception:
+                logger.warning("Invalidation poll failed", exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+    # ── LISTEN ──
+
+    async def _listen(self) -> None:
+        """Hold a LISTEN connection until it drops."""
+        conn = await asyncpg.connect(self.dsn)
+        lost = asyncio.Event()
+        conn.add_termination_listener(lambda _: lost.set())
+        try:
+            await conn.add_listener(CHANNEL, self._on_notify)
+            self.mode = "listening"
+            # Catch up on anything committed while we weren't listening.
+            try:
+                await self.poll_once()
+            except Exception:
+                logger.warning("Invalidation catch-up poll failed", exc_info=True)
+            await lost.wait()
+        finally:
+            self.mode = "reconnecting"
+            if not conn.is_closed():
+                await conn.close()
+
+    async def run(self) -> None:
+        try:
+            self.last_event_id = await asyncio.to_thread(self._latest_event_id)
+        except Exception:
+            logger.warning("Could not read latest invalidation event id; starting from 0")
+
+        while True:
+            if self.dsn:
+                try:
+                    await self._listen()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    self.stats["listen_failures"] += 1
+                    logger.warning("LISTEN %s unavailable; polling instead", CHANNEL, exc_info=True)
+                await self._poll_for(self.listen_retry_interval)
+            else:
+                await self._poll_for(float("inf"))
+
+    def get_stats(self) -> dict:
+        return {"mode": self.mode, "last_event_id": self.last_event_id, **self.stats}
+
+
+invalidation_listener = InvalidationListener()
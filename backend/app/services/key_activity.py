@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from datetime import datetime, timezone
+
+from app.models.database import get_supabase
+
+
+class LastUsedRecorder:
+    """
+    Write-behind buffer for api_keys.last_used_at.
+
+    record() is a dict write on the request path. flush() sends every key
+    touched since the previous flush to the touch_api_keys() RPC in a single
+    call, one row per key, so a hot key costs one write per interval no matter
+    how many requests it served.
+    """
+
+    def __init__(self):
+        self._pending: dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def record(self, api_key_id: str, when: datetime | None = None) -> None:
+        when = when or datetime.now(timezone.utc)
+        with self._lock:
+            self.recorded += 1
+            previous = self._pending.get(api_key_id)
+            if previous is None or when > previous:
+                self._pending[api_key_id] = when
+
+    def flush(self) -> int:
+        """Write pending timestamps. Returns the number of keys sent."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        updates = [
+            {"id": key_id, "last_used_at": when.isoformat()}
+            for key_id, when in batch.items()
+        ]
+        try:
+            get_supabase().rpc("touch_api_keys", {"p_updates": updates}).execute()
+        except Exception:
+            # Put the batch back (keeping newer timestamps recorded meanwhile)
+            # so the next flush retries it.
+            with self._lock:
+                self.failed_flushes += 1
+                for key_id, when in batch.items():
+                    newer = self._pending.get(key_id)
+                    if newer is None or when > newer:
+                        self._pending[key_id] = when
+            raise
+
+        self.flushes += 1
+        self.flushed_rows += len(updates)
+        return len(updates)
+
+    async def flush_async(self) -> int:
+        return await asyncio.to_thread(self.flush)
+
+    def stats(self) -> dict:
+        return {
+            "pending_keys": len(self._pending),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+last_used_recorder = LastUsedRecorder()
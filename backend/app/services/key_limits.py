@@ -0,0 +1,160 @@
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException
+
+from app.models.schemas import AuthContext, ChatCompletionRequest
+from app.utils.pricing import estimate_prompt_tokens
+
+# Keys with a full token bucket and nothing in flight carry no state; they
+# are swept from the table at most this often.
+_SWEEP_INTERVAL_SECONDS = 60.0
+# A slot whose request never released it (a stream response that was never
+# sent at all) is reclaimed after this long.
+_LEASE_TTL_SECONDS = 600.0
+
+
+def estimate_request_tokens(request: ChatCompletionRequest) -> int:
+    """Tokens charged up front: the estimated prompt plus max_tokens if the client set one."""
+    return estimate_prompt_tokens(request.messages) + (request.max_tokens or 0)
+
+
+@dataclass
+class _KeyState:
+    tpm: int
+    tokens: float
+    updated: float
+    # lease id -> acquired at (monotonic)
+    leases: dict[int, float] = field(default_factory=dict)
+
+    def refill(self, now: float) -> None:
+        if self.tpm:
+            self.tokens = min(float(self.tpm), self.tokens + (now - self.updated) * self.tpm / 60)
+        self.updated = now
+
+
+@dataclass
+class Lease:
+    id: int
+    api_key_id: str
+    charged: int
+    settled: bool = False
+
+
+class KeyLimiter:
+    """
+    Per-key token-per-minute budget and concurrency cap for the proxy.
+
+    Each key has a token bucket holding up to `rate_limit_tpm` tokens that
+    refills at tpm/60 per second. acquire() charges the request's estimate
+    (prompt plus max_tokens) and takes one of `max_concurrent_requests`
+    slots; settle() corrects the charge to the provider's reported usage,
+    which may leave the bucket in debt; release() frees the slot and
+    refunds the estimate of a request that never settled. A request
+    estimated above the whole budget is admitted only against a full
+    bucket, so it can't starve but runs at most about once a minute.
+
+    A 0 limit disables that check. State is per worker process.
+    """
+
+    def __init__(self):
+        self._keys: dict[str, _KeyState] = {}
+        self._last_sweep = time.monotonic()
+        self._ids = itertools.count(1)
+        self.stats_counters = {
+            "admitted": 0, "rejected_tpm": 0, "rejected_concurrency": 0, "settled": 0, "refunded": 0,
+            "expired": 0,
+        }
+
+    def _state(self, auth: AuthContext, now: float) -> _KeyState:
+        if now - self._last_sweep > _SWEEP_INTERVAL_SECONDS:
+            self._sweep(now)
+        state = self._keys.get(auth.api_key_id)
+        if state is None:
+            tpm = auth.rate_limit_tpm
+            state = self._keys[auth.api_key_id] = _KeyState(tpm=tpm, tokens=float(tpm), updated=now)
+        state.tpm = auth.rate_limit_tpm
+        state.refill(now)
+        return state
+
+    def acquire(self, auth: AuthContext, estimated_tokens: int, now: float | None = None) -> Lease:
+        """Admit one request or raise 429 with Retry-After."""
+        now = time.monotonic() if now is None else now
+        state = self._state(auth, now)
+
+        limit = auth.max_concurrent_requests
+        if limit and len(state.leases) >= limit:
+            self.stats_counters["rejected_concurrency"] += 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many concurrent requests for this API key. Max {limit} in flight, streams included.",
+                headers={"Retry-After": "1"},
+            )
+
+        tpm = auth.rate_limit_tpm
+        charged = estimated_tokens if tpm else 0
+        if tpm:
+            needed = min(estimated_tokens, tpm)
+            if state.tokens < needed:
+                self.stats_counters["rejected_tpm"] += 1
+                wait = (needed - state.tokens) * 60 / tpm
+                raise HTTPException(
+                    status_code=429,
+                    detail=(
+                        f"Token rate limit exceeded. Max {tpm} tokens per minute; this request is estimated "
+                        f"at {estimated_tokens} tokens. Retry after {math.ceil(wait)} s."
+                    ),
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+            state.tokens -= charged
+
+        lease = Lease(next(self._ids), auth.api_key_id, charged)
+        state.leases[lease.id] = now
+        self.stats_counters["admitted"] += 1
+        return lease
+
+    def settle(self, lease: Lease, actual_tokens: int) -> None:
+        """Replace the estimate with the provider-reported token count."""
+        state = self._keys.get(lease.api_key_id)
+        if state is None or lease.settled:
+            return
+        lease.settled = True
+        if lease.charged:
+            state.tokens -= actual_tokens - lease.charged
+        self.stats_counters["settled"] += 1
+
+    def release(self, lease: Lease) -> None:
+        """
+        Free the concurrency slot. Refunds the estimate if the request never
+        settled. A no-op once released.
+        """
+        state = self._keys.get(lease.api_key_id)
+        if state is None or state.leases.pop(lease.id, None) is None:
+            return
+        if not lease.settled:
+            lease.settled = True
+            state.tokens += lease.charged
+            self.stats_counters["refunded"] += 1
+
+    def _sweep(self, now: float) -> None:
+        for key, state in list(self._keys.items()):
+            for lease_id, acquired in list(state.leases.items()):
+                if now - acquired > _LEASE_TTL_SECONDS:
+                    del state.leases[lease_id]
+                    self.stats_counters["expired"] += 1
+            state.refill(now)
+            if not state.leases and state.tokens >= state.tpm:
+                del self._keys[key]
+        self._last_sweep = now
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "in_flight": sum(len(s.leases) for s in self._keys.values()),
+            **self.stats_counters,
+        }
+
+
+key_limiter = KeyLimiter()
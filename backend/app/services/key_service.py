@@ -1,8 +1,9 @@
-from app.models.database import get_supabase
+from app.middleware.auth import invalidate_api_key
+from app.models.repository import get_repository
 from app.utils.crypto import generate_api_key, get_key_prefix, hash_api_key
 
 
-def create_api_key(user_id: str, name: str = "Default") -> dict:
+async def create_api_key(user_id: str, name: str = "Default") -> dict:
     """
     Generate a new Vuzo API key for a user.
     Returns dict with id, name, key (plaintext, shown once), key_prefix, created_at.
@@ -11,15 +12,7 @@ def create_api_key(user_id: str, name: str = "Default") -> dict:
     prefix = get_key_prefix(raw_key)
     hashed = hash_api_key(raw_key)
 
-    sb = get_supabase()
-    result = sb.table("api_keys").insert({
-        "user_id": user_id,
-        "key_prefix": prefix,
-        "key_hash": hashed,
-        "name": name,
-    }).execute()
-
-    row = result.data[0]
+    row = await get_repository().insert_api_key(user_id, prefix, hashed, name)
     return {
         "id": row["id"],
         "name": row["name"],
@@ -29,27 +22,14 @@ def create_api_key(user_id: str, name: str = "Default") -> dict:
     }
 
 
-def list_api_keys(user_id: str) -> list[dict]:
+async def list_api_keys(user_id: str) -> list[dict]:
     """List all API keys for a user (without hashes)."""
-    sb = get_supabase()
-    result = (
-        sb.table("api_keys")
-        .select("id, name, key_prefix, is_active, rate_limit_rpm, created_at, last_used_at")
-        .eq("user_id", user_id)
-        .order("created_at", desc=True)
-        .execute()
-    )
-    return result.data or []
+    return await get_repository().list_api_keys(user_id)
 
 
-def revoke_api_key(user_id: str, key_id: str) -> bool:
+async def revoke_api_key(user_id: str, key_id: str) -> bool:
     """Revoke (deactivate) an API key. Returns True if found and revoked."""
-    sb = get_supabase()
-    result = (
-        sb.table("api_keys")
-        .update({"is_active": False})
-        .eq("id", key_id)
-        .eq("user_id", user_id)
-        .execute()
-    )
-    return bool(result.data)
+    rows = await get_repository().deactivate_api_key(user_id, key_id)
+    for row in rows:
+        invalidate_api_key(row["key_hash"])
+    return bool(rows)
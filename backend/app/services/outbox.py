@@ -0,0 +1,351 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import asyncpg
+import httpx
+
+from app.utils.background import wait_event
+
+logger = logging.getLogger(__name__)
+
+# Events read per replay pass.
+_REPLAY_BATCH_SIZE = 500
+# How often an idle replay task looks at the file anyway.
+_IDLE_POLL_SECONDS = 5.0
+# Backoff after a failed pass, doubling up to the cap.
+_RETRY_BACKOFF_SECONDS = 1.0
+_MAX_BACKOFF_SECONDS = 60.0
+# Events still failing after this many passes are parked as dead (kept on
+# disk, skipped by replay) until requeue_dead().
+_MAX_ATTEMPTS = 50
+# Worker slots tried when several processes share one OUTBOX_PATH.
+_MAX_SLOTS = 64
+# Failures that mean the database couldn't be reached rather than that an
+# event is bad. They cost no attempt and aren't retried event by event, so
+# an outage of any length parks nothing.
+_UNAVAILABLE_ERRORS = (
+    OSError,  # ConnectionError, refused and reset sockets
+    asyncio.TimeoutError,  # pool acquire and command timeouts
+    asyncpg.PostgresConnectionError,
+    asyncpg.ConnectionDoesNotExistError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.AdminShutdownError,
+    asyncpg.TooManyConnectionsError,
+    httpx.TransportError,
+)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox_events (
+        seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+        event_id   TEXT    NOT NULL UNIQUE,
+        kind       TEXT    NOT NULL,
+        payload    TEXT    NOT NULL,
+        created_at REAL    NOT NULL,
+        attempts   INTEGER NOT NULL DEFAULT 0,
+        dead       INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+
+@dataclass(frozen=True)
+class OutboxEvent:
+    seq: int
+    event_id: str
+    kind: str
+    payload: dict
+    attempts: int
+
+
+Handler = Callable[[list[OutboxEvent]], Awaitable[None]]
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _slot_path(path: Path, slot: int) -> Path:
+    return path if slot == 0 else path.with_name(f"{path.stem}.{slot}{path.suffix}")
+
+
+def _try_lock(path: Path):
+    """Open and exclusively lock `<path>.lock`; None if another process holds it."""
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL: a commit survives the process dying (the usual failure)
+    # without an fsync per event; only an OS crash can lose the last commits.
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(_SCHEMA)
+    return db
+
+
+class Outbox:
+    """
+    Crash-safe local queue for billing and usage events.
+
+    append() commits an event to a SQLite file in WAL mode, which takes
+    microseconds and doesn't depend on the database being up. The replay
+    task (run) reads events in order and hands each kind to its registered
+    handler, which writes them to Postgres. Every event carries a UUID that
+    the database records, so an event that is replayed twice (a crash after
+    the write but before the local delete, or a timeout that actually
+    committed) is applied once.
+
+    Each process locks its own file, so several workers can share one
+    OUTBOX_PATH: the first takes the path itself, the next `<stem>.1<suffix>`,
+    and so on. A restarted worker gets a free slot back and replays what its
+    predecessor left; files of slots nobody holds are adopted on open.
+    """
+
+    def __init__(self):
+        self._db: sqlite3.Connection | None = None
+        self._lock_fd: int | None = None
+        self.path: Path | None = None
+        self._handlers: dict[str, Handler] = {}
+        self._wake: asyncio.Event | None = None
+        self.stats_counters = {
+            "appended": 0, "replayed": 0, "adopted": 0, "failed_passes": 0, "isolated_retries": 0,
+            "dead_lettered": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def register(self, kind: str, handler: Handler) -> None:
+        """Route events of `kind` to `handler`, which must be idempotent per event_id."""
+        self._handlers[kind] = handler
+
+    # ── File ──
+
+    def open(self, path: str) -> None:
+        """Claim a slot file next to `path` and adopt abandoned ones."""
+        base = Path(path)
+        base.parent.mkdir(parents=True, exist_ok=True)
+        for slot in range(_MAX_SLOTS):
+            candidate = _slot_path(base, slot)
+            fd = _try_lock(candidate)
+            if fd is not None:
+                break
+        else:
+            raise RuntimeError(f"All {_MAX_SLOTS} outbox slots at {base} are locked")
+        self._lock_fd, self.path = fd, candidate
+        self._db = _connect(candidate)
+        for slot in range(_MAX_SLOTS):
+            other = _slot_path(base, slot)
+            if other != candidate and other.exists():
+                self._adopt(other)
+        logger.info("Outbox %s opened with %d pending events", candidate, self._count(dead=False))
+
+    def _adopt(self, other: Path) -> None:
+        fd = _try_lock(other)
+        if fd is None:
+            return
+        try:
+            source = _connect(other)
+            try:
+                rows = source.execute(
+                    "SELECT event_id, kind, payload, created_at, attempts, dead FROM outbox_events ORDER BY seq"
+                ).fetchall()
+            finally:
+                source.close()
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO outbox_events (event_id, kind, payload, created_at, attempts, dead)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{other}{suffix}").unlink(missing_ok=True)
+            self.stats_counters["adopted"] += len(rows)
+            if rows:
+                logger.warning("Adopted %d outbox events from %s", len(rows), other)
+        finally:
+            os.close(fd)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # ── Producer side ──
+
+    def append(self, kind: str, payload: dict) -> str:
+        """Commit one event locally and return its event_id."""
+        event_id = str(uuid.uuid4())
+        self._db.execute(
+            "INSERT INTO outbox_events (event_id, kind, payload, created_at) VALUES (?, ?, ?, ?)",
+            (event_id, kind, json.dumps(payload, default=_encode), time.time()),
+        )
+        self.stats_counters["appended"] += 1
+        if self._wake is not None:
+            self._wake.set()
+        return event_id
+
+    # ── Replay ──
+
+    def _pending(self) -> list[OutboxEvent]:
+        rows = self._db.execute(
+            "SELECT seq, event_id, kind, payload, attempts FROM outbox_events"
+            " WHERE dead = 0 ORDER BY seq LIMIT ?",
+            (_REPLAY_BATCH_SIZE,),
+        ).fetchall()
+        return [OutboxEvent(seq, event_id, kind, json.loads(payload), attempts)
+                for seq, event_id, kind, payload, attempts in rows]
+
+    async def replay_once(self) -> int:
+        """
+        Send one batch to the handlers. Returns the number of events applied;
+        raises if any event failed (it stays queued). When a kind's batch
+        fails on a bad event rather than an unreachable database, its events
+        are retried one by one so only the failing ones wait for the next
+        pass.
+        """
+        batch = self._pending()
+        by_kind: dict[str, list[OutboxEvent]] = {}
+        for event in batch:
+            by_kind.setdefault(event.kind, []).append(event)
+
+        applied, failure = 0, None
+        for kind, events in by_kind.items():
+            handler = self._handlers.get(kind)
+            if handler is None:
+                failure = failure or LookupError(f"No outbox handler registered for {kind!r}")
+                self._record_failure(events)
+                continue
+            try:
+                await handler(events)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                failure = failure or exc
+                if isinstance(exc, _UNAVAILABLE_ERRORS):
+                    continue
+                if len(events) == 1:
+                    self._record_failure(events)
+                    continue
+                # One bad event (a deleted user's charge, say) must not hold
+                # back the rest: retry one at a time and charge the attempt
+                # only to the events that fail on their own. If the database
+                # goes away meanwhile, stop and leave the rest queued.
+                self.stats_counters["isolated_retries"] += 1
+                done = []
+                for event in events:
+                    try:
+                        await handler([event])
+                    except asyncio.CancelledError:
+                        raise
+                    except _UNAVAILABLE_ERRORS:
+                        break
+                    except Exception:
+                        self._record_failure([event])
+                    else:
+                        done.append(event)
+                events = done
+            self._delete(events)
+            applied += len(events)
+
+        self.stats_counters["replayed"] += applied
+        if failure is not None:
+            self.stats_counters["failed_passes"] += 1
+            raise failure
+        return applied
+
+    def _delete(self, events: list[OutboxEvent]) -> None:
+        with self._db:
+            self._db.executemany("DELETE FROM outbox_events WHERE seq = ?", [(e.seq,) for e in events])
+
+    def _record_failure(self, events: list[OutboxEvent]) -> None:
+        with self._db:
+            self._db.executemany(
+                "UPDATE outbox_events SET attempts = attempts + 1, dead = (attempts + 1 >= ?) WHERE seq = ?",
+                [(_MAX_ATTEMPTS, e.seq) for e in events],
+            )
+        dead = [e for e in events if e.attempts + 1 >= _MAX_ATTEMPTS]
+        if dead:
+            self.stats_counters["dead_lettered"] += len(dead)
+            logger.error(
+                "Parked %d %s outbox events after %d attempts; requeue them from /v1/admin/outbox/requeue",
+                len(dead), dead[0].kind, _MAX_ATTEMPTS,
+            )
+
+    async def run(self) -> None:
+        """Replay events as they arrive until cancelled."""
+        self._wake = asyncio.Event()
+        backoff = _RETRY_BACKOFF_SECONDS
+        while True:
+            self._wake.clear()
+            try:
+                while await self.replay_once():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox replay failed; retrying in %.0f s", backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, _MAX_BACKOFF_SECONDS)
+                continue
+            backoff = _RETRY_BACKOFF_SECONDS
+            await wait_event(self._wake, _IDLE_POLL_SECONDS)
+
+    async def drain(self) -> int:
+        """Replay everything possible (shutdown). Whatever fails stays on disk for the next start."""
+        if not self.enabled:
+            return 0
+        sent = 0
+        while applied := await self.replay_once():
+            sent += applied
+        return sent
+
+    def requeue_dead(self) -> int:
+        """Give parked events a fresh set of attempts."""
+        with self._db:
+            cursor = self._db.execute("UPDATE outbox_events SET dead = 0, attempts = 0 WHERE dead = 1")
+        if self._wake is not None:
+            self._wake.set()
+        return cursor.rowcount
+
+    # ── Stats ──
+
+    def _count(self, dead: bool) -> int:
+        return self._db.execute("SELECT count(*) FROM outbox_events WHERE dead = ?", (int(dead),)).fetchone()[0]
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False, **self.stats_counters}
+        oldest = self._db.execute("SELECT min(created_at) FROM outbox_events WHERE dead = 0").fetchone()[0]
+        return {
+            "enabled": True,
+            "path": str(self.path),
+            "pending": self._count(dead=False),
+            "dead": self._count(dead=True),
+            "oldest_pending_age_seconds": round(time.time() - oldest, 3) if oldest else None,
+            **self.stats_counters,
+        }
+
+
+outbox = Outbox()
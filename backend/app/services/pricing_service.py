@@ -1,59 +1,189 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping
+
 from fastapi import HTTPException
 from app.models.database import get_supabase
+from app.services.providers.registry import Route, provider_registry
 from app.utils.crypto import decrypt_provider_key
 
+logger = logging.getLogger(__name__)
+
 
-def get_model_pricing(model_name: str) -> dict:
+@dataclass(frozen=True)
+class CatalogSnapshot:
     """
-    Fetch pricing info for a model from the database.
-    Returns dict with provider, model_name, input/output prices, and markup.
-    Raises 400 if model not found or inactive.
+    Immutable view of the active model_pricing rows, the model -> provider
+    adapter routing table built from them, and decrypted provider keys.
+    A refresh builds a new snapshot and swaps the module reference in one
+    assignment, so readers never see a half-loaded catalogue.
     """
+    models: Mapping[str, Mapping] = field(default_factory=lambda: MappingProxyType({}))
+    models_by_provider: tuple[Mapping, ...] = ()
+    routes: Mapping[str, Route] = field(default_factory=lambda: MappingProxyType({}))
+    provider_keys: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    loaded_at: float = 0.0
+
+
+_snapshot: CatalogSnapshot | None = None
+_background_load: asyncio.Task | None = None
+_stats = {"refreshes": 0, "refresh_failures": 0, "last_error": None, "last_failure_at": None}
+
+
+def load_catalog() -> CatalogSnapshot:
+    """Read model pricing and provider keys from Supabase into a new snapshot."""
     sb = get_supabase()
-    result = (
+    pricing_rows = (
         sb.table("model_pricing")
         .select("*")
-        .eq("model_name", model_name)
+        .eq("is_active", True)
+        .order("provider")
+        .execute()
+    ).data or []
+    key_rows = (
+        sb.table("provider_keys")
+        .select("provider, api_key_encrypted")
         .eq("is_active", True)
         .execute()
+    ).data or []
+
+    models_by_provider = tuple(MappingProxyType(dict(r)) for r in pricing_rows)
+    provider_keys = {}
+    for row in key_rows:
+        try:
+            provider_keys[row["provider"]] = decrypt_provider_key(row["api_key_encrypted"])
+        except Exception:
+            # One undecryptable key shouldn't take the whole catalogue down;
+            # that provider simply reports "not configured" until it's fixed.
+            logger.error("Could not decrypt provider key for %s", row["provider"])
+
+    return CatalogSnapshot(
+        models=MappingProxyType({r["model_name"]: r for r in models_by_provider}),
+        models_by_provider=models_by_provider,
+        routes=MappingProxyType(provider_registry.build_routes(models_by_provider)),
+        provider_keys=MappingProxyType(provider_keys),
+        loaded_at=time.time(),
     )
-    if not result.data:
+
+
+def refresh_catalog() -> CatalogSnapshot:
+    """Reload the snapshot. On failure the previous snapshot stays in place."""
+    global _snapshot
+    try:
+        snapshot = load_catalog()
+    except Exception as e:
+        _stats["refresh_failures"] += 1
+        _stats["last_error"] = repr(e)
+        _stats["last_failure_at"] = time.time()
+        raise
+    _snapshot = snapshot
+    _stats["refreshes"] += 1
+    return snapshot
+
+
+async def refresh_catalog_async() -> CatalogSnapshot:
+    return await asyncio.to_thread(refresh_catalog)
+
+
+def get_catalog() -> CatalogSnapshot:
+    """
+    Current snapshot. If none has loaded yet (the startup load failed),
+    raises 503 and starts a load in a worker thread; loading inline would
+    block the event loop, and every stream on it, for the whole query.
+    """
+    snapshot = _snapshot
+    if snapshot is None:
+        _start_background_load()
         raise HTTPException(
-            status_code=400,
-            detail=f"Model '{model_name}' is not available. Use GET /v1/models to see supported models.",
+            status_code=503,
+            detail="The model catalogue is not loaded yet. Please retry shortly.",
+            headers={"Retry-After": "1"},
         )
-    return result.data[0]
+    return snapshot
 
 
-def get_all_models() -> list[dict]:
-    """Fetch all active model pricing entries."""
-    sb = get_supabase()
-    result = (
-        sb.table("model_pricing")
-        .select("*")
-        .eq("is_active", True)
-        .order("provider")
-        .execute()
+def _start_background_load() -> None:
+    """One load at a time, however many requests arrive while it runs."""
+    global _background_load
+    if _background_load is not None and not _background_load.done():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _background_load = loop.create_task(_load_in_background())
+
+
+async def _load_in_background() -> None:
+    try:
+        await refresh_catalog_async()
+    except Exception:
+        logger.warning("Catalog load failed; lookups return 503 until a load succeeds", exc_info=True)
+
+
+def get_catalog_stats() -> dict:
+    snapshot = _snapshot
+    return {
+        "loaded": snapshot is not None,
+        "loaded_at": snapshot.loaded_at if snapshot else None,
+        "age_seconds": round(time.time() - snapshot.loaded_at, 3) if snapshot else None,
+        "models": len(snapshot.models) if snapshot else 0,
+        "routable_models": len(snapshot.routes) if snapshot else 0,
+        "providers": sorted(snapshot.provider_keys) if snapshot else [],
+        **_stats,
+    }
+
+
+def _model_unavailable(model_name: str) -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"Model '{model_name}' is not available. Use GET /v1/models to see supported models.",
     )
-    return result.data or []
+
+
+def get_model_pricing(model_name: str) -> Mapping:
+    """
+    Look up pricing info for a model in the catalogue snapshot.
+    Returns provider, model_name, input/output prices, and markup.
+    Raises 400 if model not found or inactive.
+    """
+    pricing = get_catalog().models.get(model_name)
+    if pricing is None:
+        raise _model_unavailable(model_name)
+    return pricing
+
+
+def get_route(model_name: str) -> Route:
+    """
+    Resolve a model to its pricing row and provider adapter with one dict read.
+    Raises 400 if the model is unknown or its provider has no adapter.
+    """
+    snapshot = get_catalog()
+    route = snapshot.routes.get(model_name)
+    if route is not None:
+        return route
+    if model_name in snapshot.models:
+        raise HTTPException(status_code=400, detail=f"No provider found for model '{model_name}'")
+    raise _model_unavailable(model_name)
+
+
+def get_all_models() -> list[Mapping]:
+    """All active model pricing entries, ordered by provider."""
+    return list(get_catalog().models_by_provider)
 
 
 def get_provider_api_key(provider: str) -> str:
     """
-    Retrieve and decrypt the master API key for a provider.
+    Return the decrypted master API key for a provider from the snapshot.
     Raises 503 if provider key is not configured.
     """
-    sb = get_supabase()
-    result = (
-        sb.table("provider_keys")
-        .select("api_key_encrypted")
-        .eq("provider", provider)
-        .eq("is_active", True)
-        .execute()
-    )
-    if not result.data:
+    api_key = get_catalog().provider_keys.get(provider)
+    if api_key is None:
         raise HTTPException(
             status_code=503,
             detail=f"Provider '{provider}' is not configured. Contact Vuzo support.",
         )
-    return decrypt_provider_key(result.data[0]["api_key_encrypted"])
+    return api_key
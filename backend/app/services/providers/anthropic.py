@@ -10,18 +10,9 @@ from app.services.providers.base import BaseProvider
 ANTHROPIC_BASE_URL = "https://api.anthropic.com/v1"
 ANTHROPIC_VERSION = "2023-06-01"
 
-ANTHROPIC_MODELS = {
-    "claude-sonnet-4-20250514",
-    "claude-haiku-4-5",
-    "claude-opus-4-5",
-}
-
 
 class AnthropicProvider(BaseProvider):
 
-    def model_supported(self, model: str) -> bool:
-        return model in ANTHROPIC_MODELS
-
     async def chat_completion(
         self,
         request: ChatCompletionRequest,
@@ -4,7 +4,12 @@ from app.models.schemas import ChatCompletionRequest, ProviderUsageResult
 
 
 class BaseProvider(ABC):
-    """Abstract base class for LLM providers."""
+    """
+    Abstract base class for LLM providers.
+
+    Which models a provider serves is not decided here: the registry routes
+    each model_pricing row to the adapter named by its `provider` column.
+    """
 
     @abstractmethod
     async def chat_completion(
@@ -29,8 +34,3 @@ class BaseProvider(ABC):
         All other yields have None for usage.
         """
         ...
-
-    @abstractmethod
-    def model_supported(self, model: str) -> bool:
-        """Check if this provider handles the given model name."""
-        ...
@@ -9,17 +9,9 @@ from app.services.providers.base import BaseProvider
 
 GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
 
-GOOGLE_MODELS = {
-    "gemini-2.0-flash",
-    "gemini-3-flash",
-}
-
 
 class GoogleProvider(BaseProvider):
 
-    def model_supported(self, model: str) -> bool:
-        return model in GOOGLE_MODELS
-
     async def chat_completion(
         self,
         request: ChatCompletionRequest,
@@ -0,0 +1,113 @@
+import json
+from typing import AsyncIterator
+
+from app.models.database import get_http_client
+from app.models.schemas import ChatCompletionRequest, ProviderUsageResult
+from app.services.providers.base import BaseProvider
+
+
+class OpenAICompatibleProvider(BaseProvider):
+    """
+    Adapter for any vendor that speaks the OpenAI chat completions API.
+
+    Only the base URL and the auth header differ between vendors, so new
+    ones can be declared in config (OPENAI_COMPATIBLE_PROVIDERS) instead of
+    copying a provider module.
+    """
+
+    def __init__(self, base_url: str, auth_header: str = "Authorization", auth_scheme: str = "Bearer"):
+        self.base_url = base_url.rstrip("/")
+        self.auth_header = auth_header
+        self.auth_scheme = auth_scheme
+
+    async def chat_completion(
+        self,
+        request: ChatCompletionRequest,
+        api_key: str,
+    ) -> ProviderUsageResult:
+        client = get_http_client()
+
+        payload = self._build_payload(request, stream=False)
+
+        resp = await client.post(
+            f"{self.base_url}/chat/completions",
+            json=payload,
+            headers=self._headers(api_key),
+        )
+        resp.raise_for_status()
+        data = resp.json()
+
+        usage = data.get("usage", {})
+        return ProviderUsageResult(
+            input_tokens=usage.get("prompt_tokens", 0),
+            output_tokens=usage.get("completion_tokens", 0),
+            provider_response=data,
+        )
+
+    async def chat_completion_stream(
+        self,
+        request: ChatCompletionRequest,
+        api_key: str,
+    ) -> AsyncIterator[tuple[str, ProviderUsageResult | None]]:
+        client = get_http_client()
+
+        payload = self._build_payload(request, stream=True)
+        payload["stream_options"] = {"include_usage": True}
+
+        usage_result: ProviderUsageResult | None = None
+
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            json=payload,
+            headers=self._headers(api_key),
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data_str = line[6:]
+                if data_str.strip() == "[DONE]":
+                    yield "data: [DONE]\n\n", usage_result
+                    break
+
+                try:
+                    chunk = json.loads(data_str)
+                except json.JSONDecodeError:
+                    continue
+
+                if "usage" in chunk and chunk["usage"]:
+                    u = chunk["usage"]
+                    usage_result = ProviderUsageResult(
+                        input_tokens=u.get("prompt_tokens", 0),
+                        output_tokens=u.get("completion_tokens", 0),
+                        provider_response=chunk,
+                    )
+
+                yield f"data: {data_str}\n\n", None
+
+    def _headers(self, api_key: str) -> dict:
+        return {
+            self.auth_header: f"{self.auth_scheme} {api_key}" if self.auth_scheme else api_key,
+            "Content-Type": "application/json",
+        }
+
+    def _build_payload(self, request: ChatCompletionRequest, stream: bool) -> dict:
+        payload: dict = {
+            "model": request.model,
+            "messages": [m.model_dump(exclude_none=True) for m in request.messages],
+            "stream": stream,
+        }
+        if request.temperature is not None:
+            payload["temperature"] = request.temperature
+        if request.top_p is not None:
+            payload["top_p"] = request.top_p
+        if request.max_tokens is not None:
+            payload["max_tokens"] = request.max_tokens
+        if request.stop is not None:
+            payload["stop"] = request.stop
+        if request.frequency_penalty is not None:
+            payload["frequency_penalty"] = request.frequency_penalty
+        if request.presence_penalty is not None:
+            payload["presence_penalty"] = request.presence_penalty
+        return payload
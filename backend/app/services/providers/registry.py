@@ -0,0 +1,73 @@
+import logging
+from dataclasses import dataclass
+from typing import Iterable, Mapping
+
+from app.config import OpenAICompatibleVendor
+from app.services.providers.base import BaseProvider
+from app.services.providers.openai import OpenAIProvider
+from app.services.providers.xai import XAIProvider
+from app.services.providers.google import GoogleProvider
+from app.services.providers.anthropic import AnthropicProvider
+from app.services.providers.openai_compatible import OpenAICompatibleProvider
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Route:
+    """Everything the proxy needs to dispatch one model."""
+    pricing: Mapping
+    provider: BaseProvider
+
+
+class ProviderRegistry:
+    """
+    Maps model_pricing.provider names to adapter instances and turns the
+    pricing catalogue into a model -> Route table.
+
+    The table is rebuilt on every catalogue refresh, so a model added to
+    model_pricing becomes routable without a redeploy as long as its provider
+    has an adapter.
+    """
+
+    def __init__(self):
+        self._adapters: dict[str, BaseProvider] = {
+            "openai": OpenAIProvider(),
+            "xai": XAIProvider(),
+            "google": GoogleProvider(),
+            "anthropic": AnthropicProvider(),
+        }
+
+    def register(self, name: str, provider: BaseProvider) -> None:
+        self._adapters[name] = provider
+
+    def configure(self, vendors: Iterable[OpenAICompatibleVendor]) -> None:
+        """Register OpenAI-compatible vendors declared in settings."""
+        for vendor in vendors:
+            self.register(
+                vendor.name,
+                OpenAICompatibleProvider(vendor.base_url, vendor.auth_header, vendor.auth_scheme),
+            )
+
+    def get(self, name: str) -> BaseProvider | None:
+        return self._adapters.get(name)
+
+    @property
+    def provider_names(self) -> list[str]:
+        return sorted(self._adapters)
+
+    def build_routes(self, pricing_rows: Iterable[Mapping]) -> dict[str, Route]:
+        routes = {}
+        for row in pricing_rows:
+            adapter = self._adapters.get(row["provider"])
+            if adapter is None:
+                logger.warning(
+                    "Model %s has unknown provider %r; it will not be routable",
+                    row["model_name"], row["provider"],
+                )
+                continue
+            routes[row["model_name"]] = Route(pricing=row, provider=adapter)
+        return routes
+
+
+provider_registry = ProviderRegistry()
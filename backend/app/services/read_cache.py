@@ -0,0 +1,136 @@
+import itertools
+import math
+from collections.abc import Awaitable, Callable, Hashable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from app.utils.cache import TTLCache
+
+# A range ending this long ago is treated as closed. Rows normally land
+# within seconds of created_at. Older ones (an outbox backlog replayed after
+# an outage) bump the user's history version when they're written.
+_CLOSED_AFTER = timedelta(hours=1)
+# Closed ranges are still re-read this often, which bounds how long a late
+# row written by another worker (it only bumps that worker's history
+# version) can be missing here.
+_CLOSED_TTL_SECONDS = 3600.0
+
+KINDS = ("balance", "summary", "daily")
+
+
+def _is_closed(end_date: str | None, now: datetime | None = None) -> bool:
+    """Whether a range ending at `end_date` can no longer gain rows."""
+    if not end_date:
+        return False
+    try:
+        end = datetime.fromisoformat(end_date)
+    except ValueError:
+        return False
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    return end < (now or datetime.now(timezone.utc)) - _CLOSED_AFTER
+
+
+class ReadModelCache:
+    """
+    Per-user cache of the dashboard's read models: balance, usage summary
+    and daily usage.
+
+    Results covering an open range (or the balance) live for `ttl` seconds.
+    Results for a range that closed more than an hour ago rarely change, so
+    they're kept for an hour. Writes invalidate by bumping a per-user
+    version that is part of every key, which costs O(1) however many entries
+    the user has. Stale entries just stop being reachable and age out. A
+    load that raced with a write isn't stored.
+
+    This worker invalidates on its own credit changes, on usage rows it
+    writes, and on `credits` events from the invalidation bus (balance
+    updates reach listening workers only). Usage and charges from other
+    workers otherwise show up within `ttl`, and late rows in closed ranges
+    within an hour.
+    """
+
+    def __init__(self, maxsize: int = 50_000, ttl: float = 30.0):
+        self._counter = itertools.count(1)
+        self.configure(maxsize, ttl)
+
+    def configure(self, maxsize: int, ttl: float) -> None:
+        self.ttl = ttl
+        self._live = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._closed = TTLCache(maxsize=maxsize, ttl=_CLOSED_TTL_SECONDS)
+        # (user_id, scope) -> version; scopes are "balance", "usage" and
+        # "history" (usage before the closed-range cutoff).
+        self._versions = TTLCache(maxsize=maxsize, ttl=math.inf)
+        # Version of users with none in _versions. Raised past every version
+        # handed out whenever one is evicted, so an evicted user's old
+        # entries don't become reachable again.
+        self._floor = 0
+        self.lookups = {kind: {"hits": 0, "misses": 0} for kind in KINDS}
+        self.invalidations = {"balance": 0, "usage": 0, "history": 0}
+
+    def clear(self) -> None:
+        self.configure(self._live.maxsize, self.ttl)
+
+    def _version(self, user_id: str, scope: str) -> int:
+        return self._versions.peek((user_id, scope), self._floor)
+
+    async def get(
+        self,
+        user_id: str,
+        kind: str,
+        params: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        end_date: str | None = None,
+    ) -> Any:
+        """The cached result for (user, kind, params), calling `load` on a miss."""
+        if kind == "balance":
+            cache, scope = self._live, "balance"
+        elif _is_closed(end_date):
+            cache, scope = self._closed, "history"
+        else:
+            cache, scope = self._live, "usage"
+        version = self._version(user_id, scope)
+        key = (user_id, kind, params, version)
+        if cache is self._live and self.ttl <= 0:
+            return await load()
+
+        value = cache.get(key)
+        if value is not None:
+            self.lookups[kind]["hits"] += 1
+            return value
+        self.lookups[kind]["misses"] += 1
+        value = await load()
+        if self._version(user_id, scope) == version:
+            cache.set(key, value)
+        return value
+
+    def _bump(self, user_id: str, scope: str) -> None:
+        version = next(self._counter)
+        if self._versions.peek((user_id, scope)) is None and len(self._versions) >= self._versions.maxsize:
+            self._floor = version  # this set evicts the least recently bumped version
+        self._versions.set((user_id, scope), version)
+        self.invalidations[scope] += 1
+
+    def invalidate_balance(self, user_id: str) -> None:
+        self._bump(user_id, "balance")
+
+    def invalidate_usage(self, user_id: str, oldest: datetime | None = None) -> None:
+        """After usage rows are written; `oldest` is their earliest created_at."""
+        self._bump(user_id, "usage")
+        if oldest is not None and oldest < datetime.now(timezone.utc) - _CLOSED_AFTER:
+            self._bump(user_id, "history")
+
+    def stats(self) -> dict:
+        by_kind = {}
+        for kind, counts in self.lookups.items():
+            lookups = counts["hits"] + counts["misses"]
+            by_kind[kind] = {**counts, "hit_rate": round(counts["hits"] / lookups, 4) if lookups else 0.0}
+        return {
+            "live": self._live.stats(),
+            "closed_ranges": self._closed.stats(),
+            "by_kind": by_kind,
+            "invalidations": dict(self.invalidations),
+        }
+
+
+read_cache = ReadModelCache()
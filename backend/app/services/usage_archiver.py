@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import os
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.models.database import get_pg_pool, get_supabase
+from app.models.repository import get_repository
+from app.services.usage_export import EXPORT_BATCH_SIZE, parquet_chunks
+
+logger = logging.getLogger(__name__)
+
+# Held for a whole maintenance pass, so only one worker archives at a time.
+_ADVISORY_LOCK_KEY = 0x767A_7573_6172_6368  # "vzusarch"
+# The detach needs a brief ACCESS EXCLUSIVE lock on usage_logs. Rather than
+# queue every request behind a long-running query, give up and retry on the
+# next pass.
+_DETACH_LOCK_TIMEOUT = "5s"
+
+ARCHIVE_COLUMNS = (
+    "id", "user_id", "api_key_id", "provider", "model", "input_tokens", "output_tokens",
+    "total_tokens", "provider_cost", "vuzo_cost", "response_time_ms", "status_code",
+    "created_at", "event_id",
+)
+# Cast to the Parquet column types (see usage_export._parquet_type).
+_ARCHIVE_SELECT = ", ".join(
+    f"{c}::text AS {c}" if c in ("id", "user_id", "api_key_id", "event_id")
+    else f"{c}::float8 AS {c}" if c in ("provider_cost", "vuzo_cost")
+    else c
+    for c in ARCHIVE_COLUMNS
+)
+
+# Monthly usage_logs partitions in this schema, attached or left detached
+# by an interrupted pass (migration 013 names them usage_logs_pYYYYMM).
+_LIST_PARTITIONS_SQL = """
+    SELECT c.relname AS name, i.inhrelid IS NOT NULL AS attached,
+           coalesce(i.inhdetachpending, false) AS detach_pending
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = current_schema()
+    LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+    WHERE c.relkind = 'r' AND c.relname ~ '^usage_logs_p[0-9]{6}$'
+    ORDER BY c.relname
+"""
+_RECORD_ARCHIVE_SQL = """
+    INSERT INTO usage_log_archives (partition_name, range_start, range_end, location, row_count, size_bytes)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    ON CONFLICT (partition_name) DO UPDATE
+        SET location = EXCLUDED.location, row_count = EXCLUDED.row_count, size_bytes = EXCLUDED.size_bytes,
+            archived_at = now()
+"""
+
+
+def _month_start(name: str) -> datetime:
+    return datetime.strptime(name[-6:], "%Y%m").replace(tzinfo=timezone.utc)
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+class UsageArchiver:
+    """
+    Partition upkeep, retention and archival for usage_logs.
+
+    Every pass makes sure the coming months' partitions exist. With a
+    retention of N months, partitions that ended more than N whole months
+    ago are written to `<archive_dir>/<partition>.parquet` with zstd and
+    optionally uploaded to a Supabase Storage bucket while still attached.
+    Only then are they detached, recorded in usage_log_archives and dropped,
+    in one transaction, so the usage summary never loses a month: it reads
+    the month from usage_logs until the commit and from usage_hourly after.
+    The detach is a plain one; DETACH … CONCURRENTLY is not allowed while
+    usage_logs has a default partition (migration 015).
+
+    A pass that dies part-way changes nothing and is repeated by the next
+    one. A partition left detached, or pending detach, by an older version
+    is finished off before newer ones.
+    Archival needs the asyncpg pool (DATABASE_URL) and pyarrow; partition
+    upkeep runs on either repository backend. If upkeep keeps failing, rows
+    for months without a partition land in usage_logs_default, and stats()
+    says so.
+
+    Months before the retention cutoff are, or are about to be, archived.
+    Usage rows dated in them (an outbox backlog replayed long after the
+    fact) are dropped by drop_archived() rather than retried forever; their
+    credit charge is a separate event, so only the usage detail is lost.
+    """
+
+    def __init__(self):
+        self.retention_months = 0
+        self.archive_dir = Path("archive/usage_logs")
+        self.bucket = ""
+        self.stats_counters = {
+            "passes": 0, "partitions_created": 0, "upkeep_failures": 0, "archived": 0, "archived_rows": 0,
+            "failed": 0, "late_rows_dropped": 0,
+        }
+        self.last_upkeep_error: str | None = None
+        self.last_archived: str | None = None
+
+    def configure(self, retention_months: int, archive_dir: str, bucket: str) -> None:
+        self.retention_months = retention_months
+        self.archive_dir = Path(archive_dir)
+        self.bucket = bucket
+
+    def cutoff(self, now: datetime | None = None) -> datetime:
+        """Partitions for months starting before this are archived."""
+        now = now or datetime.now(timezone.utc)
+        this_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return _add_months(this_month, -self.retention_months)
+
+    def drop_archived(self, rows: list[dict]) -> list[dict]:
+        """`rows` without those dated before the retention cutoff (counted and logged)."""
+        if not self.retention_months:
+            return rows
+        cutoff = self.cutoff()
+        kept = [row for row in rows if row["created_at"] >= cutoff]
+        if len(kept) < len(rows):
+            self.stats_counters["late_rows_dropped"] += len(rows) - len(kept)
+            logger.warning(
+                "Dropped %d usage rows dated before the retention cutoff %s", len(rows) - len(kept), cutoff.date()
+            )
+        return kept
+
+    async def maintain(self) -> None:
+        """One pass: create upcoming partitions, then archive expired ones."""
+        self.stats_counters["passes"] += 1
+        try:
+            created = await get_repository().ensure_usage_log_partitions() or 0
+        except Exception as exc:
+            self.stats_counters["upkeep_failures"] += 1
+            self.last_upkeep_error = repr(exc)
+            logger.error(
+                "usage_logs partition upkeep failed; rows for months without a partition go to "
+                "usage_logs_default until it succeeds (migration 015 must be applied): %r", exc,
+            )
+            raise
+        self.last_upkeep_error = None
+        self.stats_counters["partitions_created"] += created
+
+        pool = get_pg_pool()
+        if not self.retention_months or pool is None:
+            return
+        async with pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _ADVISORY_LOCK_KEY):
+                return
+            try:
+                cutoff = self.cutoff()
+                for partition in await conn.fetch(_LIST_PARTITIONS_SQL):
+                    if _month_start(partition["name"]) >= cutoff:
+                        continue
+                    try:
+                        await self._archive(conn, partition)
+                    except Exception:
+                        self.stats_counters["failed"] += 1
+                        raise
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _ADVISORY_LOCK_KEY)
+
+    async def _archive(self, conn, partition) -> None:
+        name = partition["name"]
+        attached = partition["attached"]
+        if partition["detach_pending"]:
+            # Left by a DETACH … CONCURRENTLY from before migration 015.
+            await conn.execute(f'ALTER TABLE usage_logs DETACH PARTITION "{name}" FINALIZE')
+            attached = False
+
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self.archive_dir / f"{name}.parquet"
+        partial = path.with_name(path.name + ".partial")
+        counted = [0]
+        month = _month_start(name)
+        async with conn.transaction():
+            # A late row for this month waits for the commit instead of
+            # landing after the export and being dropped unarchived.
+            await conn.execute(f'LOCK TABLE "{name}" IN SHARE MODE')
+            with open(partial, "wb") as file:
+                async for chunk in parquet_chunks(self._batches(conn, name, counted), ARCHIVE_COLUMNS):
+                    file.write(chunk)
+            os.replace(partial, path)
+            size = path.stat().st_size
+
+            location = str(path)
+            if self.bucket:
+                await asyncio.to_thread(self._upload, path, f"usage_logs/{path.name}")
+                location = f"supabase://{self.bucket}/usage_logs/{path.name}"
+
+            await conn.execute(f"SET LOCAL lock_timeout = '{_DETACH_LOCK_TIMEOUT}'")
+            if attached:
+                await conn.execute(f'ALTER TABLE usage_logs DETACH PARTITION "{name}"')
+            await conn.execute(_RECORD_ARCHIVE_SQL, name, month, _add_months(month, 1), location, counted[0], size)
+            await conn.execute(f'DROP TABLE "{name}"')
+        if self.bucket:
+            path.unlink()
+        self.stats_counters["archived"] += 1
+        self.stats_counters["archived_rows"] += counted[0]
+        self.last_archived = name
+        logger.info("Archived %s (%d rows, %d bytes) to %s", name, counted[0], size, location)
+
+    @staticmethod
+    async def _batches(conn, name: str, counted: list[int]) -> AsyncIterator[list[dict]]:
+        sql = f'SELECT {_ARCHIVE_SELECT} FROM "{name}" ORDER BY created_at, id'
+        batch = []
+        async for record in conn.cursor(sql, prefetch=EXPORT_BATCH_SIZE):
+            batch.append(dict(record))
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                counted[0] += len(batch)
+                yield batch
+                batch = []
+        if batch:
+            counted[0] += len(batch)
+            yield batch
+
+    def _upload(self, path: Path, key: str) -> None:
+        get_supabase().storage.from_(self.bucket).upload(
+            key, path, {"content-type": "application/vnd.apache.parquet", "upsert": "true"}
+        )
+
+    def stats(self) -> dict:
+        return {
+            "upkeep_failing": self.last_upkeep_error is not None,
+            "last_upkeep_error": self.last_upkeep_error,
+            "retention_months": self.retention_months,
+            "last_archived": self.last_archived,
+            **self.stats_counters,
+        }
+
+
+usage_archiver = UsageArchiver()
@@ -0,0 +1,142 @@
+"""
+Bulk export of usage_logs as NDJSON, CSV or Parquet.
+
+Rows come from get_repository().iter_usage_logs() in keyset pages and are
+encoded batch by batch straight into the response body: memory stays at one
+batch whatever the date range, rows are never validated through Pydantic
+models, and no database connection is held between pages.
+"""
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from app.models.repository import get_repository
+
+# Rows fetched and encoded per step. PostgREST caps responses at 1000 rows.
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = (
+    "id", "created_at", "api_key_id", "provider", "model", "input_tokens", "output_tokens",
+    "total_tokens", "provider_cost", "vuzo_cost", "response_time_ms", "status_code",
+)
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+async def _ndjson(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in batch).encode("utf-8")
+
+
+async def _csv(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    async for batch in batches:
+        writer.writerows([row[c] for c in EXPORT_COLUMNS] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header only: nothing to export
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last take()."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # The Parquet footer records row-group offsets from this.
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# Parquet type per usage_logs column; the rest are strings. Costs are
+# NUMERIC(12, 6) in the database and float64 here, which round-trips them
+# at 6 decimal places.
+def _parquet_type(column: str):
+    import pyarrow as pa
+
+    return {
+        "created_at": pa.timestamp("us", tz="UTC"),
+        "input_tokens": pa.int64(),
+        "output_tokens": pa.int64(),
+        "total_tokens": pa.int64(),
+        "provider_cost": pa.float64(),
+        "vuzo_cost": pa.float64(),
+        "response_time_ms": pa.int64(),
+        "status_code": pa.int32(),
+    }.get(column, pa.string())
+
+
+async def parquet_chunks(
+    batches: AsyncIterator[list[dict]], columns: tuple[str, ...] = EXPORT_COLUMNS
+) -> AsyncIterator[bytes]:
+    """A zstd Parquet file of `columns`, one row group per batch, yielded as it is written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(c, _parquet_type(c)) for c in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for batch in batches:
+            data = {c: [row[c] for row in batch] for c in columns}
+            if "created_at" in data:
+                data["created_at"] = [
+                    datetime.fromisoformat(v) if isinstance(v, str) else v for v in data["created_at"]
+                ]
+            writer.write_table(pa.table(data, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+_ENCODERS = {"ndjson": _ndjson, "csv": _csv, "parquet": parquet_chunks}
+
+
+def export_usage_logs(
+    user_id: str,
+    format: str,
+    model: str | None = None,
+    provider: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Encoded body chunks for the user's usage logs in the range, oldest
+    first. Raises 501 up front for Parquet when pyarrow isn't installed.
+    """
+    if format == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export is not available on this server")
+    batches = get_repository().iter_usage_logs(
+        user_id, model, provider, start_date, end_date, EXPORT_COLUMNS, EXPORT_BATCH_SIZE
+    )
+    return _ENCODERS[format](batches)
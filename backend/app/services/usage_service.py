@@ -1,17 +1,15 @@
-from collections import defaultdict
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
 
-from app.models.database import get_supabase
+from app.models.repository import get_repository
+from app.services.outbox import outbox
+from app.services.read_cache import read_cache
+from app.services.usage_writer import usage_log_writer
+from app.utils.pagination import cursor_position, split_page
 
 
-def _apply_date_filters(query, start_date: str | None, end_date: str | None):
-    if start_date:
-        query = query.gte("created_at", start_date)
-    if end_date:
-        query = query.lte("created_at", end_date)
-    return query
-
-
-def log_usage(
+async def log_usage(
     user_id: str,
     api_key_id: str,
     provider: str,
@@ -22,10 +20,16 @@ def log_usage(
     vuzo_cost: float,
     response_time_ms: int,
     status_code: int = 200,
-) -> dict:
-    """Log a single request's token usage and cost."""
-    sb = get_supabase()
-    result = sb.table("usage_logs").insert({
+) -> None:
+    """
+    Log a single request's token usage and cost.
+
+    With the outbox open the row is committed there and replayed to
+    usage_logs under its event id. Otherwise it is queued for
+    usage_log_writer with a fresh event id. Either way it is inserted in a
+    batch, and created_at is stamped now so batching doesn't shift it.
+    """
+    row = {
         "user_id": user_id,
         "api_key_id": api_key_id,
         "provider": provider,
@@ -37,11 +41,15 @@ def log_usage(
         "vuzo_cost": vuzo_cost,
         "response_time_ms": response_time_ms,
         "status_code": status_code,
-    }).execute()
-    return result.data[0] if result.data else {}
+        "created_at": datetime.now(timezone.utc),
+    }
+    if outbox.enabled:
+        outbox.append("usage_log", row)
+    else:
+        await usage_log_writer.submit({**row, "event_id": str(uuid.uuid4())})
 
 
-def get_usage_logs(
+async def get_usage_logs(
     user_id: str,
     model: str | None = None,
     provider: str | None = None,
@@ -49,97 +57,119 @@ def get_usage_logs(
     end_date: str | None = None,
     limit: int = 50,
     offset: int = 0,
-) -> list[dict]:
-    """Get paginated usage logs with optional filters."""
-    sb = get_supabase()
-    query = (
-        sb.table("usage_logs")
-        .select("*")
-        .eq("user_id", user_id)
-    )
-    if model:
-        query = query.eq("model", model)
-    if provider:
-        query = query.eq("provider", provider)
-    query = _apply_date_filters(query, start_date, end_date)
-
-    result = (
-        query.order("created_at", desc=True)
-        .range(offset, offset + limit - 1)
-        .execute()
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    One page of usage logs with optional filters, newest first, and the
+    cursor for the next page (None on the last).
+    """
+    rows = await get_repository().list_usage_logs(
+        user_id, model, provider, start_date, end_date, limit + 1, offset, cursor_position(cursor, offset)
     )
-    return result.data or []
+    return split_page(rows, limit)
 
 
-def get_usage_summary(
+async def get_usage_summary(
     user_id: str,
     start_date: str | None = None,
     end_date: str | None = None,
+    group_by: str | None = None,
+    time_zone: str = "UTC",
 ) -> dict:
     """
     Get aggregated usage summary for a user.
-    Optionally scoped to a date range.
+    Optionally scoped to a date range, whose date-only bounds are whole
+    local days in `time_zone` as for daily usage, and broken down by model,
+    provider or API key. Aggregated in the database either way, and cached
+    per user (see read_cache).
     """
-    sb = get_supabase()
-    query = (
-        sb.table("usage_logs")
-        .select("input_tokens, output_tokens, total_tokens, provider_cost, vuzo_cost")
-        .eq("user_id", user_id)
+    start_date, end_date = _local_days(start_date, end_date, time_zone)
+    return await read_cache.get(
+        user_id, "summary", (start_date, end_date, group_by),
+        lambda: get_repository().usage_summary(user_id, start_date, end_date, group_by),
+        end_date=end_date,
     )
-    query = _apply_date_filters(query, start_date, end_date)
-    result = query.execute()
-    rows = result.data or []
-
-    return {
-        "total_requests": len(rows),
-        "total_input_tokens": sum(r["input_tokens"] for r in rows),
-        "total_output_tokens": sum(r["output_tokens"] for r in rows),
-        "total_tokens": sum(r["total_tokens"] for r in rows),
-        "total_provider_cost": sum(float(r["provider_cost"]) for r in rows),
-        "total_vuzo_cost": sum(float(r["vuzo_cost"]) for r in rows),
-    }
 
 
-def get_daily_usage(
+async def get_daily_usage(
     user_id: str,
     model: str | None = None,
     provider: str | None = None,
     start_date: str | None = None,
     end_date: str | None = None,
+    time_zone: str = "UTC",
+) -> list[dict]:
+    """Usage by local day, model and provider, read from the hourly rollups and cached per user."""
+    start_date, end_date = _local_days(start_date, end_date, time_zone)
+    return await read_cache.get(
+        user_id, "daily", (model, provider, start_date, end_date, time_zone),
+        lambda: _load_daily_usage(user_id, model, provider, start_date, end_date, time_zone),
+        end_date=end_date,
+    )
+
+
+def _local_days(start_date: str | None, end_date: str | None, time_zone: str) -> tuple[str | None, str | None]:
+    """
+    Date-only bounds as whole local days in `time_zone`: the start from its
+    local midnight, the end through the last instant of that local day.
+    Bounds with a time are passed through unchanged.
+    """
+    def day(value: str | None) -> date | None:
+        try:
+            return date.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+
+    zone = ZoneInfo(time_zone)
+    if (start := day(start_date)) is not None:
+        start_date = datetime.combine(start, time.min, zone).astimezone(timezone.utc).isoformat()
+    if (end := day(end_date)) is not None:
+        next_day = datetime.combine(end + timedelta(days=1), time.min, zone).astimezone(timezone.utc)
+        end_date = (next_day - timedelta(microseconds=1)).isoformat()
+    return start_date, end_date
+
+
+async def _load_daily_usage(
+    user_id: str,
+    model: str | None,
+    provider: str | None,
+    start_date: str | None,
+    end_date: str | None,
+    time_zone: str,
 ) -> list[dict]:
-    """Aggregate usage logs by day + model."""
-    sb = get_supabase()
-    query = (
-        sb.table("usage_logs")
-        .select("created_at, model, provider, input_tokens, output_tokens, vuzo_cost")
-        .eq("user_id", user_id)
+    rows = await get_repository().usage_series(
+        user_id, "day", time_zone, start_date, end_date, model, provider, ["model", "provider"]
     )
-    if model:
-        query = query.eq("model", model)
-    if provider:
-        query = query.eq("provider", provider)
-    query = _apply_date_filters(query, start_date, end_date)
-    result = query.order("created_at", desc=True).execute()
-    rows = result.data or []
-
-    buckets: dict[tuple[str, str, str], dict] = defaultdict(
-        lambda: {"total_requests": 0, "input_tokens": 0, "output_tokens": 0, "total_cost": 0.0}
+    return [
+        {
+            "date": r["bucket"],
+            "model": r["model"],
+            "provider": r["provider"],
+            "total_requests": r["total_requests"],
+            "input_tokens": r["total_input_tokens"],
+            "output_tokens": r["total_output_tokens"],
+            "total_cost": r["total_vuzo_cost"],
+        }
+        for r in rows
+    ]
+
+
+async def get_usage_series(
+    user_id: str,
+    bucket: str = "day",
+    time_zone: str = "UTC",
+    start_date: str | None = None,
+    end_date: str | None = None,
+    model: str | None = None,
+    provider: str | None = None,
+    group_by: list[str] | None = None,
+) -> list[dict]:
+    """
+    Usage per hour, day, week or month in `time_zone`, optionally split by
+    model, provider and/or API key. Costs O(buckets): it reads only the
+    hourly rollups, never usage_logs. Date-only bounds are local days.
+    """
+    start_date, end_date = _local_days(start_date, end_date, time_zone)
+    return await get_repository().usage_series(
+        user_id, bucket, time_zone, start_date, end_date, model, provider, group_by or []
     )
-    for r in rows:
-        day = r["created_at"][:10]
-        key = (day, r["model"], r["provider"])
-        b = buckets[key]
-        b["total_requests"] += 1
-        b["input_tokens"] += r["input_tokens"]
-        b["output_tokens"] += r["output_tokens"]
-        b["total_cost"] += float(r["vuzo_cost"])
-
-    daily = []
-    for (day, mdl, prov), agg in sorted(buckets.items(), key=lambda x: x[0][0], reverse=True):
-        daily.append({
-            "date": day,
-            "model": mdl,
-            "provider": prov,
-            **agg,
-        })
-    return daily
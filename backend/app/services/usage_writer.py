@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+from datetime import datetime
+
+from app.models.repository import get_repository
+from app.services.outbox import OutboxEvent, outbox
+from app.services.read_cache import read_cache
+from app.services.usage_archiver import usage_archiver
+from app.utils.background import wait_event
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+# How long submit() waits for room under the "block" policy before dropping.
+_BLOCK_TIMEOUT_SECONDS = 1.0
+# A failed batch is retried this many times in total, with doubling backoff.
+_MAX_ATTEMPTS = 3
+_RETRY_BACKOFF_SECONDS = 0.5
+
+
+def _written(rows: list[dict]) -> None:
+    """Invalidate the cached usage read models of every user in a written batch."""
+    oldest: dict[str, datetime] = {}
+    for row in rows:
+        user_id, created_at = row["user_id"], row["created_at"]
+        if user_id not in oldest or created_at < oldest[user_id]:
+            oldest[user_id] = created_at
+    for user_id, created_at in oldest.items():
+        read_cache.invalidate_usage(user_id, created_at)
+
+
+
+class UsageLogWriter:
+    """
+    Bounded queue between the proxy and usage_logs.
+
+    submit() appends the row in memory; one background task drains the queue
+    and writes each batch with a single multi-row INSERT. A batch is sent as
+    soon as `batch_size` rows are waiting, or `flush_interval` seconds after
+    its first row arrived, whichever comes first. While a batch is being
+    written (or retried), new rows keep queueing behind it.
+
+    When the queue is full the overflow policy decides:
+      - "block":       wait up to 1 s for room (backpressure on the request
+                       that is finishing), then drop the row
+      - "drop_newest": drop the incoming row
+      - "drop_oldest": evict the oldest queued row to make room
+    Batches that still fail after _MAX_ATTEMPTS are logged and dropped.
+    Dropped rows are counted in stats(); the credit charge they belong to
+    has already been applied, so only the usage detail is lost.
+
+    When the outbox is open, log_usage() writes there instead and this
+    queue stays empty (replay_usage_logs below does the inserting).
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        overflow: str = "block",
+        on_written: Callable[[list[dict]], None] | None = None,
+    ):
+        self.configure(capacity, batch_size, flush_interval, overflow)
+        self.on_written = on_written  # called with each batch once it is inserted
+        self._rows: deque[dict] = deque()
+        self._in_flight: asyncio.Future | None = None
+        self._running = False
+        self._writing = 0
+        self.max_depth = 0
+        self.stats_counters = {
+            "submitted": 0, "written": 0, "batches": 0, "dropped": 0,
+            "blocked": 0, "failed_batches": 0, "retries": 0,
+        }
+
+    def configure(self, capacity: int, batch_size: int, flush_interval: float, overflow: str) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown usage log overflow policy {overflow!r}; expected one of {OVERFLOW_POLICIES}")
+        self.capacity = capacity
+        self.batch_size = min(batch_size, capacity)
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+
+    # ── Producer side ──
+
+    def _append(self, row: dict) -> None:
+        self._rows.append(row)
+        self.stats_counters["submitted"] += 1
+        self.max_depth = max(self.max_depth, len(self._rows))
+        self._has_rows.set()
+        if len(self._rows) >= self.batch_size:
+            self._batch_full.set()
+        if len(self._rows) >= self.capacity:
+            self._has_room.clear()
+
+    async def submit(self, row: dict) -> None:
+        """Queue one usage_logs row. Overflow is counted in stats(), never raised."""
+        if not self._running:
+            # No writer task (scripts, tests without the lifespan): write inline.
+            await get_repository().insert_usage_logs([row])
+            if self.on_written:
+                self.on_written([row])
+            self.stats_counters["written"] += 1
+            return
+        if len(self._rows) < self.capacity:
+            self._append(row)
+            return
+
+        if self.overflow == "drop_oldest":
+            self._rows.popleft()
+            self.stats_counters["dropped"] += 1
+            self._append(row)
+            return
+        if self.overflow == "block":
+            self.stats_counters["blocked"] += 1
+            deadline = time.monotonic() + _BLOCK_TIMEOUT_SECONDS
+            while len(self._rows) >= self.capacity:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await wait_event(self._has_room, remaining)
+            if len(self._rows) < self.capacity:
+                self._append(row)
+                return
+        self.stats_counters["dropped"] += 1
+
+    # ── Writer task ──
+
+    def _take_batch(self) -> list[dict]:
+        batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+        if not self._rows:
+            self._has_rows.clear()
+        if len(self._rows) < self.batch_size:
+            self._batch_full.clear()
+        if len(self._rows) < self.capacity:
+            self._has_room.set()
+        return batch
+
+    async def _write(self, batch: list[dict]) -> None:
+        self._writing = len(batch)
+        try:
+            for attempt in range(1, _MAX_ATTEMPTS + 1):
+                try:
+                    await get_repository().insert_usage_logs(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    if attempt == _MAX_ATTEMPTS:
+                        self.stats_counters["failed_batches"] += 1
+                        self.stats_counters["dropped"] += len(batch)
+                        logger.exception("Dropping %d usage_logs rows after %d attempts", len(batch), attempt)
+                        return
+                    self.stats_counters["retries"] += 1
+                    await asyncio.sleep(_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                else:
+                    if self.on_written:
+                        self.on_written(batch)
+                    self.stats_counters["batches"] += 1
+                    self.stats_counters["written"] += len(batch)
+                    return
+        finally:
+            self._writing = 0
+
+    async def run(self) -> None:
+        """Drain the queue until cancelled."""
+        # Created here so they belong to the loop the writer runs on.
+        self._has_rows, self._batch_full, self._has_room = asyncio.Event(), asyncio.Event(), asyncio.Event()
+        self._has_room.set()
+        self._running = True
+        try:
+            while True:
+                await self._has_rows.wait()
+                # Give the batch until flush_interval to fill up.
+                await wait_event(self._batch_full, self.flush_interval)
+                # Shielded so shutdown doesn't abandon a half-sent batch;
+                # drain() waits for it instead.
+                self._in_flight = asyncio.ensure_future(self._write(self._take_batch()))
+                await asyncio.shield(self._in_flight)
+        finally:
+            self._running = False
+
+    async def drain(self) -> int:
+        """Write everything still queued (shutdown). Returns the number of rows sent."""
+        if self._in_flight is not None and not self._in_flight.done():
+            await self._in_flight
+        sent = 0
+        while self._rows:
+            batch = self._take_batch()
+            await self._write(batch)
+            sent += len(batch)
+        return sent
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "depth": len(self._rows),
+            "writing": self._writing,
+            "max_depth": self.max_depth,
+            "capacity": self.capacity,
+            "batch_size": self.batch_size,
+            "overflow_policy": self.overflow,
+            **self.stats_counters,
+        }
+
+
+usage_log_writer = UsageLogWriter(on_written=_written)
+
+
+async def replay_usage_logs(events: list[OutboxEvent]) -> None:
+    """
+    Outbox handler: insert queued usage rows in one batch, skipping ones
+    already written and ones dated in archived months.
+    """
+    rows = [
+        {**e.payload, "created_at": datetime.fromisoformat(e.payload["created_at"]), "event_id": e.event_id}
+        for e in events
+    ]
+    rows = usage_archiver.drop_archived(rows)
+    if rows:
+        await get_repository().insert_usage_logs(rows)
+        _written(rows)
+
+
+outbox.register("usage_log", replay_usage_logs)
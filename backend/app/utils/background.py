@@ -0,0 +1,47 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(fn: Callable[[], Awaitable[object]], interval: float, name: str) -> None:
+    """
+    Await `fn()` every `interval` seconds until cancelled.
+    Failures are logged and never stop the loop.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Background task %s failed", name)
+
+
+async def run_once(fn: Callable[[], Awaitable[object]], name: str) -> None:
+    """Await `fn()` once, logging instead of raising (used for shutdown flushes)."""
+    try:
+        await fn()
+    except Exception:
+        logger.exception("Background task %s failed", name)
+
+
+async def wait_event(event: asyncio.Event, timeout: float) -> None:
+    """
+    Wait until `event` is set or `timeout` passes. Unlike wait_for() on 3.11,
+    a cancellation arriving as the event fires is never swallowed.
+    """
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait({waiter}, timeout=timeout)
+    finally:
+        waiter.cancel()
+
+
+async def cancel_tasks(tasks: list[asyncio.Task]) -> None:
+    """Cancel lifespan-managed background tasks and wait for them to exit."""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
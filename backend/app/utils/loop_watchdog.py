@@ -0,0 +1,177 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+
+_LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+_STACK_DEPTH = 8
+_TOP_SITES = 10
+_MAX_SITES = 500
+
+
+def _describe(frame, app_prefix: str) -> tuple[str, list[str]]:
+    """
+    Summarise the loop thread's current stack as (call_site, stack). The call
+    site is the innermost frame in our own code (module starting with
+    `app_prefix`), falling back to the innermost Python frame.
+    """
+    stack, site = [], None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "?")
+        where = f"{module}.{frame.f_code.co_qualname}:{frame.f_lineno}"
+        if len(stack) < _STACK_DEPTH:
+            stack.append(where)
+        if site is None and module.startswith(app_prefix) and module != __name__:
+            site = f"{module}.{frame.f_code.co_qualname}"
+        frame = frame.f_back
+    if site is None:
+        site = stack[0].rsplit(":", 1)[0] if stack else "<unknown>"
+    return site, stack
+
+
+class LoopWatchdog:
+    """
+    Measures event-loop lag and attributes stalls to the code that caused them.
+
+    A loop task sleeps for `interval` and records how late it woke up. A
+    daemon thread checks every `threshold / 2` whether that task has missed
+    its wake-up by more than `threshold`. If it has, the loop is blocked
+    right now, so the thread grabs the loop thread's current frame once per
+    stall. When the loop recovers, the stall's lag is charged to that call
+    site. Cost when healthy: one timer per `interval` on the loop plus one
+    clock comparison per check in the thread.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, app_prefix: str = "app."):
+        self.interval = interval
+        self.threshold = threshold
+        self.app_prefix = app_prefix
+        self._loop_thread_id: int | None = None
+        self._last_tick = time.monotonic()
+        self._sampled_tick: float | None = None
+        self._pending: tuple[str, list[str]] | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self._buckets = Counter()
+        self._ticks = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+        self._stalls = 0
+        self._unattributed_stalls = 0
+        self._sites: dict[str, dict] = {}
+
+    # ── Loop side ──
+
+    async def _tick(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_tick = now
+            self._record(max(0.0, now - start - self.interval))
+
+    def _record(self, lag: float) -> None:
+        self._ticks += 1
+        self._lag_total += lag
+        self._lag_max = max(self._lag_max, lag)
+        lag_ms = lag * 1000
+        self._buckets[next((b for b in _LAG_BUCKETS_MS if lag_ms <= b), "+Inf")] += 1
+
+        if lag < self.threshold:
+            return
+        self._stalls += 1
+        pending, self._pending = self._pending, None
+        if pending is None:
+            self._unattributed_stalls += 1
+            return
+        site, stack = pending
+        entry = self._sites.get(site)
+        if entry is None:
+            if len(self._sites) >= _MAX_SITES:
+                self._unattributed_stalls += 1
+                return
+            entry = self._sites[site] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        entry["count"] += 1
+        entry["total_ms"] += lag_ms
+        entry["max_ms"] = max(entry["max_ms"], lag_ms)
+        entry["stack"] = stack
+
+    # ── Sampler thread ──
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            last_tick = self._last_tick
+            if time.monotonic() - last_tick < self.interval + self.threshold:
+                continue
+            if self._sampled_tick == last_tick:
+                continue  # this stall already has its sample
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._sampled_tick = last_tick
+            self._pending = _describe(frame, self.app_prefix)
+            del frame
+
+    # ── Lifecycle ──
+
+    def configure(self, threshold: float) -> None:
+        self.threshold = threshold
+
+    def start(self) -> None:
+        """Start measuring the running loop. Must be called from the loop thread."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        self._thread = threading.Thread(target=self._sample, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._thread.join(timeout=1)
+        self._task = self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def stats(self) -> dict:
+        top = sorted(self._sites.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:_TOP_SITES]
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "ticks": self._ticks,
+            "mean_lag_ms": round(self._lag_total / self._ticks * 1000, 3) if self._ticks else 0.0,
+            "max_lag_ms": round(self._lag_max * 1000, 3),
+            "lag_histogram_ms": {str(b): self._buckets[b] for b in (*_LAG_BUCKETS_MS, "+Inf")},
+            "stalls": self._stalls,
+            "unattributed_stalls": self._unattributed_stalls,
+            "top_call_sites": [
+                {
+                    "site": site,
+                    "count": entry["count"],
+                    "total_ms": round(entry["total_ms"], 3),
+                    "max_ms": round(entry["max_ms"], 3),
+                    "stack": entry["stack"],
+                }
+                for site, entry in top
+            ],
+        }
+
+    def reset(self) -> None:
+        self._reset_stats()
+
+
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,47 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque cursor for the page after `row`, from its (created_at, id)."""
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """(created_at, id) from a cursor made by encode_cursor(). Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        datetime.fromisoformat(created_at)
+        uuid.UUID(row_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    return created_at, row_id
+
+
+def cursor_position(cursor: str | None, offset: int) -> tuple[str, str] | None:
+    """Decode a request's cursor for the repository, as a 400 if it can't be used."""
+    if not cursor:
+        return None
+    if offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset, not both")
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def split_page(rows: list[dict], limit: int) -> tuple[list[dict], str | None]:
+    """
+    Split `limit + 1` fetched rows into the page and the cursor for the
+    next one (None on the last page).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1])
@@ -1,3 +1,4 @@
+import json
 from decimal import Decimal
 
 
@@ -27,3 +28,21 @@ def calculate_cost(
     return float(provider_cost.quantize(Decimal("0.000001"))), float(
         vuzo_cost.quantize(Decimal("0.000001"))
     )
+
+
+# Rough tokenizer-free estimate: ~4 characters per token plus a few tokens
+# of per-message framing. Only used to size credit reservations.
+_CHARS_PER_TOKEN = 4
+_TOKENS_PER_MESSAGE = 4
+
+
+def estimate_prompt_tokens(messages: list) -> int:
+    """Approximate prompt size for a list of ChatMessage-like objects."""
+    chars = 0
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            chars += len(content)
+        elif content is not None:
+            chars += len(json.dumps(content))
+    return chars // _CHARS_PER_TOKEN + _TOKENS_PER_MESSAGE * len(messages)
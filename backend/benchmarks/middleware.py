@@ -0,0 +1,141 @@
+"""
+Streaming overhead of the rate-limiting middleware: pure ASGI versus
+BaseHTTPMiddleware.
+
+    cd backend && python -m benchmarks.middleware
+
+Drives an SSE endpoint wrapped in CORS plus the rate limiter straight
+through the ASGI interface (no sockets), once with RateLimiterMiddleware and
+once with the BaseHTTPMiddleware version it replaced. Reports time to first
+byte, the latency from each chunk being yielded to reaching the server's
+`send`, and overall chunk throughput.
+"""
+import asyncio
+import statistics
+import time
+from unittest.mock import patch
+
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+from app.middleware import rate_limiter as rl
+from app.models.schemas import AuthContext
+
+STREAMS = 200
+CHUNKS = 200
+CHUNK = b'data: {"choices":[{"delta":{"content":"hello"}}]}\n\n'
+
+_AUTH = AuthContext(user_id="u", api_key_id="key-1", rate_limit_rpm=1_000_000_000)
+
+
+class BaseHTTPRateLimiter(BaseHTTPMiddleware):
+    """The previous RateLimiterMiddleware, kept here only for comparison."""
+
+    async def dispatch(self, request: Request, call_next):
+        auth_header = request.headers.get("authorization", "")
+        if not auth_header.startswith("Bearer vz-"):
+            return await call_next(request)
+        try:
+            auth = await rl.lookup_api_key(auth_header[7:])
+        except Exception:
+            return await call_next(request)
+        if auth.rate_limit_rpm <= 0:
+            return await call_next(request)
+        decision = rl.rate_limiter.check(auth.api_key_id, auth.rate_limit_rpm)
+        if not decision.allowed:
+            return rl._rate_limited(decision)
+        response = await call_next(request)
+        response.headers.update(decision.headers())
+        return response
+
+
+def _make_app(limiter_cls) -> Starlette:
+    yielded: list[float] = []
+
+    async def stream(request: Request):
+        async def chunks():
+            for _ in range(CHUNKS):
+                yielded.append(time.perf_counter())
+                yield CHUNK
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    app = Starlette(
+        routes=[Route("/v1/chat/completions", stream, methods=["POST"])],
+        middleware=[Middleware(CORSMiddleware, allow_origins=["*"]), Middleware(limiter_cls)],
+    )
+    app.state.yielded = yielded
+    return app
+
+
+async def _one_stream(app: Starlette) -> tuple[float, list[float]]:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/v1/chat/completions", "raw_path": b"/v1/chat/completions",
+        "query_string": b"", "root_path": "", "server": ("test", 80), "client": ("test", 1),
+        "headers": [(b"authorization", b"Bearer vz-sk_bench"), (b"content-type", b"application/json")],
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"{}", "more_body": False}
+        await asyncio.Event().wait()
+
+    yielded = app.state.yielded
+    yielded.clear()
+    sent: list[float] = []
+    first_byte = None
+    start = time.perf_counter()
+
+    async def send(message):
+        nonlocal first_byte
+        if message["type"] == "http.response.body" and message.get("body"):
+            now = time.perf_counter()
+            first_byte = first_byte or now - start
+            sent.append(now)
+
+    await app(scope, receive, send)
+    return first_byte, [s - y for y, s in zip(yielded, sent)]
+
+
+async def bench(limiter_cls) -> dict:
+    app = _make_app(limiter_cls)
+    await _one_stream(app)  # warm up
+    first_bytes, latencies = [], []
+    start = time.perf_counter()
+    for _ in range(STREAMS):
+        first_byte, chunk_latencies = await _one_stream(app)
+        first_bytes.append(first_byte)
+        latencies.extend(chunk_latencies)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "ttfb_us": statistics.median(first_bytes) * 1e6,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "chunks_per_s": STREAMS * CHUNKS / elapsed,
+    }
+
+
+def main() -> None:
+    print(f"{STREAMS} streams × {CHUNKS} SSE chunks through CORS + rate limiter")
+    print(f"  {'':20} {'TTFB':>10} {'chunk p50':>10} {'chunk p99':>10} {'chunks/s':>11}")
+    with patch.object(rl, "lookup_api_key", return_value=_AUTH), \
+            patch.object(rl, "rate_limiter", rl.GCRALimiter()):
+        for name, cls in (("BaseHTTPMiddleware", BaseHTTPRateLimiter), ("pure ASGI", rl.RateLimiterMiddleware)):
+            r = asyncio.run(bench(cls))
+            print(
+                f"  {name:20} {r['ttfb_us']:8.1f}µs {r['p50_us']:8.1f}µs {r['p99_us']:8.1f}µs "
+                f"{r['chunks_per_s']:11,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
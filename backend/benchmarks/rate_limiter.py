@@ -0,0 +1,56 @@
+"""
+Admission cost of the per-key rate limiter.
+
+    cd backend && python -m benchmarks.rate_limiter
+
+Times GCRALimiter.check() alone and together with the cached key lookup the
+middleware does first (SHA-256 of the key plus a cache hit), over a
+population of keys.
+"""
+import asyncio
+import time
+
+from app.middleware import auth
+from app.middleware.rate_limiter import GCRALimiter
+from app.models.schemas import AuthContext
+from app.utils.crypto import hash_api_key
+
+KEYS = 10_000
+CALLS = 500_000
+
+
+def _per_call_us(seconds: float, calls: int) -> float:
+    return seconds / calls * 1e6
+
+
+def bench_check() -> float:
+    limiter = GCRALimiter()
+    ids = [f"key-{i}" for i in range(KEYS)]
+    start = time.perf_counter()
+    for i in range(CALLS):
+        limiter.check(ids[i % KEYS], 600)
+    return _per_call_us(time.perf_counter() - start, CALLS)
+
+
+async def bench_lookup_and_check() -> float:
+    limiter = GCRALimiter()
+    tokens = [f"vz-sk_{i:032x}" for i in range(KEYS)]
+    for i, token in enumerate(tokens):
+        auth._auth_cache.set(
+            hash_api_key(token), AuthContext(user_id="u", api_key_id=f"key-{i}", rate_limit_rpm=600)
+        )
+    start = time.perf_counter()
+    for i in range(CALLS):
+        ctx = await auth.lookup_api_key(tokens[i % KEYS])
+        limiter.check(ctx.api_key_id, ctx.rate_limit_rpm)
+    return _per_call_us(time.perf_counter() - start, CALLS)
+
+
+def main() -> None:
+    print(f"{CALLS:,} admissions over {KEYS:,} keys")
+    print(f"  GCRALimiter.check            {bench_check():6.2f} µs/request")
+    print(f"  cached key lookup + check    {asyncio.run(bench_lookup_and_check()):6.2f} µs/request")
+
+
+if __name__ == "__main__":
+    main()
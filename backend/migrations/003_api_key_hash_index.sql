@@ -0,0 +1,6 @@
+-- Look up API keys by their full SHA-256 hash instead of the 8-char prefix.
+-- The prefix ("vz-sk_" + 2 hex chars) only has 256 distinct values, so every
+-- prefix bucket holds thousands of keys. key_hash is already populated for
+-- every existing key, so no backfill is needed.
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_api_keys_key_hash ON api_keys (key_hash);
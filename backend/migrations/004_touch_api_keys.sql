@@ -0,0 +1,21 @@
+-- Bulk last_used_at update used by the write-behind flusher in
+-- app/services/key_activity.py. One call per flush interval instead of one
+-- UPDATE per proxied request.
+--
+-- p_updates: [{"id": "<api_key uuid>", "last_used_at": "<iso timestamp>"}, ...]
+-- Never moves last_used_at backwards (another worker may have flushed a later
+-- timestamp first).
+
+CREATE OR REPLACE FUNCTION touch_api_keys(p_updates JSONB)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    WITH updated AS (
+        UPDATE api_keys k
+        SET last_used_at = GREATEST(k.last_used_at, u.last_used_at)
+        FROM jsonb_to_recordset(p_updates) AS u(id UUID, last_used_at TIMESTAMPTZ)
+        WHERE k.id = u.id
+        RETURNING 1
+    )
+    SELECT count(*)::INTEGER FROM updated;
+$$;
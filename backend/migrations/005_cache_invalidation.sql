@@ -0,0 +1,90 @@
+-- Cross-worker cache invalidation.
+--
+-- Every change to a table that workers cache in memory is recorded in
+-- cache_invalidation_events and announced on the vuzo_cache_invalidation
+-- channel. Workers LISTEN on the channel (app/services/invalidation.py) and
+-- fall back to polling the events table by id when LISTEN is unavailable.
+-- Pollers prune rows older than 10 minutes.
+
+CREATE TABLE IF NOT EXISTS cache_invalidation_events (
+    id BIGSERIAL PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_cache_invalidation_events_created
+    ON cache_invalidation_events (created_at);
+
+CREATE OR REPLACE FUNCTION notify_cache_invalidation()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rec RECORD;
+    body JSONB;
+    event_id BIGINT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME = 'api_keys' THEN
+        body := jsonb_build_object('id', rec.id, 'user_id', rec.user_id, 'key_hash', rec.key_hash);
+        IF TG_OP = 'UPDATE' AND OLD.key_hash IS DISTINCT FROM NEW.key_hash THEN
+            body := body || jsonb_build_object('old_key_hash', OLD.key_hash);
+        END IF;
+    ELSIF TG_TABLE_NAME = 'users' THEN
+        body := jsonb_build_object('user_id', rec.id, 'supabase_auth_id', rec.supabase_auth_id);
+    ELSIF TG_TABLE_NAME = 'credits' THEN
+        body := jsonb_build_object('user_id', rec.user_id, 'balance', rec.balance);
+    ELSIF TG_TABLE_NAME = 'model_pricing' THEN
+        body := jsonb_build_object('model_name', rec.model_name);
+    ELSIF TG_TABLE_NAME = 'provider_keys' THEN
+        body := jsonb_build_object('provider', rec.provider);
+    ELSE
+        body := '{}'::JSONB;
+    END IF;
+
+    body := body || jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP);
+
+    INSERT INTO cache_invalidation_events (table_name, payload)
+    VALUES (TG_TABLE_NAME, body)
+    RETURNING id INTO event_id;
+
+    PERFORM pg_notify(
+        'vuzo_cache_invalidation',
+        (body || jsonb_build_object('event_id', event_id))::TEXT
+    );
+    RETURN NULL;
+END;
+$$;
+
+-- api_keys: last_used_at churn (touch_api_keys) must not fire events, so
+-- only the columns that affect cached auth state are watched.
+DROP TRIGGER IF EXISTS trg_api_keys_invalidate ON api_keys;
+CREATE TRIGGER trg_api_keys_invalidate
+    AFTER INSERT OR DELETE OR UPDATE OF is_active, rate_limit_rpm, key_hash, user_id ON api_keys
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS trg_users_invalidate ON users;
+CREATE TRIGGER trg_users_invalidate
+    AFTER UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS trg_credits_invalidate ON credits;
+CREATE TRIGGER trg_credits_invalidate
+    AFTER INSERT OR DELETE OR UPDATE OF balance ON credits
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS trg_model_pricing_invalidate ON model_pricing;
+CREATE TRIGGER trg_model_pricing_invalidate
+    AFTER INSERT OR UPDATE OR DELETE ON model_pricing
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS trg_provider_keys_invalidate ON provider_keys;
+CREATE TRIGGER trg_provider_keys_invalidate
+    AFTER INSERT OR UPDATE OR DELETE ON provider_keys
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
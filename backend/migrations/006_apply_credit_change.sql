@@ -0,0 +1,36 @@
+-- Atomic balance change + ledger row, used by deduct_credits/add_credits in
+-- app/services/billing_service.py. Replaces read-balance / write-balance /
+-- insert-transaction (three round trips and a lost update whenever two
+-- requests for the same user finish together) with one statement-level
+-- increment inside one transaction.
+--
+-- p_amount is signed: negative for usage, positive for top-ups. A missing
+-- credits row is created on the fly. Returns the new balance and the
+-- credit_transactions id.
+
+CREATE OR REPLACE FUNCTION apply_credit_change(
+    p_user_id UUID,
+    p_amount NUMERIC,
+    p_type transaction_type,
+    p_description TEXT DEFAULT ''
+)
+RETURNS TABLE (balance NUMERIC, transaction_id UUID)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_amount NUMERIC(12, 6) := p_amount;
+BEGIN
+    INSERT INTO credits AS c (user_id, balance)
+    VALUES (p_user_id, v_amount)
+    ON CONFLICT (user_id) DO UPDATE
+        SET balance = c.balance + EXCLUDED.balance,
+            updated_at = now()
+    RETURNING c.balance INTO balance;
+
+    INSERT INTO credit_transactions (user_id, amount, type, description)
+    VALUES (p_user_id, v_amount, p_type, p_description)
+    RETURNING id INTO transaction_id;
+
+    RETURN NEXT;
+END;
+$$;
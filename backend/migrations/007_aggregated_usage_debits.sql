@@ -0,0 +1,50 @@
+-- Aggregated usage debits. With USAGE_DEBIT_WINDOW_SECONDS set, every usage
+-- charge for the same user, model and time window is added to one
+-- credit_transactions row (keyed by aggregation_key) instead of inserting a
+-- row per request; per-request detail stays in usage_logs. Balances are
+-- still decremented per request.
+
+ALTER TABLE credit_transactions
+    ADD COLUMN IF NOT EXISTS aggregation_key TEXT,
+    ADD COLUMN IF NOT EXISTS request_count INTEGER NOT NULL DEFAULT 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_credit_transactions_aggregation
+    ON credit_transactions (user_id, aggregation_key)
+    WHERE aggregation_key IS NOT NULL;
+
+-- Replaces the 4-argument version from 006 (an overload with an extra
+-- defaulted argument would make 4-argument calls ambiguous).
+DROP FUNCTION IF EXISTS apply_credit_change(UUID, NUMERIC, transaction_type, TEXT);
+
+CREATE OR REPLACE FUNCTION apply_credit_change(
+    p_user_id UUID,
+    p_amount NUMERIC,
+    p_type transaction_type,
+    p_description TEXT DEFAULT '',
+    p_aggregation_key TEXT DEFAULT NULL
+)
+RETURNS TABLE (balance NUMERIC, transaction_id UUID)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_amount NUMERIC(12, 6) := p_amount;
+BEGIN
+    INSERT INTO credits AS c (user_id, balance)
+    VALUES (p_user_id, v_amount)
+    ON CONFLICT (user_id) DO UPDATE
+        SET balance = c.balance + EXCLUDED.balance,
+            updated_at = now()
+    RETURNING c.balance INTO balance;
+
+    -- A NULL aggregation_key never conflicts, so un-aggregated changes
+    -- always insert their own row.
+    INSERT INTO credit_transactions AS t (user_id, amount, type, description, aggregation_key)
+    VALUES (p_user_id, v_amount, p_type, p_description, p_aggregation_key)
+    ON CONFLICT (user_id, aggregation_key) WHERE aggregation_key IS NOT NULL DO UPDATE
+        SET amount = t.amount + EXCLUDED.amount,
+            request_count = t.request_count + 1
+    RETURNING id INTO transaction_id;
+
+    RETURN NEXT;
+END;
+$$;
@@ -0,0 +1,78 @@
+-- Idempotent replay of the local billing/usage outbox. Each event carries a
+-- UUID; replaying it a second time (crash between the database write and
+-- the local delete, or a timed-out call that actually committed) must not
+-- charge twice or log twice.
+
+-- usage_logs: one row per event. Existing rows keep a NULL event_id, which
+-- never conflicts.
+ALTER TABLE usage_logs ADD COLUMN IF NOT EXISTS event_id UUID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_usage_logs_event_id ON usage_logs (event_id);
+
+-- Credit changes that were made under an event id, with the ledger row they
+-- landed in (aggregated debits share one). Rows older than any outbox could
+-- still hold can be pruned.
+CREATE TABLE IF NOT EXISTS applied_credit_events (
+    event_id UUID PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    credit_transaction_id UUID,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_applied_credit_events_applied_at ON applied_credit_events (applied_at);
+
+-- Replaces the 5-argument version from 007 (see the note there on overloads).
+DROP FUNCTION IF EXISTS apply_credit_change(UUID, NUMERIC, transaction_type, TEXT, TEXT);
+
+CREATE OR REPLACE FUNCTION apply_credit_change(
+    p_user_id UUID,
+    p_amount NUMERIC,
+    p_type transaction_type,
+    p_description TEXT DEFAULT '',
+    p_aggregation_key TEXT DEFAULT NULL,
+    p_event_id UUID DEFAULT NULL
+)
+RETURNS TABLE (balance NUMERIC, transaction_id UUID)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_amount NUMERIC(12, 6) := p_amount;
+BEGIN
+    IF p_event_id IS NOT NULL THEN
+        -- A concurrent replay of the same event waits on this row's lock,
+        -- then sees the conflict.
+        INSERT INTO applied_credit_events (event_id, user_id)
+        VALUES (p_event_id, p_user_id)
+        ON CONFLICT (event_id) DO NOTHING;
+
+        IF NOT FOUND THEN
+            SELECT c.balance INTO balance FROM credits c WHERE c.user_id = p_user_id;
+            SELECT e.credit_transaction_id INTO transaction_id
+            FROM applied_credit_events e WHERE e.event_id = p_event_id;
+            RETURN NEXT;
+            RETURN;
+        END IF;
+    END IF;
+
+    INSERT INTO credits AS c (user_id, balance)
+    VALUES (p_user_id, v_amount)
+    ON CONFLICT (user_id) DO UPDATE
+        SET balance = c.balance + EXCLUDED.balance,
+            updated_at = now()
+    RETURNING c.balance INTO balance;
+
+    INSERT INTO credit_transactions AS t (user_id, amount, type, description, aggregation_key)
+    VALUES (p_user_id, v_amount, p_type, p_description, p_aggregation_key)
+    ON CONFLICT (user_id, aggregation_key) WHERE aggregation_key IS NOT NULL DO UPDATE
+        SET amount = t.amount + EXCLUDED.amount,
+            request_count = t.request_count + 1
+    RETURNING id INTO transaction_id;
+
+    IF p_event_id IS NOT NULL THEN
+        UPDATE applied_credit_events e
+        SET credit_transaction_id = transaction_id
+        WHERE e.event_id = p_event_id;
+    END IF;
+
+    RETURN NEXT;
+END;
+$$;
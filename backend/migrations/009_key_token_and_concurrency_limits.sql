@@ -0,0 +1,15 @@
+-- Per-key limits alongside rate_limit_rpm: a tokens-per-minute budget
+-- (prompt + completion) and a cap on simultaneous requests, streams
+-- included. 0 means unlimited.
+
+ALTER TABLE api_keys
+    ADD COLUMN IF NOT EXISTS rate_limit_tpm INTEGER NOT NULL DEFAULT 200000,
+    ADD COLUMN IF NOT EXISTS max_concurrent_requests INTEGER NOT NULL DEFAULT 20;
+
+-- Cached AuthContexts carry the limits, so changing them must evict.
+DROP TRIGGER IF EXISTS trg_api_keys_invalidate ON api_keys;
+CREATE TRIGGER trg_api_keys_invalidate
+    AFTER INSERT OR DELETE
+        OR UPDATE OF is_active, rate_limit_rpm, rate_limit_tpm, max_concurrent_requests, key_hash, user_id
+    ON api_keys
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
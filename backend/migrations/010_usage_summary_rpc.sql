@@ -0,0 +1,64 @@
+-- Usage summary aggregated in the database. The PostgREST path used to
+-- select every usage_logs row for the user and sum them in Python, which
+-- moved megabytes for heavy users and silently stopped at PostgREST's row
+-- cap (so large accounts saw wrong totals). usage_summary() returns the
+-- totals as one row, plus one row per model, provider or API key when
+-- p_group_by is given.
+--
+-- Rows come back with is_total = true for the overall totals (group_key
+-- NULL) and false for each group. p_group_by is one of 'model', 'provider'
+-- or 'api_key'; anything else raises.
+
+CREATE INDEX IF NOT EXISTS idx_usage_logs_user_created ON usage_logs (user_id, created_at);
+
+CREATE OR REPLACE FUNCTION usage_summary(
+    p_user_id UUID,
+    p_start_date TIMESTAMPTZ DEFAULT NULL,
+    p_end_date TIMESTAMPTZ DEFAULT NULL,
+    p_group_by TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    is_total BOOLEAN,
+    group_key TEXT,
+    total_requests BIGINT,
+    total_input_tokens BIGINT,
+    total_output_tokens BIGINT,
+    total_tokens BIGINT,
+    total_provider_cost NUMERIC,
+    total_vuzo_cost NUMERIC
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+BEGIN
+    IF p_group_by IS NOT NULL AND p_group_by NOT IN ('model', 'provider', 'api_key') THEN
+        RAISE EXCEPTION 'usage_summary: unsupported group_by %', p_group_by
+            USING ERRCODE = 'invalid_parameter_value';
+    END IF;
+
+    RETURN QUERY
+    SELECT grouping(l.group_key) = 1,
+           l.group_key,
+           count(*),
+           coalesce(sum(l.input_tokens), 0)::BIGINT,
+           coalesce(sum(l.output_tokens), 0)::BIGINT,
+           coalesce(sum(l.total_tokens), 0)::BIGINT,
+           coalesce(sum(l.provider_cost), 0),
+           coalesce(sum(l.vuzo_cost), 0)
+    FROM (
+        SELECT CASE p_group_by
+                   WHEN 'model' THEN u.model
+                   WHEN 'provider' THEN u.provider
+                   WHEN 'api_key' THEN u.api_key_id::TEXT
+               END AS group_key,
+               u.input_tokens, u.output_tokens, u.total_tokens, u.provider_cost, u.vuzo_cost
+        FROM usage_logs u
+        WHERE u.user_id = p_user_id
+          AND (p_start_date IS NULL OR u.created_at >= p_start_date)
+          AND (p_end_date IS NULL OR u.created_at <= p_end_date)
+    ) l
+    GROUP BY GROUPING SETS ((), (l.group_key))
+    HAVING grouping(l.group_key) = 1 OR p_group_by IS NOT NULL
+    ORDER BY 1 DESC, 8 DESC;
+END;
+$$;
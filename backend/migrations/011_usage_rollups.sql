@@ -0,0 +1,139 @@
+-- Hourly usage rollups. usage_hourly holds one row per (user, API key,
+-- model, provider, UTC hour), kept current by a statement-level trigger on
+-- usage_logs: each batch insert is aggregated once and upserted, so a
+-- batch of N rows touches as many rollup rows as it has distinct hours and
+-- models, not N. Rows skipped by ON CONFLICT (event_id) DO NOTHING never
+-- reach the transition table, so a replayed batch is not counted twice.
+--
+-- usage_series() derives hour/day/week/month buckets in any time zone from
+-- the rollups, so /v1/usage/daily and /v1/usage/timeseries cost
+-- O(buckets) rather than O(requests). Day boundaries of zones with a
+-- non-whole-hour offset (e.g. Asia/Kolkata) fall inside an hour; that hour
+-- is counted in the day it starts in.
+--
+-- Rollups are additive only: deleting usage_logs rows (retention) leaves
+-- them in place.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS usage_hourly (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    hour TIMESTAMPTZ NOT NULL,
+    api_key_id UUID NOT NULL,
+    model TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    request_count BIGINT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    provider_cost NUMERIC(18, 6) NOT NULL DEFAULT 0,
+    vuzo_cost NUMERIC(18, 6) NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, hour, api_key_id, model, provider)
+);
+
+CREATE OR REPLACE FUNCTION roll_up_usage_logs()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO usage_hourly AS h (
+        user_id, hour, api_key_id, model, provider,
+        request_count, input_tokens, output_tokens, total_tokens, provider_cost, vuzo_cost
+    )
+    SELECT n.user_id,
+           date_trunc('hour', n.created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+           n.api_key_id, n.model, n.provider,
+           count(*), sum(n.input_tokens), sum(n.output_tokens), sum(n.total_tokens),
+           sum(n.provider_cost), sum(n.vuzo_cost)
+    FROM new_usage_logs n
+    GROUP BY 1, 2, 3, 4, 5
+    -- A fixed order, so two batches for the same user can't deadlock.
+    ORDER BY 1, 2, 3, 4, 5
+    ON CONFLICT (user_id, hour, api_key_id, model, provider) DO UPDATE
+        SET request_count = h.request_count + EXCLUDED.request_count,
+            input_tokens = h.input_tokens + EXCLUDED.input_tokens,
+            output_tokens = h.output_tokens + EXCLUDED.output_tokens,
+            total_tokens = h.total_tokens + EXCLUDED.total_tokens,
+            provider_cost = h.provider_cost + EXCLUDED.provider_cost,
+            vuzo_cost = h.vuzo_cost + EXCLUDED.vuzo_cost;
+    RETURN NULL;
+END;
+$$;
+
+-- Lock out inserts while the trigger is created and history is backfilled,
+-- so no row is counted by both or by neither.
+LOCK TABLE usage_logs IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_usage_logs_roll_up ON usage_logs;
+CREATE TRIGGER trg_usage_logs_roll_up
+    AFTER INSERT ON usage_logs
+    REFERENCING NEW TABLE AS new_usage_logs
+    FOR EACH STATEMENT EXECUTE FUNCTION roll_up_usage_logs();
+
+TRUNCATE usage_hourly;
+INSERT INTO usage_hourly (
+    user_id, hour, api_key_id, model, provider,
+    request_count, input_tokens, output_tokens, total_tokens, provider_cost, vuzo_cost
+)
+SELECT user_id,
+       date_trunc('hour', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+       api_key_id, model, provider,
+       count(*), sum(input_tokens), sum(output_tokens), sum(total_tokens),
+       sum(provider_cost), sum(vuzo_cost)
+FROM usage_logs
+GROUP BY 1, 2, 3, 4, 5;
+
+-- Buckets of p_bucket ('hour', 'day', 'week' starting Monday, or 'month')
+-- in time zone p_time_zone, labelled by their local start ('YYYY-MM-DD',
+-- or 'YYYY-MM-DDTHH:00' for hours), newest first. p_group_by lists the
+-- dimensions to split each bucket by ('model', 'provider', 'api_key');
+-- the others come back NULL. Range bounds apply to whole hours.
+CREATE OR REPLACE FUNCTION usage_series(
+    p_user_id UUID,
+    p_bucket TEXT DEFAULT 'day',
+    p_time_zone TEXT DEFAULT 'UTC',
+    p_start_date TIMESTAMPTZ DEFAULT NULL,
+    p_end_date TIMESTAMPTZ DEFAULT NULL,
+    p_model TEXT DEFAULT NULL,
+    p_provider TEXT DEFAULT NULL,
+    p_group_by TEXT[] DEFAULT '{}'
+)
+RETURNS TABLE (
+    bucket TEXT,
+    model TEXT,
+    provider TEXT,
+    api_key_id UUID,
+    total_requests BIGINT,
+    total_input_tokens BIGINT,
+    total_output_tokens BIGINT,
+    total_tokens BIGINT,
+    total_provider_cost NUMERIC,
+    total_vuzo_cost NUMERIC
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT to_char(
+               date_trunc(p_bucket, h.hour AT TIME ZONE p_time_zone),
+               CASE WHEN p_bucket = 'hour' THEN 'YYYY-MM-DD"T"HH24:00' ELSE 'YYYY-MM-DD' END
+           ),
+           CASE WHEN 'model' = ANY (p_group_by) THEN h.model END,
+           CASE WHEN 'provider' = ANY (p_group_by) THEN h.provider END,
+           CASE WHEN 'api_key' = ANY (p_group_by) THEN h.api_key_id END,
+           sum(h.request_count)::BIGINT,
+           sum(h.input_tokens)::BIGINT,
+           sum(h.output_tokens)::BIGINT,
+           sum(h.total_tokens)::BIGINT,
+           sum(h.provider_cost),
+           sum(h.vuzo_cost)
+    FROM usage_hourly h
+    WHERE h.user_id = p_user_id
+      AND (p_start_date IS NULL OR h.hour >= date_trunc('hour', p_start_date AT TIME ZONE 'UTC') AT TIME ZONE 'UTC')
+      AND (p_end_date IS NULL OR h.hour <= p_end_date)
+      AND (p_model IS NULL OR h.model = p_model)
+      AND (p_provider IS NULL OR h.provider = p_provider)
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1 DESC, 2, 3, 4;
+$$;
+
+COMMIT;
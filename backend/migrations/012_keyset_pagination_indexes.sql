@@ -0,0 +1,15 @@
+-- Keyset pagination for /v1/usage and /v1/billing/transactions. Pages are
+-- ordered by (created_at DESC, id DESC) and the next page starts strictly
+-- after the last row's (created_at, id), so each page is an index seek
+-- whatever its depth, and rows logged meanwhile don't shift later pages.
+--
+-- The composite indexes make the single-column user_id indexes and the
+-- (user_id, created_at) index from 010 redundant.
+
+CREATE INDEX IF NOT EXISTS idx_usage_logs_user_created_id ON usage_logs (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_credit_transactions_user_created_id
+    ON credit_transactions (user_id, created_at, id);
+
+DROP INDEX IF EXISTS idx_usage_logs_user_created;
+DROP INDEX IF EXISTS idx_usage_logs_user;
+DROP INDEX IF EXISTS idx_credit_transactions_user;
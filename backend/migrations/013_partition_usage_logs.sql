@@ -0,0 +1,185 @@
+-- Monthly range partitioning of usage_logs, with retention and archival.
+--
+-- usage_logs becomes a table partitioned by created_at, one partition per
+-- UTC month named usage_logs_pYYYYMM. Every query filters by user_id and
+-- usage rows are written "now", so inserts only touch the current month's
+-- indexes and date-scoped reads prune to the months in range: latency no
+-- longer grows with total history.
+--
+-- ensure_usage_logs_partitions() creates the months ahead; the app calls it
+-- at startup and hourly. With USAGE_LOG_RETENTION_MONTHS set, the archiver
+-- (app/services/usage_archiver.py) detaches months older than that,
+-- writes each to a compressed Parquet file, records it in
+-- usage_log_archives and drops the table. usage_summary() answers archived
+-- ranges from the usage_hourly rollups, which are never pruned.
+--
+-- Unique constraints on a partitioned table must include the partition key,
+-- so the primary key becomes (id, created_at) and replayed rows conflict on
+-- (event_id, created_at). created_at is stamped before an event is queued,
+-- so a replay carries the same value.
+--
+-- Copies existing rows into the new table under an exclusive lock; on a
+-- large table, run it in a quiet window.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS usage_log_archives (
+    partition_name TEXT PRIMARY KEY,
+    range_start TIMESTAMPTZ NOT NULL,
+    range_end TIMESTAMPTZ NOT NULL,
+    location TEXT NOT NULL,
+    row_count BIGINT NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+LOCK TABLE usage_logs IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE usage_logs RENAME TO usage_logs_unpartitioned;
+ALTER INDEX usage_logs_pkey RENAME TO usage_logs_unpartitioned_pkey;
+
+CREATE TABLE usage_logs (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    api_key_id UUID NOT NULL REFERENCES api_keys(id) ON DELETE CASCADE,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    provider_cost NUMERIC(12, 6) NOT NULL DEFAULT 0.000000,
+    vuzo_cost NUMERIC(12, 6) NOT NULL DEFAULT 0.000000,
+    response_time_ms INTEGER NOT NULL DEFAULT 0,
+    status_code INTEGER NOT NULL DEFAULT 200,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    event_id UUID,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Creates the monthly partitions from p_from's month (default: this month)
+-- through p_months_ahead months from now, skipping months that exist or
+-- were archived. Returns how many it created.
+CREATE OR REPLACE FUNCTION ensure_usage_logs_partitions(
+    p_from TIMESTAMPTZ DEFAULT NULL,
+    p_months_ahead INT DEFAULT 3
+)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_month TIMESTAMP := date_trunc('month', coalesce(p_from, now()) AT TIME ZONE 'UTC');
+    v_last TIMESTAMP := date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => p_months_ahead);
+    v_name TEXT;
+    v_created INT := 0;
+BEGIN
+    WHILE v_month <= v_last LOOP
+        v_name := 'usage_logs_p' || to_char(v_month, 'YYYYMM');
+        IF to_regclass(v_name) IS NULL
+           AND NOT EXISTS (SELECT 1 FROM usage_log_archives a WHERE a.partition_name = v_name) THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF usage_logs FOR VALUES FROM (%L) TO (%L)',
+                v_name,
+                v_month AT TIME ZONE 'UTC',
+                (v_month + INTERVAL '1 month') AT TIME ZONE 'UTC'
+            );
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+SELECT ensure_usage_logs_partitions((SELECT min(created_at) FROM usage_logs_unpartitioned));
+
+-- The rollup trigger isn't on the new table yet, so the copy isn't counted
+-- a second time in usage_hourly.
+INSERT INTO usage_logs (
+    id, user_id, api_key_id, provider, model, input_tokens, output_tokens, total_tokens,
+    provider_cost, vuzo_cost, response_time_ms, status_code, created_at, event_id
+)
+SELECT id, user_id, api_key_id, provider, model, input_tokens, output_tokens, total_tokens,
+       provider_cost, vuzo_cost, response_time_ms, status_code, created_at, event_id
+FROM usage_logs_unpartitioned;
+
+DROP TABLE usage_logs_unpartitioned;
+
+CREATE INDEX idx_usage_logs_user_created_id ON usage_logs (user_id, created_at, id);
+CREATE UNIQUE INDEX idx_usage_logs_event_id ON usage_logs (event_id, created_at);
+
+CREATE TRIGGER trg_usage_logs_roll_up
+    AFTER INSERT ON usage_logs
+    REFERENCING NEW TABLE AS new_usage_logs
+    FOR EACH STATEMENT EXECUTE FUNCTION roll_up_usage_logs();
+
+-- Same result shape as 010. Hours before the end of the newest archived
+-- month come from usage_hourly (whole hours), later ones from usage_logs.
+CREATE OR REPLACE FUNCTION usage_summary(
+    p_user_id UUID,
+    p_start_date TIMESTAMPTZ DEFAULT NULL,
+    p_end_date TIMESTAMPTZ DEFAULT NULL,
+    p_group_by TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    is_total BOOLEAN,
+    group_key TEXT,
+    total_requests BIGINT,
+    total_input_tokens BIGINT,
+    total_output_tokens BIGINT,
+    total_tokens BIGINT,
+    total_provider_cost NUMERIC,
+    total_vuzo_cost NUMERIC
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_archived_until TIMESTAMPTZ := (SELECT coalesce(max(a.range_end), '-infinity') FROM usage_log_archives a);
+BEGIN
+    IF p_group_by IS NOT NULL AND p_group_by NOT IN ('model', 'provider', 'api_key') THEN
+        RAISE EXCEPTION 'usage_summary: unsupported group_by %', p_group_by
+            USING ERRCODE = 'invalid_parameter_value';
+    END IF;
+
+    RETURN QUERY
+    SELECT grouping(l.group_key) = 1,
+           l.group_key,
+           coalesce(sum(l.requests), 0)::BIGINT,
+           coalesce(sum(l.input_tokens), 0)::BIGINT,
+           coalesce(sum(l.output_tokens), 0)::BIGINT,
+           coalesce(sum(l.total_tokens), 0)::BIGINT,
+           coalesce(sum(l.provider_cost), 0),
+           coalesce(sum(l.vuzo_cost), 0)
+    FROM (
+        SELECT CASE p_group_by
+                   WHEN 'model' THEN u.model
+                   WHEN 'provider' THEN u.provider
+                   WHEN 'api_key' THEN u.api_key_id::TEXT
+               END AS group_key,
+               1::BIGINT AS requests,
+               u.input_tokens::BIGINT AS input_tokens, u.output_tokens::BIGINT AS output_tokens,
+               u.total_tokens::BIGINT AS total_tokens, u.provider_cost, u.vuzo_cost
+        FROM usage_logs u
+        WHERE u.user_id = p_user_id
+          AND (p_start_date IS NULL OR u.created_at >= p_start_date)
+          AND (p_end_date IS NULL OR u.created_at <= p_end_date)
+        UNION ALL
+        SELECT CASE p_group_by
+                   WHEN 'model' THEN h.model
+                   WHEN 'provider' THEN h.provider
+                   WHEN 'api_key' THEN h.api_key_id::TEXT
+               END,
+               h.request_count, h.input_tokens, h.output_tokens, h.total_tokens, h.provider_cost, h.vuzo_cost
+        FROM usage_hourly h
+        WHERE h.user_id = p_user_id
+          AND h.hour < v_archived_until
+          AND (p_start_date IS NULL OR h.hour > p_start_date - INTERVAL '1 hour')
+          AND (p_end_date IS NULL OR h.hour <= p_end_date)
+    ) l
+    GROUP BY GROUPING SETS ((), (l.group_key))
+    HAVING grouping(l.group_key) = 1 OR p_group_by IS NOT NULL
+    ORDER BY 1 DESC, 8 DESC;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,7 @@
+-- /v1/usage?model=… and exports filtered by model read one user's rows for
+-- one model in (created_at, id) order. On (user_id, created_at, id) that
+-- means walking past every other model's rows; this index seeks straight
+-- to them, for keyset pages too. Created on the partitioned parent, so
+-- every monthly partition (existing and future) gets its own copy.
+
+CREATE INDEX IF NOT EXISTS idx_usage_logs_user_model_created_id ON usage_logs (user_id, model, created_at, id);
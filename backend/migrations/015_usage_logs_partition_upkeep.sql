@@ -0,0 +1,80 @@
+-- Partition upkeep that works over PostgREST, and a default partition.
+--
+-- Creating a partition requires owning usage_logs, which the service role
+-- doesn't, so without DATABASE_URL ensure_usage_logs_partitions() failed
+-- and no new months were ever created. It is now SECURITY DEFINER (runs as
+-- the migration owner) with a pinned search_path, and only the service
+-- role may call it.
+--
+-- usage_logs_default catches rows for a month whose partition doesn't
+-- exist yet, so a stalled upkeep task degrades to slower inserts instead
+-- of "no partition of relation usage_logs found for row". When the month
+-- is created, its rows move out of the default partition first (a month
+-- can't be attached while the default holds rows for it). Rows for
+-- archived months never reach the database: replay drops them (see
+-- usage_archiver.drop_archived).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS usage_logs_default PARTITION OF usage_logs DEFAULT;
+
+CREATE OR REPLACE FUNCTION ensure_usage_logs_partitions(
+    p_from TIMESTAMPTZ DEFAULT NULL,
+    p_months_ahead INT DEFAULT 3
+)
+RETURNS INT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_month TIMESTAMP := date_trunc('month', coalesce(p_from, now()) AT TIME ZONE 'UTC');
+    v_last TIMESTAMP := date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => p_months_ahead);
+    v_name TEXT;
+    v_start TIMESTAMPTZ;
+    v_end TIMESTAMPTZ;
+    v_created INT := 0;
+BEGIN
+    WHILE v_month <= v_last LOOP
+        v_name := 'usage_logs_p' || to_char(v_month, 'YYYYMM');
+        v_start := v_month AT TIME ZONE 'UTC';
+        v_end := (v_month + INTERVAL '1 month') AT TIME ZONE 'UTC';
+        IF to_regclass(v_name) IS NULL
+           AND NOT EXISTS (SELECT 1 FROM usage_log_archives a WHERE a.partition_name = v_name) THEN
+            EXECUTE format('CREATE TABLE %I (LIKE usage_logs INCLUDING DEFAULTS)', v_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM usage_logs_default WHERE created_at >= %L AND created_at < %L RETURNING *)'
+                ' INSERT INTO %I SELECT * FROM moved',
+                v_start, v_end, v_name
+            );
+            EXECUTE format(
+                'ALTER TABLE usage_logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_start, v_end
+            );
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION ensure_usage_logs_partitions(TIMESTAMPTZ, INT) FROM PUBLIC;
+
+-- Supabase grants functions to anon and authenticated by default; plain
+-- Postgres (local dev, tests) has none of these roles.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+        REVOKE EXECUTE ON FUNCTION ensure_usage_logs_partitions(TIMESTAMPTZ, INT) FROM anon;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'authenticated') THEN
+        REVOKE EXECUTE ON FUNCTION ensure_usage_logs_partitions(TIMESTAMPTZ, INT) FROM authenticated;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'service_role') THEN
+        GRANT EXECUTE ON FUNCTION ensure_usage_logs_partitions(TIMESTAMPTZ, INT) TO service_role;
+    END IF;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,72 @@
+-- Keep per-request balance changes out of cache_invalidation_events, and
+-- prune events only once every polling worker has read them.
+--
+-- Every proxied request updates credits.balance. Logging each update as an
+-- event row doubled write load on the billing path and outran the polling
+-- fallback, whose 10-minute prune then deleted unread events (api_keys and
+-- users revocations among them). Balance updates are now announced with
+-- NOTIFY only: listening workers still reconcile immediately, and polling
+-- workers rely on the ledger sync and the read cache's TTL. Inserts and
+-- deletes of credits rows are rare and still logged.
+--
+-- Polling workers record how far they have read in
+-- cache_invalidation_readers; pruning never deletes past the slowest
+-- reader that reported in the last 10 minutes.
+
+CREATE TABLE IF NOT EXISTS cache_invalidation_readers (
+    reader_id TEXT PRIMARY KEY,
+    last_event_id BIGINT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION notify_cache_invalidation()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rec RECORD;
+    body JSONB;
+    event_id BIGINT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME = 'api_keys' THEN
+        body := jsonb_build_object('id', rec.id, 'user_id', rec.user_id, 'key_hash', rec.key_hash);
+        IF TG_OP = 'UPDATE' AND OLD.key_hash IS DISTINCT FROM NEW.key_hash THEN
+            body := body || jsonb_build_object('old_key_hash', OLD.key_hash);
+        END IF;
+    ELSIF TG_TABLE_NAME = 'users' THEN
+        body := jsonb_build_object('user_id', rec.id, 'supabase_auth_id', rec.supabase_auth_id);
+    ELSIF TG_TABLE_NAME = 'credits' THEN
+        body := jsonb_build_object('user_id', rec.user_id, 'balance', rec.balance);
+    ELSIF TG_TABLE_NAME = 'model_pricing' THEN
+        body := jsonb_build_object('model_name', rec.model_name);
+    ELSIF TG_TABLE_NAME = 'provider_keys' THEN
+        body := jsonb_build_object('provider', rec.provider);
+    ELSE
+        body := '{}'::JSONB;
+    END IF;
+
+    body := body || jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP);
+
+    -- Balance updates: NOTIFY only, without an event id.
+    IF TG_TABLE_NAME = 'credits' AND TG_OP = 'UPDATE' THEN
+        PERFORM pg_notify('vuzo_cache_invalidation', body::TEXT);
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO cache_invalidation_events (table_name, payload)
+    VALUES (TG_TABLE_NAME, body)
+    RETURNING id INTO event_id;
+
+    PERFORM pg_notify(
+        'vuzo_cache_invalidation',
+        (body || jsonb_build_object('event_id', event_id))::TEXT
+    );
+    RETURN NULL;
+END;
+$$;
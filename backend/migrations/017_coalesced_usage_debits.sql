@@ -0,0 +1,72 @@
+-- Apply several queued usage charges for one aggregated debit row at once.
+--
+-- With USAGE_DEBIT_WINDOW_SECONDS set, apply_credit_change() still ran one
+-- UPSERT per request against the same hot (user_id, aggregation_key) row,
+-- which cut the number of rows but not the writes or the row-lock waits.
+-- Outbox replay now sums the charges in a batch that share an aggregation
+-- key and applies them with one call: one credits update, one
+-- credit_transactions upsert and one applied_credit_events insert, however
+-- many requests the batch covers.
+--
+-- Idempotent per event like apply_credit_change(): ids already recorded in
+-- applied_credit_events are skipped, and only the rest are charged.
+
+CREATE OR REPLACE FUNCTION apply_usage_debits(
+    p_user_id UUID,
+    p_description TEXT,
+    p_aggregation_key TEXT,
+    p_event_ids UUID[],
+    p_amounts NUMERIC[]
+)
+RETURNS TABLE (balance NUMERIC, transaction_id UUID)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_new UUID[];
+    v_amount NUMERIC(12, 6);
+    v_count INTEGER;
+BEGIN
+    -- Concurrent replays of the same events wait on these rows' locks,
+    -- then see the conflicts.
+    WITH inserted AS (
+        INSERT INTO applied_credit_events (event_id, user_id)
+        SELECT e.id, p_user_id FROM unnest(p_event_ids) AS e(id)
+        ON CONFLICT (event_id) DO NOTHING
+        RETURNING event_id
+    )
+    SELECT array_agg(i.event_id) INTO v_new FROM inserted i;
+
+    IF v_new IS NULL THEN
+        SELECT c.balance INTO balance FROM credits c WHERE c.user_id = p_user_id;
+        SELECT t.id INTO transaction_id
+        FROM credit_transactions t
+        WHERE t.user_id = p_user_id AND t.aggregation_key = p_aggregation_key;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    SELECT sum(d.amount), count(*) INTO v_amount, v_count
+    FROM unnest(p_event_ids, p_amounts) AS d(id, amount)
+    WHERE d.id = ANY (v_new);
+
+    INSERT INTO credits AS c (user_id, balance)
+    VALUES (p_user_id, v_amount)
+    ON CONFLICT (user_id) DO UPDATE
+        SET balance = c.balance + EXCLUDED.balance,
+            updated_at = now()
+    RETURNING c.balance INTO balance;
+
+    INSERT INTO credit_transactions AS t (user_id, amount, type, description, aggregation_key, request_count)
+    VALUES (p_user_id, v_amount, 'usage', p_description, p_aggregation_key, v_count)
+    ON CONFLICT (user_id, aggregation_key) WHERE aggregation_key IS NOT NULL DO UPDATE
+        SET amount = t.amount + EXCLUDED.amount,
+            request_count = t.request_count + EXCLUDED.request_count
+    RETURNING id INTO transaction_id;
+
+    UPDATE applied_credit_events e
+    SET credit_transaction_id = transaction_id
+    WHERE e.event_id = ANY (v_new);
+
+    RETURN NEXT;
+END;
+$$;
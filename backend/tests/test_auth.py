@@ -0,0 +1,178 @@
+"""Tests for Vuzo API key validation (app/middleware/auth.py)."""
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.middleware import auth
+from app.middleware.auth import validate_api_key, invalidate_api_key, invalidate_user
+from app.utils.crypto import hash_api_key
+
+KEY = "vz-sk_aabbccdd11223344556677889900aabbccddeeff0011"
+
+
+@pytest.fixture(autouse=True)
+def _clear_auth_caches():
+    auth._auth_cache.clear()
+    auth._negative_cache.clear()
+    yield
+    auth._auth_cache.clear()
+    auth._negative_cache.clear()
+
+
+def _creds(token: str = KEY) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def _key_row(is_active: bool = True, user_active: bool = True) -> dict:
+    return {
+        "id": "key-1",
+        "user_id": "user-1",
+        "is_active": is_active,
+        "rate_limit_rpm": 120,
+        "rate_limit_tpm": 50_000,
+        "max_concurrent_requests": 5,
+        "users": {"is_active": user_active},
+    }
+
+
+def _mock_supabase(rows: list[dict]) -> MagicMock:
+    """Return a mock Supabase client whose key_hash lookup yields `rows`."""
+    mock_sb = MagicMock()
+    lookup = mock_sb.table.return_value.select.return_value.eq.return_value.limit.return_value
+    lookup.execute.return_value = MagicMock(data=rows)
+    return mock_sb
+
+
+def _validate(token: str = KEY):
+    return asyncio.run(validate_api_key(_creds(token)))
+
+
+class TestValidateApiKey:
+    def test_valid_key_returns_auth_context(self):
+        mock_sb = _mock_supabase([_key_row()])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            ctx = _validate()
+        assert ctx.user_id == "user-1"
+        assert ctx.api_key_id == "key-1"
+        assert ctx.rate_limit_rpm == 120
+        assert (ctx.rate_limit_tpm, ctx.max_concurrent_requests) == (50_000, 5)
+
+    def test_lookup_is_by_full_key_hash(self):
+        mock_sb = _mock_supabase([_key_row()])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            _validate()
+        mock_sb.table.return_value.select.return_value.eq.assert_called_once_with(
+            "key_hash", hash_api_key(KEY)
+        )
+
+    def test_user_status_embedded_in_key_query(self):
+        mock_sb = _mock_supabase([_key_row()])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            _validate()
+        columns = mock_sb.table.return_value.select.call_args.args[0]
+        assert "users!inner(is_active)" in columns
+        assert "users" not in [c.args[0] for c in mock_sb.table.call_args_list]
+
+    def test_bad_format_rejected_without_db(self):
+        with patch("app.models.repository.get_supabase") as mock_get:
+            with pytest.raises(HTTPException) as exc:
+                _validate("sk-openai-key")
+        assert exc.value.status_code == 401
+        mock_get.assert_not_called()
+
+    def test_unknown_key_is_401(self):
+        mock_sb = _mock_supabase([])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            with pytest.raises(HTTPException) as exc:
+                _validate()
+        assert exc.value.status_code == 401
+
+    def test_revoked_key_is_403(self):
+        mock_sb = _mock_supabase([_key_row(is_active=False)])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            with pytest.raises(HTTPException) as exc:
+                _validate()
+        assert exc.value.status_code == 403
+        assert "revoked" in exc.value.detail
+
+    def test_inactive_user_is_403(self):
+        mock_sb = _mock_supabase([_key_row(user_active=False)])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            with pytest.raises(HTTPException) as exc:
+                _validate()
+        assert exc.value.status_code == 403
+        assert "inactive" in exc.value.detail
+
+
+class TestAuthCache:
+    def test_second_call_served_from_cache(self):
+        mock_sb = _mock_supabase([_key_row()])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb) as mock_get:
+            first = _validate()
+            second = _validate()
+        assert first == second
+        assert mock_get.call_count == 1
+
+    def test_invalid_key_negatively_cached(self):
+        mock_sb = _mock_supabase([])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb) as mock_get:
+            for _ in range(5):
+                with pytest.raises(HTTPException) as exc:
+                    _validate()
+                assert exc.value.status_code == 401
+        assert mock_get.call_count == 1
+
+    def test_invalidate_api_key_forces_lookup(self):
+        mock_sb = _mock_supabase([_key_row()])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb) as mock_get:
+            _validate()
+            invalidate_api_key(hash_api_key(KEY))
+            mock_sb.table.return_value.select.return_value.eq.return_value.limit.return_value \
+                .execute.return_value = MagicMock(data=[_key_row(is_active=False)])
+            with pytest.raises(HTTPException) as exc:
+                _validate()
+        assert exc.value.status_code == 403
+        assert mock_get.call_count == 2
+
+    def test_invalidate_user_evicts_their_keys(self):
+        mock_sb = _mock_supabase([_key_row()])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            _validate()
+        assert invalidate_user("user-1") == 1
+        assert invalidate_user("user-1") == 0
+
+    def test_revoke_api_key_evicts_cached_context(self):
+        from app.services.key_service import revoke_api_key
+
+        mock_sb = _mock_supabase([_key_row()])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            _validate()
+        assert len(auth._auth_cache) == 1
+
+        revoke_sb = MagicMock()
+        revoke_sb.table.return_value.update.return_value.eq.return_value.eq.return_value \
+            .execute.return_value = MagicMock(data=[{"id": "key-1", "key_hash": hash_api_key(KEY)}])
+        with patch("app.models.repository.get_supabase", return_value=revoke_sb):
+            assert asyncio.run(revoke_api_key("user-1", "key-1")) is True
+        assert len(auth._auth_cache) == 0
+
+    def test_stats_count_hits_and_misses(self):
+        mock_sb = _mock_supabase([_key_row()])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            _validate()
+            _validate()
+        stats = auth.get_auth_cache_stats()["keys"]
+        assert stats["hits"] >= 1
+        assert stats["misses"] >= 1
+
+    def test_last_used_buffered_instead_of_written(self):
+        mock_sb = _mock_supabase([_key_row()])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb), \
+                patch("app.middleware.auth.last_used_recorder") as recorder:
+            _validate()
+            _validate()
+        assert recorder.record.call_count == 2
+        recorder.record.assert_called_with("key-1")
+        mock_sb.table.return_value.update.assert_not_called()
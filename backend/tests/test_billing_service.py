@@ -0,0 +1,187 @@
+"""Tests for credit deduction and top-up (app/services/billing_service.py)."""
+import asyncio
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.models import database
+from app.models.repository import get_repository, supabase_repository
+from app.services.billing_service import add_credits, deduct_credits, get_balance, usage_debit
+
+
+class TestCreditChanges:
+    def test_deduct_is_one_signed_credit_change(self):
+        repo = MagicMock(apply_credit_change=AsyncMock(return_value=(9.5, "tx-1")))
+        with patch("app.services.billing_service.get_repository", return_value=repo):
+            assert asyncio.run(deduct_credits("user-1", 0.5, "gpt-4o")) == 9.5
+        repo.apply_credit_change.assert_awaited_once_with("user-1", -0.5, "usage", "gpt-4o", None)
+        repo.get_balance.assert_not_called()
+
+    def test_add_returns_balance_and_transaction(self):
+        repo = MagicMock(apply_credit_change=AsyncMock(return_value=(10.0, "tx-2")))
+        with patch("app.services.billing_service.get_repository", return_value=repo):
+            assert asyncio.run(add_credits("user-1", 10.0)) == (10.0, "tx-2")
+        repo.apply_credit_change.assert_awaited_once_with("user-1", 10.0, "topup", "Credit top-up")
+
+    def test_supabase_path_is_a_single_rpc(self):
+        mock_sb = MagicMock()
+        mock_sb.rpc.return_value.execute.return_value = MagicMock(
+            data=[{"balance": 4.75, "transaction_id": "tx-3"}]
+        )
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            result = asyncio.run(supabase_repository.apply_credit_change("user-1", -0.25, "usage", "x"))
+        assert result == (4.75, "tx-3")
+        mock_sb.rpc.assert_called_once_with("apply_credit_change", {
+            "p_user_id": "user-1", "p_amount": -0.25, "p_type": "usage", "p_description": "x",
+            "p_aggregation_key": None, "p_event_id": None,
+        })
+        mock_sb.table.assert_not_called()
+
+
+class TestUsageDebit:
+    def test_per_request_rows_by_default(self):
+        with patch("app.services.billing_service.get_settings") as settings:
+            settings.return_value.usage_debit_window_seconds = 0
+            assert usage_debit("gpt-4o", "gpt-4o: 10in + 5out tokens") == ("gpt-4o: 10in + 5out tokens", None)
+
+    def test_same_window_shares_a_key(self):
+        with patch("app.services.billing_service.get_settings") as settings, \
+                patch("app.services.billing_service.time.time", side_effect=[1_800_000_010, 1_800_000_050, 1_800_000_070]):
+            settings.return_value.usage_debit_window_seconds = 60
+            first = usage_debit("gpt-4o", "a")
+            second = usage_debit("gpt-4o", "b")
+            third = usage_debit("gpt-4o", "c")
+        assert first == second
+        assert first == ("gpt-4o: usage from 2027-01-15 08:00:00 UTC (60s window)", "gpt-4o@1800000000/60")
+        assert third[1] == "gpt-4o@1800000060/60"
+
+    def test_models_are_kept_apart(self):
+        with patch("app.services.billing_service.get_settings") as settings:
+            settings.return_value.usage_debit_window_seconds = 60
+            assert usage_debit("gpt-4o", "x")[1] != usage_debit("gpt-4o-mini", "x")[1]
+
+
+class TestConcurrentDeductions:
+    """Stress test against a local Postgres (TEST_DATABASE_URL)."""
+
+    DEDUCTIONS = 500
+    AMOUNT = 0.001234
+
+    def test_no_drift_under_simultaneous_deductions(self, pg_dsn):
+        auth_id = str(uuid.uuid4())
+
+        async def scenario():
+            pool = await database.init_pg_pool(pg_dsn, min_size=20, max_size=20)
+            try:
+                user_id = str(await pool.fetchval(
+                    "INSERT INTO users (supabase_auth_id, email) VALUES ($1, $2) RETURNING id",
+                    auth_id, f"{auth_id}@example.com",
+                ))
+                await add_credits(user_id, 10.0)
+                await asyncio.gather(*(
+                    deduct_credits(user_id, self.AMOUNT, f"stress {i}") for i in range(self.DEDUCTIONS)
+                ))
+                ledger = await pool.fetchrow(
+                    "SELECT count(*) AS n, sum(amount) AS total FROM credit_transactions WHERE user_id = $1",
+                    user_id,
+                )
+                return await get_balance(user_id), ledger
+            finally:
+                await database.close_pg_pool()
+
+        balance, ledger = asyncio.run(scenario())
+        assert balance == pytest.approx(10.0 - self.DEDUCTIONS * self.AMOUNT, abs=1e-9)
+        assert ledger["n"] == self.DEDUCTIONS + 1
+        assert float(ledger["total"]) == pytest.approx(balance, abs=1e-9)
+
+    def test_aggregated_debits_share_one_row(self, pg_dsn):
+        auth_id = str(uuid.uuid4())
+
+        async def scenario():
+            pool = await database.init_pg_pool(pg_dsn, min_size=10, max_size=10)
+            try:
+                user_id = str(await pool.fetchval(
+                    "INSERT INTO users (supabase_auth_id, email) VALUES ($1, $2) RETURNING id",
+                    auth_id, f"{auth_id}@example.com",
+                ))
+                await add_credits(user_id, 10.0)
+                await asyncio.gather(*(
+                    deduct_credits(user_id, self.AMOUNT, "gpt-4o window", "gpt-4o@0/60") for _ in range(50)
+                ))
+                rows = await pool.fetch(
+                    "SELECT amount, request_count FROM credit_transactions"
+                    " WHERE user_id = $1 AND type = 'usage'",
+                    user_id,
+                )
+                return await get_balance(user_id), rows
+            finally:
+                await database.close_pg_pool()
+
+        balance, rows = asyncio.run(scenario())
+        assert len(rows) == 1
+        assert rows[0]["request_count"] == 50
+        assert float(rows[0]["amount"]) == pytest.approx(-50 * self.AMOUNT, abs=1e-9)
+        assert balance == pytest.approx(10.0 - 50 * self.AMOUNT, abs=1e-9)
+
+    def test_replayed_event_applied_once(self, pg_dsn):
+        auth_id = str(uuid.uuid4())
+        event_id = str(uuid.uuid4())
+
+        async def scenario():
+            pool = await database.init_pg_pool(pg_dsn, min_size=5, max_size=5)
+            try:
+                user_id = str(await pool.fetchval(
+                    "INSERT INTO users (supabase_auth_id, email) VALUES ($1, $2) RETURNING id",
+                    auth_id, f"{auth_id}@example.com",
+                ))
+                await add_credits(user_id, 10.0)
+                results = await asyncio.gather(*(
+                    get_repository().apply_credit_change(user_id, -self.AMOUNT, "usage", "replay", None, event_id)
+                    for _ in range(5)
+                ))
+                count = await pool.fetchval(
+                    "SELECT count(*) FROM credit_transactions WHERE user_id = $1 AND type = 'usage'", user_id,
+                )
+                return results, count
+            finally:
+                await database.close_pg_pool()
+
+        results, count = asyncio.run(scenario())
+        assert count == 1
+        assert {tx_id for _, tx_id in results} != {None}
+        assert len({tx_id for _, tx_id in results}) == 1
+        assert all(balance == pytest.approx(10.0 - self.AMOUNT, abs=1e-9) for balance, _ in results)
+
+    def test_coalesced_debits_skip_applied_events(self, pg_dsn):
+        auth_id = str(uuid.uuid4())
+        event_ids = [str(uuid.uuid4()) for _ in range(3)]
+
+        async def scenario():
+            pool = await database.init_pg_pool(pg_dsn, min_size=2, max_size=2)
+            try:
+                user_id = str(await pool.fetchval(
+                    "INSERT INTO users (supabase_auth_id, email) VALUES ($1, $2) RETURNING id",
+                    auth_id, f"{auth_id}@example.com",
+                ))
+                await add_credits(user_id, 10.0)
+                repo = get_repository()
+                await repo.apply_usage_debits(
+                    user_id, "gpt-4o window", "gpt-4o@0/60", event_ids[:2], [-self.AMOUNT] * 2
+                )
+                # A replay of the same pass that also carries one new event.
+                balance, _ = await repo.apply_usage_debits(
+                    user_id, "gpt-4o window", "gpt-4o@0/60", event_ids, [-self.AMOUNT] * 3
+                )
+                row = await pool.fetchrow(
+                    "SELECT amount, request_count FROM credit_transactions"
+                    " WHERE user_id = $1 AND type = 'usage'",
+                    user_id,
+                )
+                return balance, row
+            finally:
+                await database.close_pg_pool()
+
+        balance, row = asyncio.run(scenario())
+        assert row["request_count"] == 3
+        assert float(row["amount"]) == pytest.approx(-3 * self.AMOUNT, abs=1e-9)
+        assert balance == pytest.approx(10.0 - 3 * self.AMOUNT, abs=1e-9)
@@ -0,0 +1,78 @@
+"""Tests for the in-process TTL/LRU cache (app/utils/cache.py)."""
+import time
+import pytest
+from unittest.mock import patch
+
+from app.utils.cache import TTLCache
+
+
+def test_get_returns_stored_value():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+
+def test_missing_key_returns_default():
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.get("nope") is None
+    assert cache.get("nope", "fallback") == "fallback"
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(maxsize=10, ttl=5)
+    with patch("app.utils.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("app.utils.cache.time.monotonic", return_value=104.9):
+        assert cache.get("a") == 1
+    with patch("app.utils.cache.time.monotonic", return_value=105.1):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl_override():
+    cache = TTLCache(maxsize=10, ttl=5)
+    with patch("app.utils.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1, ttl=1000)
+    with patch("app.utils.cache.time.monotonic", return_value=500.0):
+        assert cache.get("a") == 1
+
+
+def test_lru_eviction_when_full():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")          # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_pop_and_pop_where():
+    cache = TTLCache(maxsize=10, ttl=60)
+    for i in range(5):
+        cache.set(i, i % 2)
+    assert cache.pop(0) is True
+    assert cache.pop(0) is False
+    assert cache.pop_where(lambda k, v: v == 1) == 2
+    assert len(cache) == 2
+
+
+def test_peek_does_not_count():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    assert cache.peek("a") == 1
+    assert cache.hits == 0 and cache.misses == 0
+
+
+def test_stats_hit_rate():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == pytest.approx(0.6667, abs=1e-4)
@@ -0,0 +1,252 @@
+"""Tests for the in-memory credit ledger (app/services/credit_ledger.py)."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+
+from app.models.schemas import AuthContext, ChatCompletionRequest, ChatMessage
+from app.services import credit_ledger as ledger_module
+from app.services.credit_ledger import CreditLedger, estimate_max_cost
+from app.services.key_limits import KeyLimiter
+
+PRICING = {
+    "provider": "openai",
+    "input_price_per_million": 2.0,
+    "output_price_per_million": 10.0,
+    "vuzo_markup_percent": 20.0,
+}
+
+
+def _repo(balance: float | None = 10.0) -> MagicMock:
+    repo = MagicMock()
+    repo.get_balance = AsyncMock(return_value=balance)
+    repo.create_credits = AsyncMock()
+    repo.get_balances = AsyncMock(return_value={})
+    repo.apply_credit_change = AsyncMock(side_effect=lambda user_id, amount, *_: (balance + amount, "tx"))
+    return repo
+
+
+def _run(coro_fn, repo):
+    with patch("app.services.credit_ledger.get_repository", return_value=repo):
+        return asyncio.run(coro_fn())
+
+
+class TestEstimate:
+    def test_uses_max_tokens_at_output_price(self):
+        request = ChatCompletionRequest(model="gpt-4o", messages=[ChatMessage(role="user", content="hi")], max_tokens=1000)
+        # ~4 prompt tokens @ $2/M + 1000 @ $10/M = ~$0.010008, +20%
+        assert estimate_max_cost(request, PRICING) == pytest.approx(0.01201, abs=1e-4)
+
+    def test_default_budget_without_max_tokens(self):
+        request = ChatCompletionRequest(model="gpt-4o", messages=[ChatMessage(role="user", content="hi")])
+        assert estimate_max_cost(request, PRICING) > 0.04
+
+    def test_floor(self):
+        free = {**PRICING, "input_price_per_million": 0, "output_price_per_million": 0}
+        request = ChatCompletionRequest(model="m", messages=[ChatMessage(role="user", content="hi")])
+        assert estimate_max_cost(request, free) == 0.001
+
+
+class TestReservations:
+    def test_admission_bounded_by_balance(self):
+        ledger, repo = CreditLedger(), _repo(balance=10.0)
+
+        async def scenario():
+            results = await asyncio.gather(
+                *(ledger.reserve("user-1", 1.0) for _ in range(50)), return_exceptions=True
+            )
+            return [r for r in results if not isinstance(r, Exception)], results
+
+        admitted, results = _run(scenario, repo)
+        assert len(admitted) == 10
+        assert all(r.status_code == 402 for r in results if isinstance(r, HTTPException))
+        repo.get_balance.assert_awaited_once_with("user-1")
+
+    def test_release_frees_the_hold(self):
+        ledger, repo = CreditLedger(), _repo(balance=1.0)
+
+        async def scenario():
+            first = await ledger.reserve("user-1", 1.0)
+            with pytest.raises(HTTPException):
+                await ledger.reserve("user-1", 0.5)
+            ledger.release(first)
+            ledger.release(first)
+            return await ledger.reserve("user-1", 0.5)
+
+        assert _run(scenario, repo).amount == 0.5
+        assert ledger.stats()["released"] == 1
+
+    def test_missing_credits_row_created(self):
+        ledger, repo = CreditLedger(), _repo(balance=None)
+
+        async def scenario():
+            with pytest.raises(HTTPException) as exc:
+                await ledger.reserve("user-1", 0.001)
+            return exc.value
+
+        assert _run(scenario, repo).status_code == 402
+        repo.create_credits.assert_awaited_once_with("user-1")
+
+
+class TestSettlement:
+    def test_settle_charges_actual_cost_atomically(self):
+        ledger, repo = CreditLedger(), _repo(balance=10.0)
+
+        async def scenario():
+            reservation = await ledger.reserve("user-1", 2.0)
+            new_balance = await ledger.settle(reservation, 0.25, "gpt-4o")
+            return new_balance, ledger.stats()
+
+        new_balance, stats = _run(scenario, repo)
+        assert new_balance == 9.75
+        repo.apply_credit_change.assert_awaited_once_with("user-1", -0.25, "usage", "gpt-4o", None)
+        assert stats["open_reservations"] == 0
+        assert stats["settled"] == 1
+
+    def test_failed_charge_restores_balance(self):
+        ledger, repo = CreditLedger(), _repo(balance=1.0)
+        repo.apply_credit_change.side_effect = RuntimeError("db down")
+
+        async def scenario():
+            reservation = await ledger.reserve("user-1", 1.0)
+            with pytest.raises(RuntimeError):
+                await ledger.settle(reservation, 0.5, "x")
+            return await ledger.reserve("user-1", 1.0)
+
+        assert _run(scenario, repo).amount == 1.0
+
+    def test_underestimate_counted(self):
+        ledger, repo = CreditLedger(), _repo(balance=10.0)
+
+        async def scenario():
+            await ledger.settle(await ledger.reserve("user-1", 0.1), 0.3, "x")
+
+        _run(scenario, repo)
+        assert ledger.stats()["underestimated"] == 1
+
+
+class TestReconciliation:
+    def test_observed_balance_discounts_charges_in_flight(self):
+        ledger, repo = CreditLedger(), _repo(balance=10.0)
+
+        async def scenario():
+            release = asyncio.Event()
+
+            async def slow_charge(user_id, amount, *_):
+                await release.wait()
+                return 10.0 + amount, "tx"
+
+            repo.apply_credit_change.side_effect = slow_charge
+            reservation = await ledger.reserve("user-1", 1.0)
+            settle = asyncio.create_task(ledger.settle(reservation, 1.0, "x"))
+            await asyncio.sleep(0)
+            ledger.observe_balance("user-1", 10.0)  # committed before our charge
+            available = ledger._accounts["user-1"].balance
+            release.set()
+            await settle
+            return available, ledger._accounts["user-1"].balance
+
+        assert _run(scenario, repo) == (9.0, 9.0)
+
+    def test_topup_event_applied(self):
+        from app.services.invalidation import HANDLERS
+
+        ledger, repo = CreditLedger(), _repo(balance=0.0)
+
+        async def scenario():
+            with pytest.raises(HTTPException):
+                await ledger.reserve("user-1", 1.0)
+            for handler in HANDLERS["credits"]:
+                handler({"table": "credits", "op": "UPDATE", "user_id": "user-1", "balance": "25.0"})
+            return await ledger.reserve("user-1", 1.0)
+
+        with patch("app.services.invalidation.credit_ledger", ledger):
+            assert _run(scenario, repo).amount == 1.0
+
+    def test_sync_reloads_and_expires(self):
+        ledger, repo = CreditLedger(), _repo(balance=5.0)
+        repo.get_balances.return_value = {"user-1": 7.0}
+
+        async def scenario():
+            await ledger.reserve("user-1", 1.0)
+            with patch.object(ledger_module, "_RESERVATION_TTL_SECONDS", -1):
+                await ledger.sync()
+            return ledger.stats(), ledger._accounts["user-1"].balance
+
+        stats, balance = _run(scenario, repo)
+        assert balance == 7.0
+        assert stats["expired"] == 1
+        assert stats["open_reservations"] == 0
+        repo.get_balances.assert_awaited_once_with(["user-1"])
+
+    def test_sync_drops_idle_accounts(self):
+        ledger, repo = CreditLedger(), _repo(balance=5.0)
+
+        async def scenario():
+            ledger.release(await ledger.reserve("user-1", 1.0))
+            with patch.object(ledger_module, "_IDLE_ACCOUNT_SECONDS", -1):
+                await ledger.sync()
+
+        _run(scenario, repo)
+        assert ledger.stats()["accounts"] == 0
+        repo.get_balances.assert_not_called()
+
+
+class TestProxyStream:
+    def test_abandoned_stream_releases_hold(self):
+        from app.routers.proxy import _stream_response
+
+        ledger, repo = CreditLedger(), _repo(balance=1.0)
+
+        class FailingProvider:
+            async def chat_completion_stream(self, request, key):
+                yield "data: {}\n\n", None
+                raise RuntimeError("upstream reset")
+
+        request = ChatCompletionRequest(model="gpt-4o", messages=[ChatMessage(role="user", content="hi")])
+        auth = AuthContext(user_id="user-1", api_key_id="key-1", rate_limit_rpm=60, max_concurrent_requests=1)
+        limiter = KeyLimiter()
+
+        async def scenario():
+            reservation = await ledger.reserve("user-1", 1.0)
+            lease = limiter.acquire(auth, 10)
+            with pytest.raises(RuntimeError):
+                async for _ in _stream_response(request, FailingProvider(), "k", PRICING, auth, reservation, lease):
+                    pass
+            return ledger.stats()
+
+        with patch("app.routers.proxy.credit_ledger", ledger), patch("app.routers.proxy.key_limiter", limiter):
+            stats = _run(scenario, repo)
+        assert stats["open_reservations"] == 0
+        assert limiter.stats()["in_flight"] == 0
+        repo.apply_credit_change.assert_not_called()
+
+    def test_stream_never_started_releases_hold(self):
+        from app.routers.proxy import _HeldStreamingResponse
+
+        ledger, repo = CreditLedger(), _repo(balance=1.0)
+        auth = AuthContext(user_id="user-1", api_key_id="key-1", rate_limit_rpm=60, max_concurrent_requests=1)
+        limiter = KeyLimiter()
+        started = []
+
+        async def body():
+            started.append(True)
+            yield "data: {}\n\n"
+
+        async def send(message):
+            raise OSError("client went away")  # before the first byte
+
+        async def scenario():
+            reservation = await ledger.reserve("user-1", 1.0)
+            lease = limiter.acquire(auth, 10)
+            response = _HeldStreamingResponse(body(), reservation, lease, media_type="text/event-stream")
+            with pytest.raises(ClientDisconnect):
+                await response({"type": "http", "asgi": {"spec_version": "2.4"}}, AsyncMock(), send)
+            return ledger.stats()
+
+        with patch("app.routers.proxy.credit_ledger", ledger), patch("app.routers.proxy.key_limiter", limiter):
+            stats = _run(scenario, repo)
+        assert started == []
+        assert stats["open_reservations"] == 0
+        assert limiter.stats()["in_flight"] == 0
@@ -0,0 +1,70 @@
+"""Tests for the dashboard overview (app/services/dashboard_service.py)."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+
+from app.services.dashboard_service import OVERVIEW_FIELDS, get_overview, parse_fields
+
+
+def test_parse_fields_defaults_to_everything():
+    assert parse_fields(None) == list(OVERVIEW_FIELDS)
+    assert parse_fields(" , ") == list(OVERVIEW_FIELDS)
+
+
+def test_parse_fields_keeps_order_and_drops_duplicates():
+    assert parse_fields("summary, balance,summary") == ["summary", "balance"]
+
+
+def test_parse_fields_rejects_unknown():
+    with pytest.raises(HTTPException) as exc:
+        parse_fields("balance,credits")
+    assert exc.value.status_code == 400
+    assert "credits" in exc.value.detail
+
+
+def test_sections_load_concurrently():
+    started = []
+
+    def waiting(name, value):
+        async def load(*args, **kwargs):
+            started.append(name)
+            while len(started) < len(OVERVIEW_FIELDS):  # every loader must be in flight at once
+                await asyncio.sleep(0)
+            return value
+        return load
+
+    with patch.multiple(
+        "app.services.dashboard_service",
+        get_balance=waiting("balance", 12.5),
+        get_usage_summary=waiting("summary", {"total_requests": 3}),
+        get_daily_usage=waiting("daily", [{"date": "2026-03-01"}]),
+        list_api_keys=waiting("api_keys", [{"id": "k1"}]),
+        get_transactions=waiting("transactions", ([{"id": "t1"}], "cursor")),
+    ):
+        overview = asyncio.run(asyncio.wait_for(get_overview("user-1", list(OVERVIEW_FIELDS)), 1))
+    assert overview == {
+        "balance": 12.5,
+        "summary": {"total_requests": 3},
+        "daily": [{"date": "2026-03-01"}],
+        "api_keys": [{"id": "k1"}],
+        "transactions": [{"id": "t1"}],
+    }
+
+
+def test_only_requested_sections_are_loaded():
+    balance, summary = AsyncMock(return_value=1.0), AsyncMock(return_value={"total_requests": 0})
+    daily = AsyncMock(return_value=[])
+    with patch.multiple(
+        "app.services.dashboard_service", get_balance=balance, get_usage_summary=summary, get_daily_usage=daily
+    ):
+        overview = asyncio.run(get_overview(
+            "user-1", ["summary", "daily"], start_date="2026-03-01", time_zone="Europe/Berlin"
+        ))
+    assert list(overview) == ["summary", "daily"]
+    balance.assert_not_called()
+    summary.assert_awaited_once_with(
+        "user-1", start_date="2026-03-01", end_date=None, time_zone="Europe/Berlin"
+    )
+    daily.assert_awaited_once_with("user-1", start_date="2026-03-01", end_date=None, time_zone="Europe/Berlin")
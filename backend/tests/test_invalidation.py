@@ -0,0 +1,185 @@
+"""Tests for the cross-worker cache invalidation bus (app/services/invalidation.py)."""
+import asyncio
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.services import invalidation
+from app.services.invalidation import InvalidationListener
+
+
+@pytest.fixture
+def handlers():
+    """Swap the real handlers for mocks so tests observe dispatch only."""
+    mocks = {table: MagicMock(__name__=f"mock_{table}") for table in invalidation.HANDLERS}
+    with patch.dict(invalidation.HANDLERS, {t: [m] for t, m in mocks.items()}):
+        yield mocks
+
+
+class TestDispatch:
+    def test_routes_by_table(self, handlers):
+        listener = InvalidationListener()
+        listener.dispatch({"table": "api_keys", "key_hash": "h", "event_id": 1})
+        handlers["api_keys"].assert_called_once()
+        handlers["users"].assert_not_called()
+
+    def test_duplicate_event_applied_once(self, handlers):
+        listener = InvalidationListener()
+        listener.dispatch({"table": "users", "user_id": "u", "event_id": 7})
+        listener.dispatch({"table": "users", "user_id": "u", "event_id": 7})
+        assert handlers["users"].call_count == 1
+        assert listener.get_stats()["duplicates"] == 1
+
+    def test_late_lower_id_still_applied(self, handlers):
+        listener = InvalidationListener()
+        listener.dispatch({"table": "users", "user_id": "a", "event_id": 10})
+        listener.dispatch({"table": "users", "user_id": "b", "event_id": 9})
+        assert handlers["users"].call_count == 2
+        assert listener.last_event_id == 10
+
+    def test_handler_error_does_not_stop_others(self, handlers):
+        handlers["users"].side_effect = RuntimeError("boom")
+        listener = InvalidationListener()
+        listener.dispatch({"table": "users", "user_id": "u", "event_id": 1})
+        listener.dispatch({"table": "api_keys", "key_hash": "h", "event_id": 2})
+        handlers["api_keys"].assert_called_once()
+        assert listener.get_stats()["handler_errors"] == 1
+
+    def test_malformed_notify_payload_ignored(self, handlers):
+        listener = InvalidationListener()
+        listener._on_notify(None, 1, invalidation.CHANNEL, "not json")
+        assert listener.get_stats()["applied"] == 0
+
+
+class TestHandlers:
+    def test_api_key_event_evicts_old_and_new_hash(self):
+        with patch("app.services.invalidation.invalidate_api_key") as evict:
+            invalidation._evict_api_key({"key_hash": "new", "old_key_hash": "old"})
+        assert sorted(c.args[0] for c in evict.call_args_list) == ["new", "old"]
+
+    def test_user_event_evicts_both_auth_caches(self):
+        with patch("app.services.invalidation.invalidate_user") as keys, \
+                patch("app.services.invalidation.invalidate_session_user") as sessions:
+            invalidation._evict_user({"user_id": "u1"})
+        keys.assert_called_once_with("u1")
+        sessions.assert_called_once_with("u1")
+
+    def test_catalog_refresh_debounced(self):
+        async def scenario():
+            with patch("app.services.invalidation.refresh_catalog_async") as refresh:
+                for _ in range(20):
+                    invalidation._schedule_catalog_refresh({"table": "model_pricing"})
+                await invalidation._catalog_refresh
+            return refresh.call_count
+
+        assert asyncio.run(scenario()) == 1
+
+
+class TestPolling:
+    def _mock_supabase(self, rows):
+        mock_sb = MagicMock()
+        mock_sb.table.return_value.select.return_value.gt.return_value.order.return_value \
+            .limit.return_value.execute.return_value = MagicMock(data=rows)
+        return mock_sb
+
+    def test_poll_applies_new_events(self, handlers):
+        rows = [
+            {"id": 5, "payload": {"table": "api_keys", "key_hash": "h"}},
+            {"id": 6, "payload": {"table": "users", "user_id": "u"}},
+        ]
+        listener = InvalidationListener()
+        with patch("app.services.invalidation.get_supabase", return_value=self._mock_supabase(rows)):
+            assert asyncio.run(listener.poll_once()) == 2
+        handlers["api_keys"].assert_called_once()
+        handlers["users"].assert_called_once()
+        assert listener.last_event_id == 6
+
+    def test_poll_rereads_overlap_without_reapplying(self, handlers):
+        listener = InvalidationListener()
+        listener.dispatch({"table": "users", "user_id": "u", "event_id": 500})
+        rows = [{"id": 500, "payload": {"table": "users", "user_id": "u"}}]
+        mock_sb = self._mock_supabase(rows)
+        with patch("app.services.invalidation.get_supabase", return_value=mock_sb):
+            asyncio.run(listener.poll_once())
+        mock_sb.table.return_value.select.return_value.gt.assert_called_once_with(
+            "id", 500 - invalidation._POLL_OVERLAP_IDS
+        )
+        assert handlers["users"].call_count == 1
+
+    def test_full_batch_polls_again_without_sleeping(self, handlers):
+        listener = InvalidationListener(poll_interval=60)
+        results = iter([invalidation._POLL_BATCH_SIZE, invalidation._POLL_BATCH_SIZE, 3])
+
+        async def poll_once():
+            return next(results)
+
+        async def scenario():
+            with patch.object(listener, "poll_once", poll_once):
+                task = asyncio.create_task(listener._poll_for(float("inf")))
+                await asyncio.sleep(0.05)
+                task.cancel()
+
+        asyncio.run(scenario())
+        assert listener.stats["catch_up_polls"] == 2
+
+    def test_prune_keeps_events_the_slowest_reader_has_not_read(self):
+        listener = InvalidationListener()
+        listener.last_event_id = 9000
+        mock_sb = MagicMock()
+        readers = mock_sb.table.return_value.select.return_value.gte.return_value.order.return_value.limit
+        readers.return_value.execute.return_value = MagicMock(data=[{"last_event_id": 4000}])
+        with patch("app.services.invalidation.get_supabase", return_value=mock_sb):
+            listener._prune()
+        mock_sb.table.return_value.delete.return_value.lt.return_value.lt.assert_called_once_with(
+            "id", 4000 - invalidation._POLL_OVERLAP_IDS
+        )
+
+
+class TestAgainstPostgres:
+    """Trigger + NOTIFY round trip against a local Postgres (TEST_DATABASE_URL)."""
+
+    def test_notify_reaches_listener(self, pg_dsn, handlers):
+        import asyncpg
+
+        async def scenario():
+            conn = await asyncpg.connect(pg_dsn)
+            user_id = await conn.fetchval(
+                "INSERT INTO users (email) VALUES ($1) RETURNING id", f"{id(self)}@example.com"
+            )
+            await conn.execute(
+                "INSERT INTO api_keys (user_id, key_prefix, key_hash) VALUES ($1, 'vz-sk_ab', $2)",
+                user_id, f"hash-{id(self)}",
+            )
+
+            listener = InvalidationListener(dsn=pg_dsn, poll_interval=60)
+            with patch.object(listener, "poll_once", return_value=0):
+                task = asyncio.create_task(listener._listen())
+                for _ in range(100):
+                    if listener.mode == "listening":
+                        break
+                    await asyncio.sleep(0.02)
+
+                await conn.execute("UPDATE api_keys SET is_active = false WHERE user_id = $1", user_id)
+                await conn.execute("UPDATE api_keys SET last_used_at = now() WHERE user_id = $1", user_id)
+                for _ in range(100):
+                    if handlers["api_keys"].called:
+                        break
+                    await asyncio.sleep(0.02)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+            events = await conn.fetch(
+                "SELECT payload FROM cache_invalidation_events"
+                " WHERE table_name = 'api_keys' AND payload->>'key_hash' = $1 ORDER BY id",
+                f"hash-{id(self)}",
+            )
+            await conn.close()
+            return [json.loads(e["payload"]) for e in events]
+
+        events = asyncio.run(scenario())
+        assert handlers["api_keys"].call_count == 1
+        payload = handlers["api_keys"].call_args.args[0]
+        assert payload["key_hash"].startswith("hash-")
+        assert payload["op"] == "UPDATE"
+        # the INSERT and the is_active flip are recorded; the last_used_at bump is not
+        assert [e["op"] for e in events] == ["INSERT", "UPDATE"]
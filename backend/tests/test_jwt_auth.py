@@ -0,0 +1,125 @@
+"""Tests for local Supabase JWT verification (app/middleware/jwt_auth.py)."""
+import asyncio
+import time
+import jwt
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.middleware import jwt_auth
+from app.middleware.jwt_auth import validate_session, invalidate_session_user
+
+SECRET = "test-jwt-secret-with-enough-length-for-hs256"
+AUTH_UID = "11111111-2222-3333-4444-555555555555"
+
+
+@pytest.fixture(autouse=True)
+def _settings_and_cache():
+    jwt_auth._user_cache.clear()
+    settings = MagicMock(supabase_jwt_secret=SECRET, supabase_url="http://supabase.local")
+    with patch("app.middleware.jwt_auth.get_settings", return_value=settings):
+        yield settings
+    jwt_auth._user_cache.clear()
+
+
+def _token(secret: str = SECRET, exp_offset: int = 3600, aud: str = "authenticated", **claims) -> str:
+    payload = {
+        "sub": AUTH_UID,
+        "email": "dev@example.com",
+        "aud": aud,
+        "exp": int(time.time()) + exp_offset,
+        **claims,
+    }
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+def _validate(token: str) -> str:
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return asyncio.run(validate_session(creds))
+
+
+def _mock_supabase(users: list[dict]) -> MagicMock:
+    mock_sb = MagicMock()
+    mock_sb.table.return_value.select.return_value.eq.return_value \
+        .execute.return_value = MagicMock(data=users)
+    return mock_sb
+
+
+class TestTokenVerification:
+    def test_valid_token_maps_to_vuzo_user(self):
+        mock_sb = _mock_supabase([{"id": "user-1", "is_active": True}])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            assert _validate(_token()) == "user-1"
+        mock_sb.table.return_value.select.return_value.eq.assert_called_once_with(
+            "supabase_auth_id", AUTH_UID
+        )
+
+    def test_expired_token_rejected(self):
+        with pytest.raises(HTTPException) as exc:
+            _validate(_token(exp_offset=-10))
+        assert exc.value.status_code == 401
+
+    def test_wrong_secret_rejected(self):
+        with pytest.raises(HTTPException) as exc:
+            _validate(_token(secret="some-other-secret-that-is-also-long-enough"))
+        assert exc.value.status_code == 401
+
+    def test_wrong_audience_rejected(self):
+        with pytest.raises(HTTPException) as exc:
+            _validate(_token(aud="anon"))
+        assert exc.value.status_code == 401
+
+    def test_garbage_token_rejected(self):
+        with pytest.raises(HTTPException) as exc:
+            _validate("not-a-jwt")
+        assert exc.value.status_code == 401
+
+    def test_hs256_without_configured_secret_rejected(self, _settings_and_cache):
+        _settings_and_cache.supabase_jwt_secret = ""
+        with pytest.raises(HTTPException) as exc:
+            _validate(_token())
+        assert exc.value.status_code == 401
+
+    def test_no_remote_auth_call(self):
+        mock_sb = _mock_supabase([{"id": "user-1", "is_active": True}])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb), \
+                patch("supabase.create_client") as mock_create:
+            _validate(_token())
+        mock_create.assert_not_called()
+
+
+class TestUserMappingCache:
+    def test_second_call_skips_users_lookup(self):
+        mock_sb = _mock_supabase([{"id": "user-1", "is_active": True}])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb) as mock_get:
+            assert _validate(_token()) == "user-1"
+            assert _validate(_token()) == "user-1"
+        assert mock_get.call_count == 1
+
+    def test_inactive_user_cached_and_rejected(self):
+        mock_sb = _mock_supabase([{"id": "user-1", "is_active": False}])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb) as mock_get:
+            for _ in range(2):
+                with pytest.raises(HTTPException) as exc:
+                    _validate(_token())
+                assert exc.value.status_code == 403
+        assert mock_get.call_count == 1
+
+    def test_invalidate_session_user(self):
+        mock_sb = _mock_supabase([{"id": "user-1", "is_active": True}])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            _validate(_token())
+        assert invalidate_session_user("user-1") == 1
+        assert invalidate_session_user("user-1") == 0
+
+    def test_first_login_creates_user_and_credits(self):
+        mock_sb = _mock_supabase([])
+        mock_sb.table.return_value.insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": "new-user"}]
+        )
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            assert _validate(_token()) == "new-user"
+        inserted = [c.args[0] for c in mock_sb.table.return_value.insert.call_args_list]
+        assert inserted[0]["email"] == "dev@example.com"
+        assert inserted[1] == {"user_id": "new-user", "balance": 0}
@@ -0,0 +1,79 @@
+"""Tests for the write-behind last_used_at buffer (app/services/key_activity.py)."""
+import pytest
+from datetime import datetime, timezone, timedelta
+from unittest.mock import MagicMock, patch
+
+from app.services.key_activity import LastUsedRecorder
+
+T0 = datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def _sent_updates(mock_sb: MagicMock) -> list[dict]:
+    name, params = mock_sb.rpc.call_args.args
+    assert name == "touch_api_keys"
+    return params["p_updates"]
+
+
+def test_flush_with_nothing_pending_skips_db():
+    recorder = LastUsedRecorder()
+    with patch("app.services.key_activity.get_supabase") as mock_get:
+        assert recorder.flush() == 0
+    mock_get.assert_not_called()
+
+
+def test_hot_key_coalesced_to_one_row():
+    recorder = LastUsedRecorder()
+    for i in range(500):
+        recorder.record("key-1", T0 + timedelta(milliseconds=i))
+    mock_sb = MagicMock()
+    with patch("app.services.key_activity.get_supabase", return_value=mock_sb):
+        assert recorder.flush() == 1
+    assert mock_sb.rpc.call_count == 1
+    updates = _sent_updates(mock_sb)
+    assert updates == [{"id": "key-1", "last_used_at": (T0 + timedelta(milliseconds=499)).isoformat()}]
+
+
+def test_one_row_per_key():
+    recorder = LastUsedRecorder()
+    recorder.record("key-1", T0)
+    recorder.record("key-2", T0)
+    recorder.record("key-1", T0 + timedelta(seconds=1))
+    mock_sb = MagicMock()
+    with patch("app.services.key_activity.get_supabase", return_value=mock_sb):
+        assert recorder.flush() == 2
+    ids = sorted(u["id"] for u in _sent_updates(mock_sb))
+    assert ids == ["key-1", "key-2"]
+
+
+def test_out_of_order_record_keeps_latest():
+    recorder = LastUsedRecorder()
+    recorder.record("key-1", T0 + timedelta(seconds=5))
+    recorder.record("key-1", T0)
+    mock_sb = MagicMock()
+    with patch("app.services.key_activity.get_supabase", return_value=mock_sb):
+        recorder.flush()
+    assert _sent_updates(mock_sb)[0]["last_used_at"] == (T0 + timedelta(seconds=5)).isoformat()
+
+
+def test_pending_cleared_after_flush():
+    recorder = LastUsedRecorder()
+    recorder.record("key-1", T0)
+    with patch("app.services.key_activity.get_supabase", return_value=MagicMock()):
+        recorder.flush()
+        assert recorder.flush() == 0
+
+
+def test_failed_flush_requeues_batch():
+    recorder = LastUsedRecorder()
+    recorder.record("key-1", T0)
+    mock_sb = MagicMock()
+    mock_sb.rpc.side_effect = Exception("Connection refused")
+    with patch("app.services.key_activity.get_supabase", return_value=mock_sb):
+        with pytest.raises(Exception):
+            recorder.flush()
+    assert recorder.stats()["pending_keys"] == 1
+    assert recorder.stats()["failed_flushes"] == 1
+
+    mock_sb = MagicMock()
+    with patch("app.services.key_activity.get_supabase", return_value=mock_sb):
+        assert recorder.flush() == 1
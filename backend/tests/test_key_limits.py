@@ -0,0 +1,92 @@
+"""Tests for per-key token and concurrency limits (app/services/key_limits.py)."""
+import pytest
+from fastapi import HTTPException
+
+from app.models.schemas import AuthContext, ChatCompletionRequest, ChatMessage
+from app.services.key_limits import KeyLimiter, estimate_request_tokens
+
+
+def _auth(tpm: int = 6000, concurrent: int = 0) -> AuthContext:
+    return AuthContext(
+        user_id="user-1", api_key_id="key-1", rate_limit_rpm=60,
+        rate_limit_tpm=tpm, max_concurrent_requests=concurrent,
+    )
+
+
+def test_estimate_includes_max_tokens():
+    request = ChatCompletionRequest(model="gpt-4o", messages=[ChatMessage(role="user", content="x" * 400)])
+    prompt_only = estimate_request_tokens(request)
+    request.max_tokens = 1000
+    assert estimate_request_tokens(request) == prompt_only + 1000
+
+
+class TestTokenBudget:
+    def test_budget_exhausted_then_refills(self):
+        limiter = KeyLimiter()
+        for _ in range(3):
+            limiter.acquire(_auth(), 2000, now=0.0)
+        with pytest.raises(HTTPException) as exc:
+            limiter.acquire(_auth(), 2000, now=0.0)
+        assert exc.value.status_code == 429
+        assert exc.value.headers["Retry-After"] == "20"  # 2000 tokens at 100/s
+        assert "6000 tokens per minute" in exc.value.detail
+        limiter.acquire(_auth(), 2000, now=20.0)
+
+    def test_settle_charges_actual_usage(self):
+        limiter = KeyLimiter()
+        lease = limiter.acquire(_auth(), 1000, now=0.0)
+        limiter.settle(lease, 6000)
+        limiter.release(lease)
+        with pytest.raises(HTTPException):
+            limiter.acquire(_auth(), 1000, now=0.0)  # 0 left after 6000 actual
+
+    def test_unsettled_request_refunded(self):
+        limiter = KeyLimiter()
+        limiter.release(limiter.acquire(_auth(), 6000, now=0.0))
+        limiter.acquire(_auth(), 6000, now=0.0)
+        assert limiter.stats()["refunded"] == 1
+
+    def test_oversized_request_needs_full_bucket(self):
+        limiter = KeyLimiter()
+        lease = limiter.acquire(_auth(), 9000, now=0.0)
+        limiter.settle(lease, 9000)
+        limiter.release(lease)
+        with pytest.raises(HTTPException):
+            limiter.acquire(_auth(), 9000, now=60.0)  # still 3000 in debt
+        limiter.acquire(_auth(), 9000, now=90.0)
+
+    def test_zero_tpm_is_unlimited(self):
+        limiter = KeyLimiter()
+        for _ in range(10):
+            limiter.settle(limiter.acquire(_auth(tpm=0), 10**6, now=0.0), 10**6)
+
+
+class TestConcurrency:
+    def test_cap_counts_open_requests(self):
+        limiter = KeyLimiter()
+        leases = [limiter.acquire(_auth(concurrent=2), 10, now=0.0) for _ in range(2)]
+        with pytest.raises(HTTPException) as exc:
+            limiter.acquire(_auth(concurrent=2), 10, now=0.0)
+        assert exc.value.status_code == 429
+        assert "Max 2 in flight" in exc.value.detail
+        assert limiter.stats()["rejected_concurrency"] == 1
+
+        limiter.release(leases[0])
+        limiter.release(leases[0])  # double release frees one slot only
+        limiter.acquire(_auth(concurrent=2), 10, now=0.0)
+        with pytest.raises(HTTPException):
+            limiter.acquire(_auth(concurrent=2), 10, now=0.0)
+
+    def test_abandoned_slots_expire(self):
+        limiter = KeyLimiter()
+        limiter.acquire(_auth(concurrent=1), 10, now=0.0)
+        limiter._last_sweep = 0.0
+        limiter.acquire(_auth(concurrent=1), 10, now=601.0)
+        assert limiter.stats()["expired"] == 1
+
+    def test_idle_keys_swept(self):
+        limiter = KeyLimiter()
+        limiter.release(limiter.acquire(_auth(), 10, now=0.0))
+        limiter._last_sweep = 0.0
+        limiter.acquire(AuthContext(user_id="u", api_key_id="key-2", rate_limit_rpm=60), 10, now=61.0)
+        assert limiter.stats()["keys"] == 1
@@ -0,0 +1,68 @@
+"""Tests for the event-loop stall watchdog (app/utils/loop_watchdog.py)."""
+import asyncio
+import time
+
+from app.utils.loop_watchdog import LoopWatchdog
+
+
+def _blocking_call(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def _run(watchdog: LoopWatchdog, scenario) -> dict:
+    async def main():
+        watchdog.start()
+        try:
+            await asyncio.sleep(watchdog.interval * 3)
+            await scenario()
+            await asyncio.sleep(watchdog.interval * 3)
+        finally:
+            await watchdog.stop()
+        return watchdog.stats()
+
+    return asyncio.run(main())
+
+
+class TestLoopWatchdog:
+    def test_idle_loop_has_no_stalls(self):
+        stats = _run(LoopWatchdog(interval=0.01, threshold=0.05), lambda: asyncio.sleep(0))
+        assert stats["ticks"] >= 3
+        assert stats["stalls"] == 0
+        assert stats["top_call_sites"] == []
+
+    def test_blocking_call_is_attributed(self):
+        async def scenario():
+            _blocking_call(0.3)
+
+        stats = _run(LoopWatchdog(interval=0.01, threshold=0.05), scenario)
+        assert stats["stalls"] == 1
+        assert stats["max_lag_ms"] >= 250
+        assert stats["lag_histogram_ms"]["500"] == 1
+        site = stats["top_call_sites"][0]
+        assert site["site"] == "tests.test_loop_watchdog._blocking_call"
+        assert site["count"] == 1
+        assert site["total_ms"] >= 250
+        assert any("scenario" in frame for frame in site["stack"])
+
+    def test_library_frames_attributed_to_calling_app_code(self):
+        import threading
+
+        async def scenario():
+            threading.Event().wait(0.2)  # blocks inside threading.py
+
+        stats = _run(LoopWatchdog(interval=0.01, threshold=0.05, app_prefix="tests."), scenario)
+        site = stats["top_call_sites"][0]
+        assert site["site"].startswith("tests.test_loop_watchdog.")
+        assert site["site"].endswith("scenario")
+        assert site["stack"][0].startswith("threading.")
+
+    def test_stop_and_reset(self):
+        watchdog = LoopWatchdog(interval=0.01, threshold=0.05)
+
+        async def scenario():
+            _blocking_call(0.2)
+
+        _run(watchdog, scenario)
+        assert not watchdog.running
+        watchdog.reset()
+        assert watchdog.stats()["stalls"] == 0
@@ -0,0 +1,45 @@
+"""Tests for the versioned migration runner (app/models/migrations.py)."""
+import asyncio
+
+import pytest
+
+from app.models.migrations import MIGRATIONS_DIR, apply_migrations, migration_files
+
+
+def test_migrations_are_numbered_in_order():
+    files = migration_files()
+    versions = [version for version, _ in files]
+    assert versions == sorted(versions)
+    assert versions[0] == "001"
+    assert all(path.parent == MIGRATIONS_DIR for _, path in files)
+
+
+def test_rejects_unnumbered_file(tmp_path):
+    (tmp_path / "001_initial.sql").write_text("SELECT 1;")
+    (tmp_path / "add_column.sql").write_text("SELECT 1;")
+    with pytest.raises(ValueError, match="add_column.sql"):
+        migration_files(tmp_path)
+
+
+def test_rejects_duplicate_versions(tmp_path):
+    (tmp_path / "002_a.sql").write_text("SELECT 1;")
+    (tmp_path / "002_b.sql").write_text("SELECT 1;")
+    with pytest.raises(ValueError, match="Duplicate"):
+        migration_files(tmp_path)
+
+
+def test_migrated_database_has_nothing_pending(pg_dsn):
+    import asyncpg
+
+    async def scenario():
+        applied_again = await apply_migrations(pg_dsn)
+        conn = await asyncpg.connect(pg_dsn)
+        try:
+            recorded = [r["version"] for r in await conn.fetch("SELECT version FROM schema_migrations ORDER BY 1")]
+        finally:
+            await conn.close()
+        return applied_again, recorded
+
+    applied_again, recorded = asyncio.run(scenario())
+    assert applied_again == []
+    assert recorded == [version for version, _ in migration_files()]
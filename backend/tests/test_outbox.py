@@ -0,0 +1,271 @@
+"""Tests for the local billing/usage outbox (app/services/outbox.py)."""
+import asyncio
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import outbox as outbox_module
+from app.services.credit_ledger import CreditLedger
+from app.services.outbox import Outbox
+from app.services.usage_writer import replay_usage_logs
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox()
+    box.open(str(tmp_path / "outbox.sqlite3"))
+    yield box
+    box.close()
+
+
+def _recorder(calls: list, fail: Exception | None = None):
+    async def handler(events):
+        if fail is not None:
+            raise fail
+        calls.append([(e.event_id, e.payload) for e in events])
+    return handler
+
+
+class TestReplay:
+    def test_events_replayed_in_order_and_removed(self, outbox):
+        calls = []
+        outbox.register("charge", _recorder(calls))
+        ids = [outbox.append("charge", {"n": n}) for n in range(3)]
+
+        assert asyncio.run(outbox.replay_once()) == 3
+        assert calls == [[(ids[0], {"n": 0}), (ids[1], {"n": 1}), (ids[2], {"n": 2})]]
+        assert outbox.stats()["pending"] == 0
+        assert asyncio.run(outbox.replay_once()) == 0
+
+    def test_kinds_go_to_their_own_handler(self, outbox):
+        charges, logs = [], []
+        outbox.register("charge", _recorder(charges))
+        outbox.register("usage_log", _recorder(logs))
+        outbox.append("charge", {"n": 1})
+        outbox.append("usage_log", {"n": 2})
+        outbox.append("charge", {"n": 3})
+
+        asyncio.run(outbox.replay_once())
+        assert [p for _, p in charges[0]] == [{"n": 1}, {"n": 3}]
+        assert [p for _, p in logs[0]] == [{"n": 2}]
+
+    def test_failed_kind_stays_queued_others_applied(self, outbox):
+        logs = []
+        outbox.register("charge", _recorder([], fail=ConnectionError("db down")))
+        outbox.register("usage_log", _recorder(logs))
+        outbox.append("charge", {"n": 1})
+        outbox.append("usage_log", {"n": 2})
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(outbox.replay_once())
+        stats = outbox.stats()
+        assert len(logs) == 1
+        assert stats["pending"] == 1
+        assert stats["failed_passes"] == 1
+
+    def test_events_survive_reopen(self, tmp_path):
+        path = str(tmp_path / "outbox.sqlite3")
+        first = Outbox()
+        first.open(path)
+        event_id = first.append("charge", {"at": datetime(2026, 3, 1, tzinfo=timezone.utc)})
+        first.close()  # as if the process had died before replaying
+
+        calls = []
+        second = Outbox()
+        second.register("charge", _recorder(calls))
+        second.open(path)
+        try:
+            asyncio.run(second.replay_once())
+        finally:
+            second.close()
+        assert calls == [[(event_id, {"at": "2026-03-01T00:00:00+00:00"})]]
+
+    def test_repeatedly_failing_events_parked_then_requeued(self, outbox):
+        outbox.register("charge", _recorder([], fail=ValueError("bad row")))
+        outbox.append("charge", {"n": 1})
+
+        with patch.object(outbox_module, "_MAX_ATTEMPTS", 2):
+            for _ in range(2):
+                with pytest.raises(ValueError):
+                    asyncio.run(outbox.replay_once())
+        stats = outbox.stats()
+        assert (stats["pending"], stats["dead"], stats["dead_lettered"]) == (0, 1, 1)
+        assert asyncio.run(outbox.replay_once()) == 0
+
+        outbox.register("charge", _recorder([]))
+        assert outbox.requeue_dead() == 1
+        assert asyncio.run(outbox.replay_once()) == 1
+
+    def test_bad_event_does_not_block_the_queue(self, outbox):
+        ledger = CreditLedger()
+        applied = []
+
+        async def apply_credit_change(user_id, amount, *args):
+            if user_id == "deleted-user":
+                raise ValueError("violates foreign key constraint")
+            applied.append(user_id)
+            return 5.0, "tx"
+
+        repo = MagicMock(apply_credit_change=apply_credit_change)
+        outbox.register("charge", ledger.apply_replayed_charges)
+        for user_id in ("deleted-user", "user-1", "user-2"):
+            outbox.append("charge", {
+                "user_id": user_id, "amount": -0.1, "description": "gpt-4o", "aggregation_key": None,
+            })
+
+        with patch("app.services.credit_ledger.get_repository", return_value=repo), \
+                patch.object(outbox_module, "_MAX_ATTEMPTS", 2):
+            with pytest.raises(ValueError):
+                asyncio.run(outbox.replay_once())
+            assert applied == ["user-1", "user-2"]
+            assert outbox.stats()["pending"] == 1
+            with pytest.raises(ValueError):
+                asyncio.run(outbox.replay_once())
+        stats = outbox.stats()
+        assert (stats["pending"], stats["dead"], stats["dead_lettered"]) == (0, 1, 1)
+        assert stats["replayed"] == 2
+
+    def test_unreachable_database_costs_no_attempts(self, outbox):
+        calls = []
+
+        async def handler(events):
+            calls.append(len(events))
+            raise ConnectionRefusedError("connection refused")
+
+        outbox.register("charge", handler)
+        for n in range(3):
+            outbox.append("charge", {"n": n})
+        with patch.object(outbox_module, "_MAX_ATTEMPTS", 1):
+            for _ in range(3):
+                with pytest.raises(ConnectionRefusedError):
+                    asyncio.run(outbox.replay_once())
+        assert calls == [3, 3, 3]  # no per-event fan-out
+        stats = outbox.stats()
+        assert (stats["pending"], stats["dead"], stats["isolated_retries"]) == (3, 0, 0)
+
+    def test_fan_out_stops_when_the_database_goes_away(self, outbox):
+        calls = []
+
+        async def handler(events):
+            calls.append([e.payload["n"] for e in events])
+            if len(events) > 1:
+                raise ValueError("bad row")
+            if events[0].payload["n"] == 1:
+                raise ConnectionResetError("connection reset")
+
+        outbox.register("charge", handler)
+        for n in range(3):
+            outbox.append("charge", {"n": n})
+        with patch.object(outbox_module, "_MAX_ATTEMPTS", 1):
+            with pytest.raises(ValueError):
+                asyncio.run(outbox.replay_once())
+        assert calls == [[0, 1, 2], [0], [1]]
+        stats = outbox.stats()
+        assert (stats["pending"], stats["dead"], stats["replayed"]) == (2, 0, 1)
+
+    def test_unregistered_kind_fails_pass(self, outbox):
+        outbox.append("mystery", {})
+        with pytest.raises(LookupError):
+            asyncio.run(outbox.replay_once())
+
+
+class TestSlots:
+    def test_second_process_gets_its_own_file(self, tmp_path):
+        path = str(tmp_path / "outbox.sqlite3")
+        first, second = Outbox(), Outbox()
+        first.open(path)
+        second.open(path)
+        try:
+            assert first.path.name == "outbox.sqlite3"
+            assert second.path.name == "outbox.1.sqlite3"
+        finally:
+            first.close()
+            second.close()
+
+    def test_abandoned_slot_adopted(self, tmp_path):
+        path = str(tmp_path / "outbox.sqlite3")
+        first, second = Outbox(), Outbox()
+        first.open(path)
+        second.open(path)
+        event_id = second.append("usage_log", {"n": 1})
+        second.close()  # worker 1 went away for good
+        first.close()
+
+        third = Outbox()
+        third.open(path)
+        try:
+            assert third.path.name == "outbox.sqlite3"
+            assert third.stats()["pending"] == 1
+            assert third.stats()["adopted"] == 1
+            assert third._pending()[0].event_id == event_id
+            assert not (tmp_path / "outbox.1.sqlite3").exists()
+        finally:
+            third.close()
+
+
+class TestHandlers:
+    def test_settle_queues_charge_and_replay_applies_it_once(self, outbox):
+        ledger = CreditLedger()
+        repo = MagicMock()
+        repo.get_balance = AsyncMock(return_value=10.0)
+        repo.apply_credit_change = AsyncMock(return_value=(9.75, "tx-1"))
+        outbox.register("charge", ledger.apply_replayed_charges)
+
+        async def scenario():
+            with patch("app.services.credit_ledger.outbox", outbox):
+                reservation = await ledger.reserve("user-1", 1.0)
+                projected = await ledger.settle(reservation, 0.25, "gpt-4o", "gpt-4o@0/60")
+                queued = ledger.stats()["queued_charges"]
+                repo.apply_credit_change.assert_not_awaited()
+                await outbox.replay_once()
+                return projected, queued
+
+        with patch("app.services.credit_ledger.get_repository", return_value=repo):
+            projected, queued = asyncio.run(scenario())
+        assert (projected, queued) == (9.75, 1)
+        event_id = repo.apply_credit_change.await_args.args[-1]
+        repo.apply_credit_change.assert_awaited_once_with(
+            "user-1", -0.25, "usage", "gpt-4o", "gpt-4o@0/60", event_id
+        )
+        account = ledger._accounts["user-1"]
+        assert (account.in_flight, account.balance) == (0, 9.75)
+        assert ledger.stats()["queued_charges"] == 0
+
+    def test_charges_in_one_debit_window_applied_together(self, outbox):
+        ledger = CreditLedger()
+        repo = MagicMock(
+            apply_credit_change=AsyncMock(return_value=(8.0, "tx-2")),
+            apply_usage_debits=AsyncMock(return_value=(9.0, "tx-1")),
+        )
+        outbox.register("charge", ledger.apply_replayed_charges)
+        charges = [
+            ("user-1", -0.25, "gpt-4o@0/60"), ("user-1", -0.5, "gpt-4o@0/60"), ("user-1", -0.1, None),
+        ]
+        ids = [
+            outbox.append("charge", {
+                "user_id": user_id, "amount": amount, "description": "gpt-4o", "aggregation_key": key,
+            })
+            for user_id, amount, key in charges
+        ]
+
+        with patch("app.services.credit_ledger.get_repository", return_value=repo):
+            assert asyncio.run(outbox.replay_once()) == 3
+        repo.apply_usage_debits.assert_awaited_once_with(
+            "user-1", "gpt-4o", "gpt-4o@0/60", ids[:2], [-0.25, -0.5]
+        )
+        repo.apply_credit_change.assert_awaited_once_with("user-1", -0.1, "usage", "gpt-4o", None, ids[2])
+        assert ledger.stats()["coalesced_charges"] == 1
+
+    def test_usage_rows_inserted_under_event_id(self, outbox):
+        repo = MagicMock(insert_usage_logs=AsyncMock())
+        outbox.register("usage_log", replay_usage_logs)
+        created_at = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+        event_id = outbox.append("usage_log", {"user_id": "user-1", "model": "gpt-4o", "created_at": created_at})
+
+        with patch("app.services.usage_writer.get_repository", return_value=repo), \
+                patch("app.services.usage_writer.read_cache") as read_cache:
+            asyncio.run(outbox.replay_once())
+        repo.insert_usage_logs.assert_awaited_once_with(
+            [{"user_id": "user-1", "model": "gpt-4o", "created_at": created_at, "event_id": event_id}]
+        )
+        read_cache.invalidate_usage.assert_called_once_with("user-1", created_at)
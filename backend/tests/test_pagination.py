@@ -0,0 +1,37 @@
+"""Tests for keyset pagination cursors (app/utils/pagination.py)."""
+import pytest
+from fastapi import HTTPException
+
+from app.utils.pagination import cursor_position, decode_cursor, encode_cursor, split_page
+
+ROW = {"id": "6f1c5a52-5b3f-4c1b-9d3e-1a2b3c4d5e6f", "created_at": "2026-03-01T12:00:00.123456+00:00"}
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(ROW)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (ROW["created_at"], ROW["id"])
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "bnVsbA", encode_cursor({"created_at": "soon", "id": ROW["id"]})])
+def test_malformed_cursor_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_cursor_position_errors_are_400():
+    assert cursor_position(None, 20) is None
+    with pytest.raises(HTTPException) as exc:
+        cursor_position(encode_cursor(ROW), 20)
+    assert exc.value.status_code == 400
+    with pytest.raises(HTTPException) as exc:
+        cursor_position("garbage", 0)
+    assert exc.value.status_code == 400
+
+
+def test_split_page():
+    rows = [{**ROW, "id": f"00000000-0000-0000-0000-00000000000{n}"} for n in range(3)]
+    assert split_page(rows[:2], 2) == (rows[:2], None)
+    page, cursor = split_page(rows, 2)
+    assert page == rows[:2]
+    assert decode_cursor(cursor) == (ROW["created_at"], rows[1]["id"])
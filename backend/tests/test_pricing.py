@@ -1,6 +1,7 @@
 """Tests for cost calculation logic (app/utils/pricing.py)."""
 import pytest
-from app.utils.pricing import calculate_cost
+from app.models.schemas import ChatMessage
+from app.utils.pricing import calculate_cost, estimate_prompt_tokens
 
 
 def test_zero_tokens_returns_zero():
@@ -45,3 +46,14 @@ def test_vuzo_cost_always_gte_provider_cost():
     for markup in [0, 5, 20, 100]:
         p, v = calculate_cost(10_000, 10_000, 1.0, 2.0, markup)
         assert v >= p
+
+
+def test_prompt_estimate_counts_text_and_framing():
+    messages = [ChatMessage(role="system", content="x" * 40), ChatMessage(role="user", content="y" * 400)]
+    assert estimate_prompt_tokens(messages) == 110 + 4 * 2
+
+
+def test_prompt_estimate_handles_content_parts_and_none():
+    parts = [{"type": "text", "text": "z" * 400}]
+    messages = [ChatMessage(role="user", content=parts), ChatMessage(role="assistant", content=None)]
+    assert estimate_prompt_tokens(messages) > 100
@@ -0,0 +1,133 @@
+"""Tests for the in-memory model catalogue snapshot (app/services/pricing_service.py)."""
+import asyncio
+
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi import HTTPException
+
+from app.services import pricing_service
+from app.services.pricing_service import (
+    get_all_models,
+    get_catalog_stats,
+    get_model_pricing,
+    get_provider_api_key,
+    refresh_catalog,
+)
+
+PRICING_ROWS = [
+    {"provider": "google", "model_name": "gemini-2.0-flash", "input_price_per_million": 0.1,
+     "output_price_per_million": 0.4, "vuzo_markup_percent": 20, "is_active": True},
+    {"provider": "openai", "model_name": "gpt-4o-mini", "input_price_per_million": 0.15,
+     "output_price_per_million": 0.6, "vuzo_markup_percent": 20, "is_active": True},
+]
+KEY_ROWS = [{"provider": "openai", "api_key_encrypted": "enc-openai"}]
+
+
+def _mock_supabase(pricing_rows=PRICING_ROWS, key_rows=KEY_ROWS) -> MagicMock:
+    tables = {
+        "model_pricing": MagicMock(),
+        "provider_keys": MagicMock(),
+    }
+    tables["model_pricing"].select.return_value.eq.return_value.order.return_value \
+        .execute.return_value = MagicMock(data=pricing_rows)
+    tables["provider_keys"].select.return_value.eq.return_value \
+        .execute.return_value = MagicMock(data=key_rows)
+    mock_sb = MagicMock()
+    mock_sb.table.side_effect = lambda name: tables[name]
+    return mock_sb
+
+
+@pytest.fixture(autouse=True)
+def _fresh_snapshot():
+    pricing_service._snapshot = None
+    with patch("app.services.pricing_service.decrypt_provider_key", side_effect=lambda c: c.replace("enc-", "sk-")):
+        yield
+    pricing_service._snapshot = None
+
+
+def _load(mock_sb=None):
+    with patch("app.services.pricing_service.get_supabase", return_value=mock_sb or _mock_supabase()):
+        return refresh_catalog()
+
+
+class TestSnapshotLookups:
+    def test_model_pricing_served_without_io(self):
+        _load()
+        with patch("app.services.pricing_service.get_supabase") as mock_get:
+            pricing = get_model_pricing("gpt-4o-mini")
+            key = get_provider_api_key("openai")
+        mock_get.assert_not_called()
+        assert pricing["provider"] == "openai"
+        assert key == "sk-openai"
+
+    def test_unknown_model_is_400(self):
+        _load()
+        with pytest.raises(HTTPException) as exc:
+            get_model_pricing("gpt-99")
+        assert exc.value.status_code == 400
+
+    def test_unconfigured_provider_is_503(self):
+        _load()
+        with pytest.raises(HTTPException) as exc:
+            get_provider_api_key("google")
+        assert exc.value.status_code == 503
+
+    def test_all_models_keeps_provider_order(self):
+        _load()
+        assert [m["model_name"] for m in get_all_models()] == ["gemini-2.0-flash", "gpt-4o-mini"]
+
+    def test_snapshot_is_read_only(self):
+        _load()
+        with pytest.raises(TypeError):
+            get_model_pricing("gpt-4o-mini")["vuzo_markup_percent"] = 0
+
+    def test_unloaded_catalog_is_503_and_loads_off_the_loop(self):
+        async def scenario():
+            statuses = []
+            for _ in range(2):
+                try:
+                    get_model_pricing("gpt-4o-mini")
+                except HTTPException as exc:
+                    statuses.append(exc.status_code)
+            await pricing_service._background_load
+            return statuses, get_model_pricing("gpt-4o-mini")
+
+        with patch("app.services.pricing_service.get_supabase", return_value=_mock_supabase()) as mock_get:
+            statuses, pricing = asyncio.run(scenario())
+        assert statuses == [503, 503]
+        assert mock_get.call_count == 1  # one background load for both requests
+        assert pricing["provider"] == "openai"
+
+
+class TestRefresh:
+    def test_refresh_swaps_in_new_models(self):
+        _load()
+        _load(_mock_supabase(pricing_rows=PRICING_ROWS[:1]))
+        with pytest.raises(HTTPException):
+            get_model_pricing("gpt-4o-mini")
+
+    def test_failed_refresh_keeps_previous_snapshot(self):
+        _load()
+        broken = MagicMock()
+        broken.table.side_effect = Exception("Connection refused")
+        with pytest.raises(Exception):
+            _load(broken)
+        assert get_model_pricing("gpt-4o-mini")["provider"] == "openai"
+        stats = get_catalog_stats()
+        assert stats["refresh_failures"] >= 1
+        assert "Connection refused" in stats["last_error"]
+
+    def test_undecryptable_key_skipped(self):
+        with patch("app.services.pricing_service.decrypt_provider_key", side_effect=ValueError("bad token")):
+            _load()
+        with pytest.raises(HTTPException) as exc:
+            get_provider_api_key("openai")
+        assert exc.value.status_code == 503
+
+    def test_stats_report_age_and_counts(self):
+        _load()
+        stats = get_catalog_stats()
+        assert stats["loaded"] is True
+        assert stats["models"] == 2
+        assert stats["providers"] == ["openai"]
+        assert stats["age_seconds"] >= 0
@@ -0,0 +1,181 @@
+"""
+Index coverage of the hot-path queries (needs TEST_DATABASE_URL).
+
+Seeds a few thousand users with realistic per-user row counts, runs each
+PostgresRepository method the request path uses, and EXPLAINs the exact SQL
+and parameters it sent. A sequential scan over one of the large tables
+fails the test, so a query change or a dropped index that loses index
+coverage shows up here rather than as production latency.
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+from app.models import database
+from app.models.repository import postgres_repository as repo
+
+USERS = 2000
+KEYS_PER_USER = 2
+LOGS_PER_KEY = 12
+TRANSACTIONS_PER_USER = 10
+MODELS = ("gpt-4o", "gpt-4o-mini", "gemini-2.0-flash", "grok-3", "claude-3-5-sonnet")
+
+# Tables that grow with traffic or users; a query must never scan them whole.
+LARGE_TABLES = ("users", "api_keys", "credits", "credit_transactions", "usage_logs", "usage_hourly")
+
+_SEED_SQL = f"""
+    WITH new_users AS (
+        INSERT INTO users (email, name, supabase_auth_id)
+        SELECT 'plan-' || g || '-' || gen_random_uuid() || '@example.com', 'plan', gen_random_uuid()
+        FROM generate_series(1, {USERS}) g
+        RETURNING id
+    ), new_credits AS (
+        INSERT INTO credits (user_id, balance) SELECT id, 10 FROM new_users
+    ), new_keys AS (
+        INSERT INTO api_keys (user_id, key_prefix, key_hash, name)
+        SELECT u.id, 'vz-sk_' || substr(md5(random()::text), 1, 2), md5(gen_random_uuid()::text), 'plan'
+        FROM new_users u, generate_series(1, {KEYS_PER_USER})
+        RETURNING id, user_id
+    ), new_transactions AS (
+        INSERT INTO credit_transactions (user_id, amount, type, description, created_at)
+        SELECT u.id, -0.01, 'usage', 'gpt-4o', now() - random() * interval '60 days'
+        FROM new_users u, generate_series(1, {TRANSACTIONS_PER_USER})
+    )
+    INSERT INTO usage_logs (
+        user_id, api_key_id, provider, model, input_tokens, output_tokens, total_tokens,
+        provider_cost, vuzo_cost, response_time_ms, status_code, created_at
+    )
+    SELECT k.user_id, k.id, 'openai', (ARRAY{list(MODELS)})[1 + (g % {len(MODELS)})], 100, 50, 150,
+           0.001, 0.0012, 300, 200, now() - random() * interval '60 days'
+    FROM new_keys k, generate_series(1, {LOGS_PER_KEY}) g
+"""
+
+
+class _RecordingPool:
+    """Passes queries through to the real pool, keeping (sql, args) for EXPLAIN."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.statements: list[tuple[str, tuple]] = []
+
+    def __getattr__(self, name):
+        method = getattr(self.pool, name)
+
+        async def record(sql, *args, **kwargs):
+            self.statements.append((sql, args))
+            return await method(sql, *args, **kwargs)
+        return record
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _nodes(child)
+
+
+def _table(node: dict) -> str | None:
+    """The table a scan node reads, with usage_logs partitions (the default one too) mapped to usage_logs."""
+    relation = node.get("Relation Name")
+    if relation and relation.startswith("usage_logs_"):
+        return "usage_logs"
+    return relation
+
+
+@pytest.fixture(scope="module")
+def seeded(pg_dsn):
+    """One seeded user's identifiers, after ANALYZE."""
+    import asyncpg
+
+    async def seed():
+        conn = await asyncpg.connect(pg_dsn)
+        try:
+            await conn.execute(_SEED_SQL)
+            await conn.execute("ANALYZE")
+            return dict(await conn.fetchrow(
+                """
+                SELECT u.id::text AS user_id, u.supabase_auth_id::text AS auth_id, k.key_hash
+                FROM users u JOIN api_keys k ON k.user_id = u.id
+                WHERE u.name = 'plan'
+                LIMIT 1
+                """
+            ))
+        finally:
+            await conn.close()
+
+    return asyncio.run(seed())
+
+
+def _plans(pg_dsn, call) -> list[tuple[str, dict]]:
+    """Run `call(repo)` against the seeded database; (sql, plan) for each statement it sent."""
+    async def scenario():
+        pool = await database.init_pg_pool(pg_dsn, min_size=1, max_size=1)
+        try:
+            recording = _RecordingPool(pool)
+            with patch("app.models.repository.get_pg_pool", return_value=recording):
+                await call(repo)
+            plans = []
+            for sql, args in recording.statements:
+                explained = await pool.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *args)
+                plans.append((sql, json.loads(explained)[0]["Plan"]))
+            return plans
+        finally:
+            await database.close_pg_pool()
+
+    return asyncio.run(scenario())
+
+
+# Date bounds inside the seeded 60 days, so the filters select real rows and
+# partitions whatever day the suite runs.
+_NOW = datetime.now(timezone.utc)
+RANGE_START = (_NOW - timedelta(days=30)).date().isoformat()
+RANGE_END = _NOW.date().isoformat()
+CURSOR_AT = (_NOW - timedelta(days=10)).isoformat()
+
+HOT_QUERIES = {
+    "find_api_key": ("api_keys", lambda r, s: r.find_api_key(s["key_hash"])),
+    "find_user_by_auth_id": ("users", lambda r, s: r.find_user_by_auth_id(s["auth_id"])),
+    "get_balance": ("credits", lambda r, s: r.get_balance(s["user_id"])),
+    "get_balances": ("credits", lambda r, s: r.get_balances([s["user_id"], str(uuid.uuid4())])),
+    "list_api_keys": ("api_keys", lambda r, s: r.list_api_keys(s["user_id"])),
+    "list_transactions": ("credit_transactions", lambda r, s: r.list_transactions(s["user_id"], 20, 0)),
+    "list_transactions_after": ("credit_transactions", lambda r, s: r.list_transactions(
+        s["user_id"], 20, 0, after=(CURSOR_AT, str(uuid.uuid4())),
+    )),
+    "list_usage_logs": ("usage_logs", lambda r, s: r.list_usage_logs(
+        s["user_id"], None, None, None, None, 50, 0,
+    )),
+    "list_usage_logs_by_model": ("usage_logs", lambda r, s: r.list_usage_logs(
+        s["user_id"], "gpt-4o", None, None, None, 50, 0,
+    )),
+    "list_usage_logs_in_range": ("usage_logs", lambda r, s: r.list_usage_logs(
+        s["user_id"], None, "openai", RANGE_START, RANGE_END, 50, 0,
+    )),
+    "list_usage_logs_after": ("usage_logs", lambda r, s: r.list_usage_logs(
+        s["user_id"], "gpt-4o", None, None, None, 50, 0,
+        after=(CURSOR_AT, str(uuid.uuid4())),
+    )),
+    "usage_summary": ("usage_logs", lambda r, s: r.usage_summary(s["user_id"], RANGE_START, None, "model")),
+    "usage_series": ("usage_hourly", lambda r, s: r.usage_series(
+        s["user_id"], "day", "Europe/Berlin", RANGE_START, None, None, None, ["model"],
+    )),
+}
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_an_index(pg_dsn, seeded, name):
+    table, call = HOT_QUERIES[name]
+    plans = _plans(pg_dsn, lambda r: call(r, seeded))
+    assert plans, f"{name} sent no statements"
+    for sql, plan in plans:
+        nodes = list(_nodes(plan))
+        seq_scans = [_table(n) for n in nodes if n["Node Type"] == "Seq Scan" and _table(n) in LARGE_TABLES]
+        assert not seq_scans, f"{name} scans {seq_scans} sequentially:\n{sql}"
+    index_tables = {
+        _table(n) for _, plan in plans for n in _nodes(plan)
+        if n["Node Type"] in ("Index Scan", "Index Only Scan", "Bitmap Heap Scan")
+    }
+    assert table in index_tables, f"{name} reads {table} without an index"
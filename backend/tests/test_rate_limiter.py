@@ -1,101 +1,163 @@
-"""Tests for the Supabase-backed rate limiter middleware."""
-import time
+"""Tests for the in-memory GCRA rate limiter and its middleware."""
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, patch
+from fastapi import HTTPException
 from starlette.testclient import TestClient
 from starlette.applications import Starlette
-from starlette.responses import PlainTextResponse
+from starlette.responses import PlainTextResponse, StreamingResponse
 from starlette.routing import Route
 from starlette.requests import Request
 
-from app.middleware.rate_limiter import RateLimiterMiddleware
+from app.middleware.rate_limiter import GCRALimiter, RateLimiterMiddleware
+from app.models.schemas import AuthContext
 
 
-def _make_app(rpm_limit: int = 3):
+def _make_app():
     """Build a minimal Starlette app wrapped with RateLimiterMiddleware."""
     async def homepage(request: Request):
         return PlainTextResponse("ok")
 
-    app = Starlette(routes=[Route("/", homepage)])
+    async def stream(request: Request):
+        async def chunks():
+            for n in range(3):
+                yield f"data: {n}\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    app = Starlette(routes=[Route("/", homepage), Route("/stream", stream)])
     app.add_middleware(RateLimiterMiddleware)
     return app
 
 
-def _auth_header(prefix: str = "aabbccdd") -> dict:
-    return {"Authorization": f"Bearer vz-{prefix}xyz"}
+def _auth_header(key: str = "vz-sk_aabbccdd0011") -> dict:
+    return {"Authorization": f"Bearer {key}"}
+
+
+def _ctx(key_id: str = "key-1", rpm: int = 3) -> AuthContext:
+    return AuthContext(user_id="user-1", api_key_id=key_id, rate_limit_rpm=rpm)
+
+
+@pytest.fixture
+def limiter():
+    fresh = GCRALimiter(burst_seconds=60)
+    with patch("app.middleware.rate_limiter.rate_limiter", fresh):
+        yield fresh
+
+
+class TestGCRA:
+    def test_burst_then_paced(self):
+        limiter = GCRALimiter(burst_seconds=60)
+        decisions = [limiter.check("k", 60, now=100.0) for _ in range(61)]
+        assert all(d.allowed for d in decisions[:60])
+        assert [d.remaining for d in decisions[:3]] == [59, 58, 57]
+        refused = decisions[60]
+        assert not refused.allowed
+        assert refused.retry_after == pytest.approx(1.0)
+        # one request's worth of quota comes back every 60/rpm seconds
+        assert limiter.check("k", 60, now=100.5).allowed is False
+        assert limiter.check("k", 60, now=101.0).allowed is True
+
+    def test_burst_seconds_limits_back_to_back_requests(self):
+        limiter = GCRALimiter(burst_seconds=10)
+        allowed = sum(limiter.check("k", 60, now=0.0).allowed for _ in range(20))
+        assert allowed == 10
+
+    def test_sustained_rate_matches_rpm(self):
+        limiter = GCRALimiter(burst_seconds=0)
+        # one attempt every 100 ms for two minutes at 30 rpm
+        allowed = sum(limiter.check("k", 30, now=i / 10).allowed for i in range(1200))
+        assert allowed == 60
+
+    def test_keys_have_separate_buckets(self):
+        limiter = GCRALimiter(burst_seconds=0)
+        assert limiter.check("a", 1, now=0.0).allowed
+        assert not limiter.check("a", 1, now=1.0).allowed
+        assert limiter.check("b", 1, now=1.0).allowed
+
+    def test_full_bucket_admits_at_any_clock_value(self):
+        """Rounding in large monotonic timestamps must not refuse a fresh key."""
+        for now in (210.605, 2037.403, 8174.326, 32724.141):
+            assert GCRALimiter().check("k", 1, now=now).allowed
+            limiter = GCRALimiter()
+            assert [limiter.check("k", 3, now=now + n / 1000).remaining for n in range(3)] == [2, 1, 0]
+
+    def test_full_buckets_swept(self):
+        limiter = GCRALimiter()
+        limiter.check("idle", 60, now=0.0)
+        limiter._last_sweep = 0.0
+        limiter.check("busy", 60, now=120.0)
+        assert limiter.stats()["keys"] == 1
 
 
 class TestRateLimiterPassthrough:
-    def test_non_vuzo_key_passes_through(self):
-        """Requests without a vz- key bypass the rate limiter entirely."""
-        with patch("app.middleware.rate_limiter.get_supabase") as mock_sb:
-            app = _make_app()
-            client = TestClient(app, raise_server_exceptions=False)
+    def test_non_vuzo_key_passes_through(self, limiter):
+        with patch("app.middleware.rate_limiter.lookup_api_key") as lookup:
+            client = TestClient(_make_app(), raise_server_exceptions=False)
             resp = client.get("/", headers={"Authorization": "Bearer sk-openai-key"})
             assert resp.status_code == 200
-            mock_sb.assert_not_called()
+            lookup.assert_not_called()
 
-    def test_no_auth_header_passes_through(self):
-        with patch("app.middleware.rate_limiter.get_supabase") as mock_sb:
-            app = _make_app()
-            client = TestClient(app, raise_server_exceptions=False)
+    def test_no_auth_header_passes_through(self, limiter):
+        with patch("app.middleware.rate_limiter.lookup_api_key") as lookup:
+            client = TestClient(_make_app(), raise_server_exceptions=False)
             resp = client.get("/")
             assert resp.status_code == 200
-            mock_sb.assert_not_called()
+            lookup.assert_not_called()
 
+    def test_rejected_key_left_to_route_auth(self, limiter):
+        lookup = AsyncMock(side_effect=HTTPException(status_code=401, detail="Invalid API key"))
+        with patch("app.middleware.rate_limiter.lookup_api_key", lookup):
+            client = TestClient(_make_app(), raise_server_exceptions=False)
+            assert client.get("/", headers=_auth_header()).status_code == 200
+        assert limiter.stats()["keys"] == 0
 
-class TestRateLimiterEnforcement:
-    def _mock_supabase(self, current_count: int):
-        """Return a mock Supabase client that reports `current_count` requests in window."""
-        mock_sb = MagicMock()
-
-        count_chain = MagicMock()
-        count_chain.execute.return_value = MagicMock(count=current_count)
-        mock_sb.table.return_value.select.return_value \
-            .eq.return_value.gte.return_value = count_chain
-
-        insert_chain = MagicMock()
-        insert_chain.execute.return_value = MagicMock()
-        mock_sb.table.return_value.insert.return_value = insert_chain
-
-        delete_chain = MagicMock()
-        delete_chain.execute.return_value = MagicMock()
-        mock_sb.table.return_value.delete.return_value.lt.return_value = delete_chain
-
-        return mock_sb
-
-    def test_under_limit_allowed(self):
-        mock_sb = self._mock_supabase(current_count=30)
-        with patch("app.middleware.rate_limiter.get_supabase", return_value=mock_sb):
-            app = _make_app()
-            client = TestClient(app, raise_server_exceptions=False)
-            resp = client.get("/", headers=_auth_header())
-            assert resp.status_code == 200
+    def test_lookup_failure_allows_request(self, limiter):
+        """If the database is unreachable the request must still succeed (fail open)."""
+        lookup = AsyncMock(side_effect=Exception("Connection refused"))
+        with patch("app.middleware.rate_limiter.lookup_api_key", lookup):
+            client = TestClient(_make_app(), raise_server_exceptions=False)
+            assert client.get("/", headers=_auth_header()).status_code == 200
 
-    def test_at_limit_blocked(self):
-        mock_sb = self._mock_supabase(current_count=60)
-        with patch("app.middleware.rate_limiter.get_supabase", return_value=mock_sb):
-            app = _make_app()
-            client = TestClient(app, raise_server_exceptions=False)
-            resp = client.get("/", headers=_auth_header())
-            assert resp.status_code == 429
 
-    def test_429_response_body(self):
-        mock_sb = self._mock_supabase(current_count=60)
-        with patch("app.middleware.rate_limiter.get_supabase", return_value=mock_sb):
-            app = _make_app()
-            client = TestClient(app, raise_server_exceptions=False)
-            resp = client.get("/", headers=_auth_header())
-            body = resp.json()
-            assert "error" in body
-            assert body["error"]["type"] == "rate_limit_error"
-
-    def test_supabase_failure_allows_request(self):
-        """If Supabase is unreachable the request must still succeed (fail open)."""
-        mock_sb = MagicMock()
-        mock_sb.table.side_effect = Exception("Connection refused")
-        with patch("app.middleware.rate_limiter.get_supabase", return_value=mock_sb):
-            app = _make_app()
-            client = TestClient(app, raise_server_exceptions=False)
+class TestRateLimiterEnforcement:
+    def test_uses_key_rpm_and_sets_headers(self, limiter):
+        with patch("app.middleware.rate_limiter.lookup_api_key", AsyncMock(return_value=_ctx(rpm=3))):
+            client = TestClient(_make_app(), raise_server_exceptions=False)
+            responses = [client.get("/", headers=_auth_header()) for _ in range(4)]
+        assert [r.status_code for r in responses] == [200, 200, 200, 429]
+        assert responses[0].headers["X-RateLimit-Limit"] == "3"
+        assert [r.headers["X-RateLimit-Remaining"] for r in responses[:3]] == ["2", "1", "0"]
+        assert "Retry-After" not in responses[0].headers
+
+    def test_429_response(self, limiter):
+        with patch("app.middleware.rate_limiter.lookup_api_key", AsyncMock(return_value=_ctx(rpm=1))):
+            client = TestClient(_make_app(), raise_server_exceptions=False)
+            client.get("/", headers=_auth_header())
             resp = client.get("/", headers=_auth_header())
-            assert resp.status_code == 200
+        assert resp.status_code == 429
+        assert resp.json()["error"]["type"] == "rate_limit_error"
+        assert 1 <= int(resp.headers["Retry-After"]) <= 60
+        assert resp.headers["X-RateLimit-Remaining"] == "0"
+
+    def test_bucket_is_per_key_not_per_prefix(self, limiter):
+        """Keys sharing the `vz-sk_xx` prefix no longer share a bucket."""
+        contexts = {"vz-sk_aa111": _ctx("key-1", rpm=1), "vz-sk_aa222": _ctx("key-2", rpm=1)}
+        lookup = AsyncMock(side_effect=lambda token: contexts[token])
+        with patch("app.middleware.rate_limiter.lookup_api_key", lookup):
+            client = TestClient(_make_app(), raise_server_exceptions=False)
+            assert client.get("/", headers=_auth_header("vz-sk_aa111")).status_code == 200
+            assert client.get("/", headers=_auth_header("vz-sk_aa222")).status_code == 200
+            assert client.get("/", headers=_auth_header("vz-sk_aa111")).status_code == 429
+
+    def test_zero_rpm_is_unlimited(self, limiter):
+        with patch("app.middleware.rate_limiter.lookup_api_key", AsyncMock(return_value=_ctx(rpm=0))):
+            client = TestClient(_make_app(), raise_server_exceptions=False)
+            assert all(client.get("/", headers=_auth_header()).status_code == 200 for _ in range(5))
+
+    def test_stream_passes_through_with_headers(self, limiter):
+        with patch("app.middleware.rate_limiter.lookup_api_key", AsyncMock(return_value=_ctx(rpm=3))):
+            client = TestClient(_make_app(), raise_server_exceptions=False)
+            resp = client.get("/stream", headers=_auth_header())
+        assert resp.status_code == 200
+        assert resp.text == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        assert resp.headers["X-RateLimit-Remaining"] == "2"
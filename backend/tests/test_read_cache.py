@@ -0,0 +1,130 @@
+"""Tests for the per-user read-model cache (app/services/read_cache.py)."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.read_cache import ReadModelCache, _is_closed
+from app.services.usage_service import get_usage_summary
+
+NOW = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def _get(cache, load, kind="summary", params=("p",), end_date=None, user_id="user-1"):
+    return asyncio.run(cache.get(user_id, kind, params, load, end_date=end_date))
+
+
+def test_is_closed():
+    assert not _is_closed(None, NOW)
+    assert not _is_closed("not a date", NOW)
+    assert not _is_closed("2026-03-10T11:30:00Z", NOW)
+    assert _is_closed("2026-03-10T10:59:00Z", NOW)
+    assert _is_closed("2026-02-28", NOW)  # naive dates are UTC
+
+
+def test_balance_cached_until_invalidated():
+    cache = ReadModelCache()
+    load = AsyncMock(side_effect=[1.0, 2.0])
+    assert _get(cache, load, "balance", None) == 1.0
+    assert _get(cache, load, "balance", None) == 1.0
+    cache.invalidate_balance("user-1")
+    assert _get(cache, load, "balance", None) == 2.0
+    assert load.await_count == 2
+    assert cache.stats()["by_kind"]["balance"] == {"hits": 1, "misses": 2, "hit_rate": 0.3333}
+
+
+def test_invalidation_is_per_user():
+    cache = ReadModelCache()
+    load = AsyncMock(return_value={"total_requests": 1})
+    _get(cache, load, user_id="a")
+    _get(cache, load, user_id="b")
+    cache.invalidate_usage("a")
+    _get(cache, load, user_id="a")
+    _get(cache, load, user_id="b")
+    assert load.await_count == 3
+
+
+def test_evicted_version_does_not_revive_old_entries():
+    cache = ReadModelCache(maxsize=2)
+    load = AsyncMock(side_effect=[{"v": 1}, {"v": 2}])
+    _get(cache, load, user_id="a")  # stored under version 0
+    cache.invalidate_usage("a")
+    cache.invalidate_usage("b")
+    cache.invalidate_usage("c")  # evicts a's version
+    assert _get(cache, load, user_id="a") == {"v": 2}
+    assert load.await_count == 2
+
+
+def test_load_racing_a_write_is_not_stored():
+    cache = ReadModelCache()
+
+    async def load():
+        cache.invalidate_usage("user-1")  # rows land while the query runs
+        return {"total_requests": 1}
+
+    _get(cache, load)
+    assert cache.stats()["live"]["size"] == 0
+
+
+def test_closed_range_survives_new_usage_but_not_late_rows():
+    cache = ReadModelCache()
+    load = AsyncMock(side_effect=[{"v": 1}, {"v": 2}])
+    closed = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+    _get(cache, load, end_date=closed)
+    cache.invalidate_usage("user-1", datetime.now(timezone.utc))
+    assert _get(cache, load, end_date=closed) == {"v": 1}
+    cache.invalidate_usage("user-1", datetime.now(timezone.utc) - timedelta(days=40))  # outbox backlog
+    assert _get(cache, load, end_date=closed) == {"v": 2}
+    assert cache.stats()["closed_ranges"]["size"] == 2
+
+
+def test_open_ranges_expire_after_ttl():
+    cache = ReadModelCache(ttl=30)
+    load = AsyncMock(return_value=[])
+    with patch("app.utils.cache.time.monotonic", return_value=100.0):
+        _get(cache, load, "daily")
+    with patch("app.utils.cache.time.monotonic", return_value=129.0):
+        _get(cache, load, "daily")
+    with patch("app.utils.cache.time.monotonic", return_value=131.0):
+        _get(cache, load, "daily")
+    assert load.await_count == 2
+
+
+def test_closed_ranges_are_reread_hourly():
+    # Late rows written by another worker don't bump this worker's versions.
+    cache = ReadModelCache()
+    load = AsyncMock(side_effect=[{"v": 1}, {"v": 2}])
+    with patch("app.utils.cache.time.monotonic", return_value=100.0):
+        _get(cache, load, end_date="2020-01-01")
+    with patch("app.utils.cache.time.monotonic", return_value=100.0 + 3599):
+        assert _get(cache, load, end_date="2020-01-01") == {"v": 1}
+    with patch("app.utils.cache.time.monotonic", return_value=100.0 + 3601):
+        assert _get(cache, load, end_date="2020-01-01") == {"v": 2}
+
+
+def test_zero_ttl_only_caches_closed_ranges():
+    cache = ReadModelCache(ttl=0)
+    load = AsyncMock(return_value={"v": 1})
+    _get(cache, load)
+    _get(cache, load)
+    _get(cache, load, end_date="2020-01-01")
+    _get(cache, load, end_date="2020-01-01")
+    assert load.await_count == 3
+
+
+def test_summary_service_reads_through_cache():
+    repo = MagicMock(usage_summary=AsyncMock(return_value={"total_requests": 4}))
+    with patch("app.services.usage_service.get_repository", return_value=repo):
+        for _ in range(3):
+            asyncio.run(get_usage_summary("user-1", "2026-01-01", "2026-02-01", "model"))
+    repo.usage_summary.assert_awaited_once_with(
+        "user-1", "2026-01-01T00:00:00+00:00", "2026-02-01T23:59:59.999999+00:00", "model"
+    )
+
+
+def test_summary_date_bounds_are_local_days():
+    repo = MagicMock(usage_summary=AsyncMock(return_value={"total_requests": 0}))
+    with patch("app.services.usage_service.get_repository", return_value=repo):
+        asyncio.run(get_usage_summary("user-1", "2026-03-01", "2026-03-01", time_zone="Europe/Berlin"))
+    repo.usage_summary.assert_awaited_once_with(
+        "user-1", "2026-02-28T23:00:00+00:00", "2026-03-01T22:59:59.999999+00:00", None
+    )
@@ -0,0 +1,108 @@
+"""Tests for provider routing (app/services/providers/registry.py)."""
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi import HTTPException
+
+from app.config import OpenAICompatibleVendor
+from app.services import pricing_service
+from app.services.providers.registry import ProviderRegistry
+from app.services.providers.openai_compatible import OpenAICompatibleProvider
+from app.services.providers.google import GoogleProvider
+from app.services.providers.anthropic import AnthropicProvider
+
+
+def _row(model: str, provider: str) -> dict:
+    return {"model_name": model, "provider": provider}
+
+
+class TestBuildRoutes:
+    def test_builtin_providers_routed_by_pricing_column(self):
+        registry = ProviderRegistry()
+        routes = registry.build_routes([
+            _row("gpt-4o", "openai"),
+            _row("grok-3", "xai"),
+            _row("gemini-2.0-flash", "google"),
+            _row("claude-haiku-4-5", "anthropic"),
+        ])
+        assert routes["gpt-4o"].provider.base_url == "https://api.openai.com/v1"
+        assert routes["grok-3"].provider.base_url == "https://api.x.ai/v1"
+        assert isinstance(routes["gemini-2.0-flash"].provider, GoogleProvider)
+        assert isinstance(routes["claude-haiku-4-5"].provider, AnthropicProvider)
+
+    def test_new_model_for_known_provider_needs_no_code(self):
+        registry = ProviderRegistry()
+        routes = registry.build_routes([_row("gpt-5-brand-new", "openai")])
+        assert "gpt-5-brand-new" in routes
+
+    def test_unknown_provider_is_skipped(self):
+        registry = ProviderRegistry()
+        routes = registry.build_routes([_row("mystery-1", "mystery")])
+        assert routes == {}
+
+    def test_route_carries_pricing_row(self):
+        registry = ProviderRegistry()
+        row = _row("gpt-4o", "openai")
+        assert registry.build_routes([row])["gpt-4o"].pricing is row
+
+
+class TestConfiguredVendors:
+    def test_vendor_declared_in_config(self):
+        registry = ProviderRegistry()
+        registry.configure([OpenAICompatibleVendor(name="deepseek", base_url="https://api.deepseek.com/v1/")])
+        routes = registry.build_routes([_row("deepseek-chat", "deepseek")])
+        adapter = routes["deepseek-chat"].provider
+        assert isinstance(adapter, OpenAICompatibleProvider)
+        assert adapter.base_url == "https://api.deepseek.com/v1"
+        assert adapter._headers("k")["Authorization"] == "Bearer k"
+
+    def test_raw_key_auth_header(self):
+        registry = ProviderRegistry()
+        registry.configure([OpenAICompatibleVendor(
+            name="azure", base_url="https://example.openai.azure.com/v1",
+            auth_header="api-key", auth_scheme="",
+        )])
+        headers = registry.get("azure")._headers("secret")
+        assert headers["api-key"] == "secret"
+        assert "Authorization" not in headers
+
+
+class TestGetRoute:
+    def _load(self, rows):
+        mock_sb = MagicMock()
+        tables = {"model_pricing": MagicMock(), "provider_keys": MagicMock()}
+        tables["model_pricing"].select.return_value.eq.return_value.order.return_value \
+            .execute.return_value = MagicMock(data=rows)
+        tables["provider_keys"].select.return_value.eq.return_value \
+            .execute.return_value = MagicMock(data=[])
+        mock_sb.table.side_effect = lambda name: tables[name]
+        with patch("app.services.pricing_service.get_supabase", return_value=mock_sb):
+            pricing_service.refresh_catalog()
+
+    def teardown_method(self):
+        pricing_service._snapshot = None
+
+    def test_routes_known_model(self):
+        self._load([_row("gpt-4o-mini", "openai")])
+        route = pricing_service.get_route("gpt-4o-mini")
+        assert route.pricing["provider"] == "openai"
+
+    def test_unknown_model_is_400(self):
+        self._load([_row("gpt-4o-mini", "openai")])
+        with pytest.raises(HTTPException) as exc:
+            pricing_service.get_route("nope")
+        assert exc.value.status_code == 400
+        assert "not available" in exc.value.detail
+
+    def test_model_without_adapter_is_400(self):
+        self._load([_row("mystery-1", "mystery")])
+        with pytest.raises(HTTPException) as exc:
+            pricing_service.get_route("mystery-1")
+        assert exc.value.status_code == 400
+        assert "No provider found" in exc.value.detail
+
+    def test_hot_reload_picks_up_new_model(self):
+        self._load([_row("gpt-4o-mini", "openai")])
+        with pytest.raises(HTTPException):
+            pricing_service.get_route("gpt-4.1")
+        self._load([_row("gpt-4o-mini", "openai"), _row("gpt-4.1", "openai")])
+        assert pricing_service.get_route("gpt-4.1").pricing["model_name"] == "gpt-4.1"
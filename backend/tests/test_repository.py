@@ -0,0 +1,274 @@
+"""Tests for the async data-access layer (app/models/repository.py)."""
+import asyncio
+import threading
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.models import database
+from app.models.repository import (
+    get_repository,
+    postgres_repository,
+    supabase_repository,
+)
+from app.services.usage_service import get_daily_usage, get_usage_logs, get_usage_series
+
+
+class TestBackendSelection:
+    def test_supabase_without_pool(self):
+        with patch("app.models.repository.get_pg_pool", return_value=None):
+            assert get_repository() is supabase_repository
+
+    def test_postgres_with_pool(self):
+        with patch("app.models.repository.get_pg_pool", return_value=MagicMock()):
+            assert get_repository() is postgres_repository
+
+
+class TestSupabaseRepository:
+    def test_queries_run_off_the_event_loop_thread(self):
+        loop_thread = threading.get_ident()
+        seen = []
+
+        def fake_get_supabase():
+            seen.append(threading.get_ident())
+            mock_sb = MagicMock()
+            mock_sb.table.return_value.select.return_value.eq.return_value \
+                .execute.return_value = MagicMock(data=[{"balance": "1.5"}])
+            return mock_sb
+
+        with patch("app.models.repository.get_supabase", side_effect=fake_get_supabase):
+            assert asyncio.run(supabase_repository.get_balance("user-1")) == 1.5
+        assert seen and seen[0] != loop_thread
+
+    def test_find_api_key_flattens_embedded_user(self):
+        mock_sb = MagicMock()
+        mock_sb.table.return_value.select.return_value.eq.return_value.limit.return_value \
+            .execute.return_value = MagicMock(data=[{
+                "id": "key-1", "user_id": "user-1", "is_active": True,
+                "rate_limit_rpm": 60, "users": {"is_active": False},
+            }])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            row = asyncio.run(supabase_repository.find_api_key("hash"))
+        assert row["user_is_active"] is False
+        assert "users" not in row
+
+    def test_usage_series_is_one_rpc(self):
+        mock_sb = MagicMock()
+        mock_sb.rpc.return_value.execute.return_value = MagicMock(data=[
+            {"bucket": "2026-02-11", "model": "gpt-4o", "provider": "openai", "api_key_id": None,
+             "total_requests": 2, "total_input_tokens": 30, "total_output_tokens": 10, "total_tokens": 40,
+             "total_provider_cost": "0.15", "total_vuzo_cost": "0.3"},
+        ])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            daily = asyncio.run(get_daily_usage("user-1", time_zone="Europe/Berlin"))
+        mock_sb.rpc.assert_called_once_with("usage_series", {
+            "p_user_id": "user-1", "p_bucket": "day", "p_time_zone": "Europe/Berlin",
+            "p_start_date": None, "p_end_date": None, "p_model": None, "p_provider": None,
+            "p_group_by": ["model", "provider"],
+        })
+        mock_sb.table.assert_not_called()
+        assert daily == [{
+            "date": "2026-02-11", "model": "gpt-4o", "provider": "openai",
+            "total_requests": 2, "input_tokens": 30, "output_tokens": 10, "total_cost": 0.3,
+        }]
+
+    def test_date_only_bounds_are_local_days(self):
+        mock_sb = MagicMock()
+        mock_sb.rpc.return_value.execute.return_value = MagicMock(data=[])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            asyncio.run(get_usage_series(
+                "user-1", "day", "Europe/Berlin", start_date="2026-03-01", end_date="2026-03-31"
+            ))
+            asyncio.run(get_usage_series("user-1", "hour", "Europe/Berlin", start_date="2026-03-01T05:00:00Z"))
+        local_days, timestamps = (c.args[1] for c in mock_sb.rpc.call_args_list)
+        # CET midnight on the 1st; the 31st ends at CEST midnight.
+        assert local_days["p_start_date"] == "2026-02-28T23:00:00+00:00"
+        assert local_days["p_end_date"] == "2026-03-31T21:59:59.999999+00:00"
+        assert (timestamps["p_start_date"], timestamps["p_end_date"]) == ("2026-03-01T05:00:00Z", None)
+
+    def test_keyset_page_filters_after_cursor(self):
+        mock_sb = MagicMock()
+        query = mock_sb.table.return_value.select.return_value.eq.return_value
+        query.order.return_value.order.return_value.or_.return_value.limit.return_value \
+            .execute.return_value = MagicMock(data=[])
+        after = ("2026-03-01T12:00:00.5+00:00", "6f1c5a52-5b3f-4c1b-9d3e-1a2b3c4d5e6f")
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            asyncio.run(supabase_repository.list_transactions("user-1", 51, 0, after))
+        query.order.return_value.order.return_value.or_.assert_called_once_with(
+            'created_at.lt."2026-03-01T12:00:00.5+00:00",'
+            'and(created_at.eq."2026-03-01T12:00:00.5+00:00",id.lt.6f1c5a52-5b3f-4c1b-9d3e-1a2b3c4d5e6f)'
+        )
+        query.order.return_value.order.return_value.or_.return_value.limit.assert_called_once_with(51)
+
+    def test_iter_usage_logs_walks_keyset_pages(self):
+        pages = [
+            [{"id": "a", "created_at": "2026-03-01T12:00:00+00:00"}, {"id": "b", "created_at": "2026-03-01T12:00:01+00:00"}],
+            [{"id": "c", "created_at": "2026-03-01T12:00:02+00:00"}],
+        ]
+        mock_sb = MagicMock()
+        ordered = mock_sb.table.return_value.select.return_value.eq.return_value.order.return_value.order.return_value
+        ordered.limit.return_value.execute.return_value = MagicMock(data=pages[0])
+        ordered.or_.return_value.limit.return_value.execute.return_value = MagicMock(data=pages[1])
+
+        async def collect():
+            return [b async for b in supabase_repository.iter_usage_logs(
+                "user-1", None, None, None, None, ("id", "created_at"), 2
+            )]
+
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            batches = asyncio.run(collect())
+        assert batches == pages
+        ordered.or_.assert_called_once_with(
+            'created_at.gt."2026-03-01T12:00:01+00:00",and(created_at.eq."2026-03-01T12:00:01+00:00",id.gt.b)'
+        )
+
+    def test_usage_summary_is_one_rpc(self):
+        mock_sb = MagicMock()
+        mock_sb.rpc.return_value.execute.return_value = MagicMock(data=[
+            {"is_total": True, "group_key": None, "total_requests": 3, "total_input_tokens": 30,
+             "total_output_tokens": 15, "total_tokens": 45, "total_provider_cost": "0.4375",
+             "total_vuzo_cost": "0.875"},
+            {"is_total": False, "group_key": "gpt-4o", "total_requests": 2, "total_input_tokens": 20,
+             "total_output_tokens": 10, "total_tokens": 30, "total_provider_cost": "0.375",
+             "total_vuzo_cost": "0.75"},
+        ])
+        with patch("app.models.repository.get_supabase", return_value=mock_sb):
+            summary = asyncio.run(supabase_repository.usage_summary("user-1", "2026-03-01", None, "model"))
+        mock_sb.rpc.assert_called_once_with("usage_summary", {
+            "p_user_id": "user-1", "p_start_date": "2026-03-01", "p_end_date": None, "p_group_by": "model",
+        })
+        mock_sb.table.assert_not_called()
+        assert summary["total_requests"] == 3
+        assert summary["total_vuzo_cost"] == 0.875
+        assert summary["groups"] == [{
+            "key": "gpt-4o", "total_requests": 2, "total_input_tokens": 20, "total_output_tokens": 10,
+            "total_tokens": 30, "total_provider_cost": 0.375, "total_vuzo_cost": 0.75,
+        }]
+
+
+class TestPostgresRepository:
+    """Round trips against a local Postgres (TEST_DATABASE_URL)."""
+
+    @pytest.fixture
+    def run(self, pg_dsn):
+        """Run a coroutine with a single-connection pool open for its duration."""
+        def runner(coro_fn):
+            async def scenario():
+                await database.init_pg_pool(pg_dsn, min_size=1, max_size=1)
+                try:
+                    return await coro_fn()
+                finally:
+                    await database.close_pg_pool()
+            return asyncio.run(scenario())
+        return runner
+
+    def test_user_key_and_balance_round_trip(self, run):
+        auth_id = str(uuid.uuid4())
+
+        async def scenario():
+            repo = get_repository()
+            assert repo is postgres_repository
+            user_id = await repo.create_user(auth_id, f"{auth_id}@example.com", "dev")
+            found = await repo.find_user_by_auth_id(auth_id)
+            key = await repo.insert_api_key(user_id, "vz-sk_ab", f"hash-{auth_id}", "ci")
+            looked_up = await repo.find_api_key(f"hash-{auth_id}")
+            await repo.apply_credit_change(user_id, 12.75, "topup", "ci")
+            _, tx_id = await repo.apply_credit_change(user_id, -0.25, "usage", "gpt-4o")
+            transactions = await repo.list_transactions(user_id, 10, 0)
+            revoked = await repo.deactivate_api_key(user_id, key["id"])
+            assert await repo.get_balances([user_id, str(uuid.uuid4())]) == {user_id: 12.5}
+            return user_id, found, key, looked_up, await repo.get_balance(user_id), tx_id, transactions, revoked
+
+        user_id, found, key, looked_up, balance, tx_id, transactions, revoked = run(scenario)
+        assert found == {"id": user_id, "is_active": True}
+        assert isinstance(key["created_at"], str)
+        assert looked_up == {
+            "id": key["id"], "user_id": user_id, "is_active": True,
+            "rate_limit_rpm": 60, "rate_limit_tpm": 200000, "max_concurrent_requests": 20,
+            "user_is_active": True,
+        }
+        assert balance == 12.5
+        assert transactions[0]["id"] == tx_id
+        assert transactions[0]["amount"] == -0.25
+        assert revoked == [{"id": key["id"], "key_hash": f"hash-{auth_id}"}]
+
+    def test_usage_queries(self, run):
+        auth_id = str(uuid.uuid4())
+
+        async def scenario():
+            repo = get_repository()
+            user_id = await repo.create_user(auth_id, f"{auth_id}@example.com", "dev")
+            key = await repo.insert_api_key(user_id, "vz-sk_cd", f"hash-{auth_id}", "ci")
+            rows = [
+                {
+                    "user_id": user_id, "api_key_id": key["id"], "provider": "openai",
+                    "model": model, "input_tokens": 10, "output_tokens": 5, "total_tokens": 15,
+                    "provider_cost": cost / 2, "vuzo_cost": cost, "response_time_ms": 100,
+                    "status_code": 200, "created_at": datetime(2026, 3, 1, 12, second, tzinfo=timezone.utc),
+                    "event_id": str(uuid.uuid4()),
+                }
+                for second, (model, cost) in enumerate(
+                    (("gpt-4o", 0.5), ("gpt-4o", 0.25), ("gemini-2.0-flash", 0.125))
+                )
+            ]
+            await repo.insert_usage_logs(rows)
+            await repo.insert_usage_logs(rows)  # a replayed batch is skipped
+            logs = await repo.list_usage_logs(user_id, "gpt-4o", None, "2000-01-01", None, 50, 0)
+            first, cursor = await get_usage_logs(user_id, limit=2)
+            second, last_cursor = await get_usage_logs(user_id, limit=2, cursor=cursor)
+            assert [r["created_at"] for r in first + second] == sorted(
+                (r["created_at"].isoformat() for r in rows), reverse=True
+            )
+            assert last_cursor is None
+            exported = []
+            async for batch in repo.iter_usage_logs(user_id, None, None, None, None, ("id", "model"), 2):
+                exported.append(batch)
+                await repo.get_balance(user_id)  # the one pooled connection is free between pages
+            assert [len(b) for b in exported] == [2, 1]
+            assert [r["model"] for r in exported[0]] == ["gpt-4o", "gpt-4o"]
+            assert [set(r) for b in exported for r in b] == [{"id", "model"}] * 3
+            assert exported[1][0]["model"] == "gemini-2.0-flash"
+            summary = await repo.usage_summary(user_id, None, None)
+            by_model = await repo.usage_summary(user_id, None, None, "model")
+            by_key = await repo.usage_summary(user_id, "2026-03-01T12:00:01Z", None, "api_key")
+            daily = await get_daily_usage(user_id)
+            hourly = await repo.usage_series(user_id, "hour", "UTC", None, None, None, None, [])
+            auckland = await repo.usage_series(
+                user_id, "day", "Pacific/Auckland", None, None, "gpt-4o", None, ["api_key"]
+            )
+            # 12:00 UTC on the 1st is already the 2nd in Auckland.
+            auckland_day = await get_usage_series(user_id, "day", "Pacific/Auckland", "2026-03-02", "2026-03-02")
+            return key, logs, summary, by_model, by_key, daily, hourly, auckland, auckland_day
+
+        key, logs, summary, by_model, by_key, daily, hourly, auckland, auckland_day = run(scenario)
+        assert [log["vuzo_cost"] for log in logs] == [0.25, 0.5]
+        assert summary["total_requests"] == 3
+        assert summary["total_tokens"] == 45
+        assert summary["total_vuzo_cost"] == 0.875
+        assert summary["groups"] is None
+        assert by_model["total_requests"] == 3
+        assert [(g["key"], g["total_requests"], g["total_vuzo_cost"]) for g in by_model["groups"]] == [
+            ("gpt-4o", 2, 0.75), ("gemini-2.0-flash", 1, 0.125),
+        ]
+        assert [(g["key"], g["total_requests"]) for g in by_key["groups"]] == [(key["id"], 2)]
+        # read from usage_hourly, which the replayed batch didn't touch
+        assert [(d["model"], d["total_requests"]) for d in daily] == [("gemini-2.0-flash", 1), ("gpt-4o", 2)]
+        assert [(h["bucket"], h["total_requests"], h["total_tokens"]) for h in hourly] == [("2026-03-01T12:00", 3, 45)]
+        assert [(a["bucket"], a["api_key_id"], a["total_vuzo_cost"]) for a in auckland] == [
+            ("2026-03-02", key["id"], 0.75),
+        ]
+        assert [(a["bucket"], a["total_requests"]) for a in auckland_day] == [("2026-03-02", 3)]
+
+    def test_hot_path_statement_prepared_once(self, run):
+        async def scenario():
+            for _ in range(5):
+                await postgres_repository.find_api_key("no-such-hash")
+            return await database.get_pg_pool().fetchval(
+                "SELECT count(*) FROM pg_prepared_statements"
+                " WHERE statement LIKE '%k.key_hash = $1%'"
+                " AND statement NOT LIKE '%pg_prepared_statements%'"
+            )
+
+        assert run(scenario) == 1
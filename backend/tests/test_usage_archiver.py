@@ -0,0 +1,238 @@
+"""Tests for usage_logs partition retention and archival (app/services/usage_archiver.py)."""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.usage_archiver import ARCHIVE_COLUMNS, UsageArchiver, _add_months
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_add_months_crosses_years():
+    jan = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert _add_months(jan, -1) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+    assert _add_months(jan, 13) == datetime(2027, 2, 1, tzinfo=timezone.utc)
+
+
+def test_cutoff_keeps_whole_months():
+    archiver = UsageArchiver()
+    archiver.configure(3, "unused", "")
+    now = datetime(2026, 2, 17, 9, 30, tzinfo=timezone.utc)
+    assert archiver.cutoff(now) == datetime(2025, 11, 1, tzinfo=timezone.utc)
+
+
+def _log(n: int) -> dict:
+    return {
+        "id": f"00000000-0000-0000-0000-{n:012d}", "user_id": "u-1",
+        "api_key_id": "6f1c5a52-5b3f-4c1b-9d3e-1a2b3c4d5e6f", "provider": "openai", "model": "gpt-4o",
+        "input_tokens": 10, "output_tokens": 5, "total_tokens": 15, "provider_cost": 0.125,
+        "vuzo_cost": 0.25, "response_time_ms": 100, "status_code": 200,
+        "created_at": datetime(2025, 6, 1, 12, 0, n, tzinfo=timezone.utc), "event_id": None,
+    }
+
+
+class FakeConn:
+    """Records the SQL a pass runs; serves partitions and rows from lists."""
+
+    def __init__(self, partitions: list[dict], rows: list[dict]):
+        self.partitions = partitions
+        self.rows = rows
+        self.executed: list[tuple] = []
+
+    async def fetchval(self, sql, *args):
+        self.executed.append((sql, *args))
+        return True
+
+    async def fetch(self, sql, *args):
+        return self.partitions
+
+    async def execute(self, sql, *args):
+        self.executed.append((sql, *args))
+
+    async def cursor(self, sql, prefetch):
+        self.executed.append((sql,))
+        for row in self.rows:
+            yield row
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs):
+        yield
+
+
+def _run_pass(tmp_path, partitions, rows, now=datetime(2026, 2, 10, tzinfo=timezone.utc)):
+    conn = FakeConn(partitions, rows)
+
+    @asynccontextmanager
+    async def acquire():
+        yield conn
+
+    pool = MagicMock(acquire=acquire)
+    repo = MagicMock(ensure_usage_log_partitions=AsyncMock(return_value=1))
+    archiver = UsageArchiver()
+    archiver.configure(3, str(tmp_path), "")
+    with patch("app.services.usage_archiver.get_pg_pool", return_value=pool), \
+            patch("app.services.usage_archiver.get_repository", return_value=repo), \
+            patch.object(archiver, "cutoff", return_value=_add_months(now.replace(day=1), -3)):
+        asyncio.run(archiver.maintain())
+    return archiver, conn
+
+
+def test_archives_expired_partitions_to_parquet(tmp_path):
+    partitions = [
+        {"name": "usage_logs_p202506", "attached": True, "detach_pending": False},
+        {"name": "usage_logs_p202511", "attached": True, "detach_pending": False},
+    ]
+    rows = [_log(n) for n in range(3)]
+    archiver, conn = _run_pass(tmp_path, partitions, rows)
+
+    table = pq.read_table(tmp_path / "usage_logs_p202506.parquet")
+    assert table.column_names == list(ARCHIVE_COLUMNS)
+    assert table.column("id").to_pylist() == [r["id"] for r in rows]
+    assert table.column("created_at").to_pylist()[0] == rows[0]["created_at"]
+    assert not list(tmp_path.glob("*.partial"))
+    assert not (tmp_path / "usage_logs_p202511.parquet").exists()
+
+    statements = [s[0].strip() for s in conn.executed]
+    position = {s: i for i, s in enumerate(statements)}
+    # Exported while attached; detached, recorded and dropped only afterwards.
+    export = next(i for i, s in enumerate(statements) if s.startswith("SELECT") and "usage_logs_p202506" in s)
+    detach = position['ALTER TABLE usage_logs DETACH PARTITION "usage_logs_p202506"']
+    record = next(i for i, s in enumerate(statements) if "usage_log_archives" in s)
+    assert position['LOCK TABLE "usage_logs_p202506" IN SHARE MODE'] < export < detach < record
+    assert record < position['DROP TABLE "usage_logs_p202506"']
+    assert not any("CONCURRENTLY" in s for s in statements)
+    assert not any("p202511" in s for s in statements)
+    record = next(s for s in conn.executed if "usage_log_archives" in s[0])
+    assert record[1:4] == (
+        "usage_logs_p202506",
+        datetime(2025, 6, 1, tzinfo=timezone.utc),
+        datetime(2025, 7, 1, tzinfo=timezone.utc),
+    )
+    assert record[5] == 3
+    assert archiver.stats()["archived_rows"] == 3
+    assert archiver.stats()["partitions_created"] == 1
+
+
+def test_finishes_an_interrupted_detach(tmp_path):
+    partitions = [{"name": "usage_logs_p202505", "attached": True, "detach_pending": True}]
+    _, conn = _run_pass(tmp_path, partitions, [])
+    statements = [s[0].strip() for s in conn.executed]
+    assert 'ALTER TABLE usage_logs DETACH PARTITION "usage_logs_p202505" FINALIZE' in statements
+    assert pq.read_table(tmp_path / "usage_logs_p202505.parquet").num_rows == 0
+
+
+def test_without_retention_only_creates_partitions():
+    archiver = UsageArchiver()
+    repo = MagicMock(ensure_usage_log_partitions=AsyncMock(return_value=2))
+    pool = MagicMock()
+    with patch("app.services.usage_archiver.get_pg_pool", return_value=pool), \
+            patch("app.services.usage_archiver.get_repository", return_value=repo):
+        asyncio.run(archiver.maintain())
+    pool.acquire.assert_not_called()
+    assert archiver.stats()["partitions_created"] == 2
+
+
+def test_failed_upkeep_is_reported():
+    archiver = UsageArchiver()
+    repo = MagicMock(ensure_usage_log_partitions=AsyncMock(side_effect=RuntimeError("must be owner of table")))
+    with patch("app.services.usage_archiver.get_repository", return_value=repo), pytest.raises(RuntimeError):
+        asyncio.run(archiver.maintain())
+    stats = archiver.stats()
+    assert stats["upkeep_failing"] is True
+    assert "must be owner" in stats["last_upkeep_error"]
+    assert stats["upkeep_failures"] == 1
+
+    repo.ensure_usage_log_partitions = AsyncMock(return_value=0)
+    with patch("app.services.usage_archiver.get_repository", return_value=repo), \
+            patch("app.services.usage_archiver.get_pg_pool", return_value=None):
+        asyncio.run(archiver.maintain())
+    assert archiver.stats()["upkeep_failing"] is False
+
+
+def test_rows_for_archived_months_are_dropped():
+    archiver = UsageArchiver()
+    rows = [_log(1), {**_log(2), "created_at": datetime(2026, 1, 5, tzinfo=timezone.utc)}]
+    assert archiver.drop_archived(rows) == rows  # no retention, nothing is archived
+
+    archiver.configure(3, "unused", "")
+    with patch.object(archiver, "cutoff", return_value=datetime(2025, 11, 1, tzinfo=timezone.utc)):
+        assert archiver.drop_archived(rows) == rows[1:]
+    assert archiver.stats()["late_rows_dropped"] == 1
+
+
+def test_failed_upload_leaves_the_partition_attached(tmp_path):
+    partitions = [{"name": "usage_logs_p202506", "attached": True, "detach_pending": False}]
+    conn = FakeConn(partitions, [_log(1)])
+
+    @asynccontextmanager
+    async def acquire():
+        yield conn
+
+    archiver = UsageArchiver()
+    archiver.configure(3, str(tmp_path), "archive-bucket")
+    repo = MagicMock(ensure_usage_log_partitions=AsyncMock(return_value=0))
+    with patch("app.services.usage_archiver.get_pg_pool", return_value=MagicMock(acquire=acquire)), \
+            patch("app.services.usage_archiver.get_repository", return_value=repo), \
+            patch.object(archiver, "cutoff", return_value=datetime(2025, 11, 1, tzinfo=timezone.utc)), \
+            patch.object(archiver, "_upload", side_effect=ConnectionError("storage down")), \
+            pytest.raises(ConnectionError):
+        asyncio.run(archiver.maintain())
+    statements = [s[0] for s in conn.executed]
+    assert not any("DETACH" in s or "DROP" in s or "usage_log_archives" in s for s in statements)
+    assert archiver.stats()["failed"] == 1
+
+
+def test_archives_a_month_in_postgres(pg_dsn, tmp_path):
+    """The whole pass against a migrated database, default partition included."""
+    import uuid
+
+    from app.models import database
+    from app.models.repository import get_repository
+
+    auth_id = str(uuid.uuid4())
+    created_at = datetime(2010, 1, 15, 12, tzinfo=timezone.utc)
+
+    async def scenario():
+        pool = await database.init_pg_pool(pg_dsn, min_size=1, max_size=2)
+        try:
+            repo = get_repository()
+            user_id = await repo.create_user(auth_id, f"{auth_id}@example.com", "archive")
+            key = await repo.insert_api_key(user_id, "vz-sk_ar", f"hash-{auth_id}", "archive")
+            # A month of its own, so no other test's rows get archived.
+            await pool.execute(
+                "CREATE TABLE usage_logs_p201001 PARTITION OF usage_logs"
+                " FOR VALUES FROM ('2010-01-01+00') TO ('2010-02-01+00')"
+            )
+            await repo.insert_usage_logs([
+                {
+                    "user_id": user_id, "api_key_id": key["id"], "provider": "openai", "model": "gpt-4o",
+                    "input_tokens": 10, "output_tokens": 5, "total_tokens": 15, "provider_cost": 0.125,
+                    "vuzo_cost": 0.25, "response_time_ms": 100, "status_code": 200,
+                    "created_at": created_at.replace(second=n), "event_id": str(uuid.uuid4()),
+                }
+                for n in range(3)
+            ])
+
+            archiver = UsageArchiver()
+            archiver.configure(1, str(tmp_path), "")
+            with patch.object(archiver, "cutoff", return_value=datetime(2010, 2, 1, tzinfo=timezone.utc)):
+                await archiver.maintain()
+            remaining = await pool.fetchval("SELECT to_regclass('usage_logs_p201001')")
+            archive = await pool.fetchrow(
+                "SELECT row_count, location FROM usage_log_archives WHERE partition_name = 'usage_logs_p201001'"
+            )
+            summary = await repo.usage_summary(user_id, "2010-01-01", "2010-02-01")
+            return archiver.stats(), remaining, archive, summary
+        finally:
+            await database.close_pg_pool()
+
+    stats, remaining, archive, summary = asyncio.run(scenario())
+    assert (stats["archived"], stats["failed"]) == (1, 0)
+    assert remaining is None
+    assert archive["row_count"] == 3
+    assert pq.read_table(archive["location"]).num_rows == 3
+    # The month is still counted, now from the hourly rollups.
+    assert summary["total_requests"] == 3
@@ -0,0 +1,75 @@
+"""Tests for the streaming usage export (app/services/usage_export.py)."""
+import asyncio
+import csv
+import io
+import json
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from fastapi import HTTPException
+
+from app.services.usage_export import EXPORT_COLUMNS, export_usage_logs
+
+
+def _log(n: int) -> dict:
+    return {
+        "id": f"00000000-0000-0000-0000-{n:012d}", "created_at": f"2026-03-01T12:00:{n:02d}+00:00",
+        "api_key_id": "6f1c5a52-5b3f-4c1b-9d3e-1a2b3c4d5e6f", "provider": "openai", "model": "gpt-4o",
+        "input_tokens": 10, "output_tokens": 5, "total_tokens": 15, "provider_cost": 0.125,
+        "vuzo_cost": 0.25, "response_time_ms": 100, "status_code": 200,
+    }
+
+
+def _export(format: str, batches: list[list[dict]]) -> tuple[list[bytes], MagicMock]:
+    async def iter_usage_logs(*args):
+        for batch in batches:
+            yield batch
+
+    repo = MagicMock(iter_usage_logs=MagicMock(side_effect=iter_usage_logs))
+
+    async def collect():
+        return [chunk async for chunk in export_usage_logs("user-1", format, start_date="2026-03-01")]
+
+    with patch("app.services.usage_export.get_repository", return_value=repo):
+        return asyncio.run(collect()), repo
+
+
+BATCHES = [[_log(0), _log(1)], [_log(2)]]
+
+
+def test_ndjson_one_chunk_per_batch():
+    chunks, repo = _export("ndjson", BATCHES)
+    assert len(chunks) == 2
+    rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert rows == [_log(0), _log(1), _log(2)]
+    repo.iter_usage_logs.assert_called_once_with("user-1", None, None, "2026-03-01", None, EXPORT_COLUMNS, 1000)
+
+
+def test_csv_has_header_once():
+    chunks, _ = _export("csv", BATCHES)
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+    assert rows[0] == list(EXPORT_COLUMNS)
+    assert [r[0] for r in rows[1:]] == [_log(n)["id"] for n in range(3)]
+
+
+def test_csv_of_nothing_is_just_the_header():
+    chunks, _ = _export("csv", [])
+    assert b"".join(chunks).decode("utf-8") == ",".join(EXPORT_COLUMNS) + "\n"
+
+
+def test_parquet_round_trip():
+    pq = pytest.importorskip("pyarrow.parquet")
+    chunks, _ = _export("parquet", BATCHES)
+    table = pq.read_table(io.BytesIO(b"".join(chunks)))
+    assert table.num_rows == 3
+    assert pq.ParquetFile(io.BytesIO(b"".join(chunks))).num_row_groups == 2
+    assert table.column("created_at")[2].as_py() == datetime(2026, 3, 1, 12, 0, 2, tzinfo=timezone.utc)
+    assert table.column("vuzo_cost").to_pylist() == [0.25] * 3
+
+
+def test_parquet_without_pyarrow_is_501():
+    with patch.dict("sys.modules", {"pyarrow.parquet": None}):
+        with pytest.raises(HTTPException) as exc:
+            export_usage_logs("user-1", "parquet")
+    assert exc.value.status_code == 501
@@ -0,0 +1,198 @@
+"""Tests for the batched usage_logs writer (app/services/usage_writer.py)."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.usage_writer import UsageLogWriter
+
+
+def _repo(side_effect=None) -> MagicMock:
+    repo = MagicMock()
+    repo.insert_usage_logs = AsyncMock(side_effect=side_effect)
+    return repo
+
+
+def _batches(repo: MagicMock) -> list[list[dict]]:
+    return [call.args[0] for call in repo.insert_usage_logs.call_args_list]
+
+
+def _run(scenario, repo):
+    with patch("app.services.usage_writer.get_repository", return_value=repo):
+        return asyncio.run(scenario())
+
+
+async def _started(writer: UsageLogWriter) -> asyncio.Task:
+    task = asyncio.create_task(writer.run())
+    await asyncio.sleep(0)
+    return task
+
+
+async def _stop(task: asyncio.Task) -> None:
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_unknown_overflow_policy_rejected():
+    with pytest.raises(ValueError):
+        UsageLogWriter(overflow="spill")
+
+
+def test_writes_inline_without_writer_task():
+    writer, repo = UsageLogWriter(), _repo()
+
+    async def scenario():
+        await writer.submit({"n": 1})
+
+    _run(scenario, repo)
+    assert _batches(repo) == [[{"n": 1}]]
+    assert writer.stats()["written"] == 1
+
+
+def test_full_batch_sent_without_waiting_for_interval():
+    writer, repo = UsageLogWriter(batch_size=3, flush_interval=60), _repo()
+
+    async def scenario():
+        task = await _started(writer)
+        for n in range(7):
+            await writer.submit({"n": n})
+        await asyncio.sleep(0.05)
+        await _stop(task)
+
+    _run(scenario, repo)
+    assert [len(b) for b in _batches(repo)] == [3, 3]
+    assert writer.stats()["depth"] == 1
+
+
+def test_partial_batch_sent_after_interval():
+    writer, repo = UsageLogWriter(batch_size=100, flush_interval=0.05), _repo()
+
+    async def scenario():
+        task = await _started(writer)
+        await writer.submit({"n": 1})
+        await writer.submit({"n": 2})
+        await asyncio.sleep(0.02)
+        assert repo.insert_usage_logs.call_count == 0
+        await asyncio.sleep(0.1)
+        await _stop(task)
+
+    _run(scenario, repo)
+    assert _batches(repo) == [[{"n": 1}, {"n": 2}]]
+    assert writer.stats()["batches"] == 1
+
+
+def test_drop_newest_keeps_queued_rows():
+    writer, repo = UsageLogWriter(capacity=2, batch_size=10, flush_interval=60, overflow="drop_newest"), _repo()
+
+    async def scenario():
+        task = await _started(writer)
+        for n in range(4):
+            await writer.submit({"n": n})
+        await _stop(task)
+        await writer.drain()
+
+    _run(scenario, repo)
+    assert _batches(repo) == [[{"n": 0}, {"n": 1}]]
+    assert writer.stats()["dropped"] == 2
+
+
+def test_drop_oldest_keeps_latest_rows():
+    writer, repo = UsageLogWriter(capacity=2, batch_size=10, flush_interval=60, overflow="drop_oldest"), _repo()
+
+    async def scenario():
+        task = await _started(writer)
+        for n in range(4):
+            await writer.submit({"n": n})
+        await _stop(task)
+        await writer.drain()
+
+    _run(scenario, repo)
+    assert _batches(repo) == [[{"n": 2}, {"n": 3}]]
+    assert writer.stats()["dropped"] == 2
+
+
+def test_block_waits_for_writer_to_make_room():
+    writer, repo = UsageLogWriter(capacity=2, batch_size=2, flush_interval=60, overflow="block"), _repo()
+
+    async def scenario():
+        task = await _started(writer)
+        for n in range(5):
+            await writer.submit({"n": n})
+        await asyncio.sleep(0.05)
+        await _stop(task)
+        await writer.drain()
+
+    _run(scenario, repo)
+    assert [r["n"] for b in _batches(repo) for r in b] == [0, 1, 2, 3, 4]
+    assert writer.stats()["dropped"] == 0
+    assert writer.stats()["blocked"] >= 1
+
+
+def test_block_drops_after_timeout():
+    gate = asyncio.Event()
+
+    async def stuck(rows):
+        await gate.wait()
+
+    writer, repo = UsageLogWriter(capacity=1, batch_size=1, flush_interval=60, overflow="block"), _repo(stuck)
+
+    async def scenario():
+        task = await _started(writer)
+        await writer.submit({"n": 0})
+        await asyncio.sleep(0)
+        await writer.submit({"n": 1})
+        await writer.submit({"n": 2})
+        stats = writer.stats()
+        gate.set()
+        await _stop(task)
+        return stats
+
+    with patch("app.services.usage_writer._BLOCK_TIMEOUT_SECONDS", 0.02):
+        stats = _run(scenario, repo)
+    assert stats["writing"] == 1
+    assert stats["depth"] == 1
+    assert stats["dropped"] == 1
+
+
+def test_failed_batch_retried_then_dropped():
+    writer, repo = UsageLogWriter(batch_size=2, flush_interval=60), _repo(Exception("Connection refused"))
+
+    async def scenario():
+        task = await _started(writer)
+        await writer.submit({"n": 1})
+        await writer.submit({"n": 2})
+        await asyncio.sleep(0.05)
+        await _stop(task)
+
+    with patch("app.services.usage_writer._RETRY_BACKOFF_SECONDS", 0):
+        _run(scenario, repo)
+    assert repo.insert_usage_logs.call_count == 3
+    stats = writer.stats()
+    assert stats["retries"] == 2
+    assert stats["failed_batches"] == 1
+    assert stats["dropped"] == 2
+    assert stats["written"] == 0
+
+
+def test_drain_waits_for_in_flight_batch_then_sends_rest():
+    gate = asyncio.Event()
+
+    async def slow(rows):
+        await gate.wait()
+
+    writer, repo = UsageLogWriter(batch_size=2, flush_interval=60), _repo(slow)
+
+    async def scenario():
+        task = await _started(writer)
+        for n in range(5):
+            await writer.submit({"n": n})
+        await asyncio.sleep(0.01)
+        assert writer.stats()["writing"] == 2
+        await _stop(task)
+        asyncio.get_running_loop().call_soon(gate.set)
+        return await writer.drain()
+
+    assert _run(scenario, repo) == 3
+    assert [r["n"] for b in _batches(repo) for r in b] == [0, 1, 2, 3, 4]
+    assert writer.stats()["written"] == 5
+    assert writer.stats()["running"] is False
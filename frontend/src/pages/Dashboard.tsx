@@ -10,8 +10,9 @@ interface UsageSummary {
   total_vuzo_cost: number
 }
 
-interface Balance {
+interface Overview {
   balance: number
+  summary: UsageSummary
 }
 
 export default function Dashboard() {
@@ -22,12 +23,9 @@ export default function Dashboard() {
   useEffect(() => {
     async function load() {
       try {
-        const [bal, usage] = await Promise.all([
-          api.get<Balance>('/billing/balance'),
-          api.get<UsageSummary>('/usage/summary'),
-        ])
-        setBalance(bal.balance)
-        setSummary(usage)
+        const overview = await api.get<Overview>('/dashboard/overview?fields=balance,summary')
+        setBalance(overview.balance)
+        setSummary(overview.summary)
       } catch {
         // User may not have data yet
       } finally {